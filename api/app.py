@@ -6,6 +6,8 @@ from loguru import logger
 
 from api.db import init_db, SessionLocal
 from api.utils.config import load_config
+from api.utils.json_provider import provider_class
+from api.services.batching import init_ingest_buffers
 from api.services.celery_app import init_celery
 from api.routes.health import bp as health_bp
 from api.routes.ingest import bp as ingest_bp
@@ -17,6 +19,7 @@ from api.routes.config import bp as config_bp
 def create_app(config_override: dict | None = None) -> Flask:
     """Application factory used by both the Flask dev server and gunicorn."""
     app = Flask(__name__)
+    app.json = provider_class()(app)
 
     cfg = load_config()
     if config_override:
@@ -26,6 +29,7 @@ def create_app(config_override: dict | None = None) -> Flask:
     CORS(app, resources={r"/api/*": {"origins": app.config.get("CORS_ORIGINS", "*")}})
     init_db(cfg.DB_URL)
     init_celery(app)
+    init_ingest_buffers(app)
 
     for blueprint in (health_bp, ingest_bp, query_bp, alerts_bp, config_bp):
         app.register_blueprint(blueprint)
@@ -0,0 +1,4 @@
+"""Standalone benchmarks for FlowGuard hot paths.
+
+Run from the repository root, e.g. ``python -m api.benchmarks.log_insert``.
+"""
@@ -0,0 +1,141 @@
+"""Alert rule evaluation: per-snapshot Python threshold checks vs the compiled rule engine.
+
+Each strategy runs with the cyclic garbage collector paused, as ``timeit``
+does: otherwise a full collection over the pre-generated snapshots lands
+on whichever strategy happens to cross the allocation threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from api.services import rules
+
+
+def _legacy(snapshot: dict, config: Dict) -> List[dict]:
+    """The threshold checks ``handle_alerts`` used to run for every snapshot."""
+    triggers = []
+    threshold_error_rate = config["ALERT_ERROR_RATE_THRESHOLD"]
+    threshold_latency = config["ALERT_P95_LATENCY_MS"]
+    if snapshot["error_rate"] >= threshold_error_rate:
+        severity = "critical" if snapshot["error_rate"] >= threshold_error_rate * 2 else "warn"
+        triggers.append(
+            {
+                "reason": "error_rate_threshold",
+                "severity": severity,
+                "message": f"Error rate {snapshot['error_rate']:.2%} exceeded threshold",
+            }
+        )
+    if snapshot["p95_latency_ms"] >= threshold_latency:
+        severity = "critical" if snapshot["p95_latency_ms"] >= threshold_latency * 1.5 else "warn"
+        triggers.append(
+            {
+                "reason": "latency_threshold",
+                "severity": severity,
+                "message": f"p95 latency {snapshot['p95_latency_ms']}ms exceeded threshold",
+            }
+        )
+    return triggers
+
+
+def _tick(names: List[str], seed: int) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    error_rate = rng.gamma(2.0, 0.01, len(names))
+    latency = rng.lognormal(5.5, 0.4, (len(names), 4))
+    return [
+        {
+            "service": name,
+            "error_rate": float(error_rate[i]),
+            "p50_latency_ms": float(latency[i, 0]),
+            "p90_latency_ms": float(latency[i, 1]),
+            "p95_latency_ms": int(latency[i, 2]),
+            "p99_latency_ms": float(latency[i, 3]),
+            "tps": float(rng.uniform(1, 50)),
+            "log_count": 100,
+        }
+        for i, name in enumerate(names)
+    ]
+
+
+def _extended(config: Dict, names: List[str]) -> dict:
+    """The default rules plus per-tier consecutive-window and rate-of-change rules."""
+    definitions = rules.default_definitions(config)
+    definitions["tiers"] = {"gold": names[: len(names) // 10]}
+    definitions["rules"] += [
+        {"name": "latency_threshold", "metric": "p99_latency_ms", "op": ">", "threshold": 600,
+         "for": 3, "tier": "gold"},
+        {"name": "error_rate_rising", "metric": "error_rate", "op": "rise", "factor": 2.0,
+         "over_sec": 300, "min_baseline": 0.01},
+        {"name": "traffic_drop", "metric": "tps", "op": "<", "threshold": 2.0, "for": 2},
+    ]
+    return definitions
+
+
+def _evaluate_and_save(snapshots: List[dict], config: Dict, now: float) -> List[List[dict]]:
+    evaluation = rules.evaluate_snapshots(snapshots, config, now)
+    evaluation.save()
+    return evaluation.triggers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--services", default="100,1000,10000", help="Comma-separated service counts"
+    )
+    parser.add_argument("--ticks", type=int, default=5, help="Evaluations per run")
+    args = parser.parse_args()
+
+    config: Dict = {
+        "ALERT_ERROR_RATE_THRESHOLD": 0.05,
+        "ALERT_P95_LATENCY_MS": 500,
+        "ALERT_RULE_STATE_BACKEND": "memory",
+    }
+    store = rules.get_store(config)
+
+    print(f"{'services':>9} {'strategy':<16} {'seconds':>9} {'evals/sec':>12} {'triggers':>9}")
+    for count in (int(value) for value in args.services.split(",")):
+        names = [f"svc-{index}" for index in range(count)]
+        ticks = [_tick(names, seed) for seed in range(args.ticks)]
+        extended = rules.compile_rules(_extended(config, names))
+        runs = [
+            (
+                "legacy",
+                lambda snapshots, now: [_legacy(snapshot, config) for snapshot in snapshots],
+            ),
+            (
+                "per-snapshot",
+                lambda snapshots, now: [
+                    _evaluate_and_save([snapshot], config, now)[0] for snapshot in snapshots
+                ],
+            ),
+            ("batched", lambda snapshots, now: _evaluate_and_save(snapshots, config, now)),
+            (
+                "batched+5 rules",
+                lambda snapshots, now: rules.evaluate(
+                    extended, snapshots, store.load_many(extended, names), now
+                ),
+            ),
+        ]
+        for label, run in runs:
+            store.clear()
+            fired = 0
+            gc.collect()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                for step, snapshots in enumerate(ticks):
+                    fired += sum(len(triggers) for triggers in run(snapshots, 60.0 * step))
+                elapsed = time.perf_counter() - started
+            finally:
+                gc.enable()
+            evals = count * args.ticks
+            print(f"{count:>9,} {label:<16} {elapsed:>9.3f} {evals / elapsed:>12.0f} {fired:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""One evaluation tick across many services: per-service evaluate vs evaluate_many."""
+
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from api.services import anomaly, detector_state, streaming
+from api.services.detector_state import FEATURES, WINDOW_SIZE, DetectorState
+
+SCALE = np.array([0.01, 300.0, 50.0])
+
+
+def _seed(store: detector_state.DetectorStore, names: List[str], alpha: float) -> None:
+    """Give every service a full window of steady history without running the detector."""
+    rng = np.random.default_rng(3)
+    history = SCALE * (1 + 0.05 * rng.standard_normal((WINDOW_SIZE, len(names), FEATURES)))
+    online = np.zeros((len(names), streaming.STAT_ROWS, FEATURES))
+    for step, vectors in enumerate(history):
+        streaming.update(online, np.full(len(names), step), vectors, alpha)
+    windows = history.transpose(1, 0, 2).astype(np.float32)
+    store.save_many(
+        (
+            name,
+            DetectorState(window=windows[i].copy(), online=online[i].copy(), count=WINDOW_SIZE),
+            False,
+        )
+        for i, name in enumerate(names)
+    )
+
+
+def _tick(names: List[str]) -> List[dict]:
+    rng = np.random.default_rng(11)
+    values = SCALE * (1 + 0.05 * rng.standard_normal((len(names), FEATURES)))
+    return [
+        {"service": name, "error_rate": row[0], "p95_latency_ms": int(row[1]), "tps": row[2]}
+        for name, row in zip(names, values)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--services", default="10,1000,10000", help="Comma-separated service counts"
+    )
+    parser.add_argument(
+        "--suspect-z",
+        type=float,
+        default=math.inf,
+        help="ANOMALY_SUSPECT_Z; the default excludes IsolationForest confirmation",
+    )
+    args = parser.parse_args()
+
+    config: Dict = {
+        "ANOMALY_STATE_BACKEND": "memory",
+        "ANOMALY_SUSPECT_Z": args.suspect_z,
+        "ANOMALY_EWMA_ALPHA": 0.1,
+    }
+    store = detector_state.get_store(config)
+
+    print(f"{'services':>9} {'strategy':<13} {'seconds':>9} {'evals/sec':>12} {'flagged':>8}")
+    for count in (int(value) for value in args.services.split(",")):
+        names = [f"svc-{index}" for index in range(count)]
+        snapshots = _tick(names)
+        runs = [
+            (
+                "evaluate",
+                lambda: [anomaly.evaluate(s["service"], s, config) for s in snapshots],
+            ),
+            ("evaluate_many", lambda: anomaly.evaluate_many(snapshots, config)),
+        ]
+        for label, run in runs:
+            store.clear()
+            _seed(store, names, config["ANOMALY_EWMA_ALPHA"])
+            started = time.perf_counter()
+            results = run()
+            elapsed = time.perf_counter() - started
+            flagged = sum(1 for result in results if result["is_anomaly"])
+            print(f"{count:>9,} {label:<13} {elapsed:>9.3f} {count / elapsed:>12.0f} {flagged:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Evaluations per second of anomaly.evaluate for one service's snapshot stream."""
+
+from __future__ import annotations
+
+import argparse
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from api.services import anomaly, detector_state
+
+
+def _snapshots(count: int, seed: int = 7) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    snapshots = []
+    for index in range(count):
+        spike = index % 97 == 96
+        snapshots.append(
+            {
+                "error_rate": float(rng.normal(0.2 if spike else 0.01, 0.002)),
+                "p95_latency_ms": int(rng.normal(2500 if spike else 300, 20)),
+                "tps": float(rng.normal(50.0, 2.0)),
+            }
+        )
+    return snapshots
+
+
+def _legacy_evaluate(windows: Dict[str, deque], service_name: str, snapshot: dict) -> dict:
+    """The original implementation: fit a new forest and score it twice per snapshot."""
+    window = windows.setdefault(service_name, deque(maxlen=anomaly.WINDOW_SIZE))
+    vector = anomaly._to_vector(snapshot)
+    window.append(vector)
+    if len(window) < anomaly.MIN_POINTS:
+        return {"is_anomaly": False}
+    model = IsolationForest(n_estimators=50, contamination=0.1, random_state=42)
+    model.fit(np.stack(tuple(window)))
+    model.decision_function([vector])
+    return {"is_anomaly": int(model.predict([vector])[0]) == -1}
+
+
+def _run(label: str, fn: Callable[[dict], dict], snapshots: List[dict]) -> None:
+    started = time.perf_counter()
+    flagged = sum(1 for snapshot in snapshots if fn(snapshot)["is_anomaly"])
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {len(snapshots) / elapsed:>12.1f} {elapsed:>9.3f} {flagged:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snapshots", type=int, default=1000, help="Snapshots to evaluate")
+    parser.add_argument("--refit-points", type=int, default=32)
+    parser.add_argument("--refit-sec", type=float, default=300.0)
+    args = parser.parse_args()
+
+    snapshots = _snapshots(args.snapshots)
+    config = {
+        "ANOMALY_REFIT_POINTS": args.refit_points,
+        "ANOMALY_REFIT_SEC": args.refit_sec,
+        "ANOMALY_DRIFT_Z": 3.0,
+        "ANOMALY_STATE_BACKEND": "memory",
+    }
+    legacy_windows: Dict[str, deque] = {}
+
+    print(f"{args.snapshots:,} snapshots for one service")
+    print(f"{'strategy':<10} {'evals/sec':>12} {'seconds':>9} {'flagged':>8}")
+    _run("legacy", lambda snapshot: _legacy_evaluate(legacy_windows, "bench", snapshot), snapshots)
+    detector_state.get_store(config).clear()
+    _run("current", lambda snapshot: anomaly.evaluate("bench", snapshot, config), snapshots)
+
+
+if __name__ == "__main__":
+    main()
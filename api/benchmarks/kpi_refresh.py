@@ -0,0 +1,124 @@
+"""Time and peak memory of refresh_kpis strategies over a dense lookback window."""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api.models import Base, LogEvent, MetricPoint, Service
+from api.services import kpis, storage
+from api.utils.time import utc_now
+
+LEVELS = ("INFO", "INFO", "INFO", "WARN", "ERROR")
+
+
+def _seed(factory, rows: int, lookback_min: int) -> Service:
+    with factory() as session:
+        service = Service(name="bench")
+        session.add(service)
+        session.commit()
+        now = utc_now()
+        span_ms = lookback_min * 60 * 1000 - 1000
+        chunk = 50_000
+        for offset in range(0, rows, chunk):
+            storage.insert_log_events(
+                session,
+                [
+                    {
+                        "service_id": service.id,
+                        "ts": now - timedelta(milliseconds=random.randint(0, span_ms)),
+                        "level": random.choice(LEVELS),
+                        "message": "processed request",
+                        "latency_ms": random.randint(20, 2000),
+                        "status_code": 200,
+                        "meta": {},
+                    }
+                    for _ in range(min(chunk, rows - offset))
+                ],
+            )
+            session.commit()
+        session.expunge(service)
+        return service
+
+
+def _legacy_refresh(session, service: Service, config: dict) -> dict:
+    """The original implementation: full ORM rows and a numpy percentile."""
+    end = utc_now()
+    start = end - timedelta(minutes=config["ALERT_LOOKBACK_MIN"])
+    logs: List[LogEvent] = (
+        session.query(LogEvent)
+        .filter(LogEvent.service_id == service.id, LogEvent.ts >= start, LogEvent.ts <= end)
+        .order_by(LogEvent.ts.desc())
+        .all()
+    )
+    session.query(MetricPoint).filter(
+        MetricPoint.service_id == service.id, MetricPoint.ts >= start, MetricPoint.ts <= end
+    ).all()
+    errors = sum(1 for log in logs if log.level in {"ERROR", "CRITICAL"})
+    latencies = [log.latency_ms for log in logs if log.latency_ms is not None]
+    return {
+        "error_rate": errors / len(logs),
+        "p95_latency_ms": int(round(float(np.percentile(np.array(latencies), 95)))),
+    }
+
+
+def _measure(factory, fn: Callable, service: Service, config: dict) -> tuple:
+    session = factory()
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = fn(session, service, config)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        session.rollback()
+    finally:
+        session.close()
+    return elapsed, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-url", help="Database URL (defaults to a temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=500_000, help="Logs in the lookback window")
+    parser.add_argument("--lookback-min", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = args.db_url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = create_engine(db_url, future=True)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        service = _seed(factory, args.rows, args.lookback_min)
+
+        base = {"ALERT_LOOKBACK_MIN": args.lookback_min, "KPI_WINDOW_BACKEND": "memory"}
+        strategies = [
+            ("legacy ORM", _legacy_refresh, base),
+            ("sql aggregate", kpis.refresh_kpis, {**base, "KPI_AGGREGATION": "sql"}),
+            ("rolling (cold)", kpis.refresh_kpis, {**base, "KPI_AGGREGATION": "rolling"}),
+            ("rolling (warm)", kpis.refresh_kpis, {**base, "KPI_AGGREGATION": "rolling"}),
+        ]
+        print(f"{args.rows:,} logs in a {args.lookback_min}-minute window")
+        print(f"{'strategy':<16} {'seconds':>9} {'peak MiB':>9} {'error_rate':>11} {'p95':>6}")
+        for label, fn, config in strategies:
+            elapsed, peak, result = _measure(factory, fn, service, config)
+            print(
+                f"{label:<16} {elapsed:>9.3f} {peak / 2**20:>9.1f} "
+                f"{result['error_rate']:>11.4f} {result['p95_latency_ms']:>6}"
+            )
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare per-row ORM inserts with the bulk Core path used by parse_logs_task."""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, List
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from api.models import Base, LogEvent, Service
+from api.schemas import LogRecord
+from api.services import storage
+from api.utils.time import utc_now
+
+LEVELS = ("INFO", "INFO", "INFO", "WARN", "ERROR")
+
+
+def _records(count: int, services: List[str]) -> List[LogRecord]:
+    now = utc_now()
+    return [
+        LogRecord(
+            service=random.choice(services),
+            ts=now - timedelta(milliseconds=idx),
+            level=random.choice(LEVELS),
+            message=f"processed request latency={random.randint(20, 900)}ms status=200",
+            latency_ms=random.randint(20, 900),
+            status_code=200,
+            meta={"host": "bench"},
+        )
+        for idx in range(count)
+    ]
+
+
+def _orm_insert(session, records: List[LogRecord], service_ids: dict) -> None:
+    for record in records:
+        session.add(
+            LogEvent(
+                service_id=service_ids[record.service],
+                ts=record.ts,
+                level=record.level,
+                message=record.message,
+                latency_ms=record.latency_ms,
+                status_code=record.status_code,
+                meta=record.meta,
+            )
+        )
+    session.flush()
+
+
+def _bulk_insert(session, records: List[LogRecord], service_ids: dict) -> None:
+    storage.insert_log_events(session, storage.log_rows(records, service_ids))
+
+
+def _time(factory, fn: Callable, records: List[LogRecord], service_ids: dict) -> float:
+    session = factory()
+    try:
+        started = time.perf_counter()
+        fn(session, records, service_ids)
+        session.commit()
+        elapsed = time.perf_counter() - started
+        session.execute(delete(LogEvent))
+        session.commit()
+    finally:
+        session.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-url", help="Database URL (defaults to a temporary SQLite file)")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated batch sizes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = args.db_url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = create_engine(db_url, future=True)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine, autoflush=False)
+
+        with factory() as session:
+            names = [f"bench-{idx}" for idx in range(8)]
+            session.add_all(Service(name=name) for name in names)
+            session.commit()
+            service_ids = {svc.name: svc.id for svc in session.query(Service).all()}
+
+        print(f"{'rows':>8} {'orm rows/s':>14} {'bulk rows/s':>14} {'speedup':>8}")
+        for size in (int(value) for value in args.sizes.split(",")):
+            records = _records(size, names)
+            orm = _time(factory, _orm_insert, records, service_ids)
+            bulk = _time(factory, _bulk_insert, records, service_ids)
+            print(f"{size:>8} {size / orm:>14,.0f} {size / bulk:>14,.0f} {orm / bulk:>7.1f}x")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
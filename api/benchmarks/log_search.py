@@ -0,0 +1,123 @@
+"""Compare /api/logs text search through the full-text index with the LIKE '%q%' scan."""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from api.models import Base, LogEvent, Service
+from api.services import logsearch, storage
+from api.utils.time import utc_now
+
+CHUNK = 50_000
+QUERIES = (
+    ("rare token", "deadlock"),
+    ("token", "timeout"),
+    ("phrase", '"connection reset"'),
+    ("prefix", "deadl*"),
+    ("common token", "request"),
+)
+_ACTIONS = ("GET", "POST", "PUT", "DELETE")
+_MESSAGES = (
+    "handled request {action} /api/orders/{n} status=200",
+    "handled request {action} /api/users/{n} status=200",
+    "cache miss for key session:{n}",
+    "request to upstream inventory took {n}ms",
+    "connection reset by peer while handling request {n}",
+    "timeout waiting for payment gateway after {n}ms",
+    "retrying request {n} after transient error",
+)
+
+
+def _message(rng: random.Random) -> str:
+    if rng.random() < 0.00002:
+        return f"deadlock detected on table orders, transaction {rng.randint(1, 10**6)} aborted"
+    template = _MESSAGES[int(rng.random() ** 2 * len(_MESSAGES))]
+    return template.format(action=rng.choice(_ACTIONS), n=rng.randint(1, 10**6))
+
+
+def _fill(factory, service_id: int, start: int, stop: int) -> float:
+    """Insert rows ``start..stop`` (newest last) and return the insert rate."""
+    rng = random.Random(start)
+    now = utc_now()
+    started = time.perf_counter()
+    for offset in range(start, stop, CHUNK):
+        rows = [
+            {
+                "service_id": service_id,
+                "ts": now - timedelta(milliseconds=stop - index),
+                "level": "INFO",
+                "message": _message(rng),
+                "latency_ms": 10,
+                "status_code": 200,
+                "meta": {},
+            }
+            for index in range(offset, min(offset + CHUNK, stop))
+        ]
+        with factory.begin() as session:
+            storage.insert_log_events(session, rows)
+    return (stop - start) / (time.perf_counter() - started)
+
+
+def _search(factory, query_text: str, mode: str) -> tuple[float, int]:
+    """Run the /api/logs search (newest 500 matches) and return (seconds, matches)."""
+    with factory() as session:
+        query = session.query(LogEvent).order_by(LogEvent.ts.desc())
+        started = time.perf_counter()
+        found = len(logsearch.newest(session, query, query_text, 500, mode))
+        elapsed = time.perf_counter() - started
+        session.expunge_all()
+        return elapsed, found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-url", help="Database URL (defaults to a temporary SQLite file)")
+    parser.add_argument(
+        "--rows", default="1000000,10000000", help="Comma-separated table sizes to test"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query (median reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.db_url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = create_engine(url, future=True)
+        Base.metadata.create_all(engine)
+        logsearch.install(engine)
+        factory = sessionmaker(bind=engine)
+        with factory.begin() as session:
+            service = Service(name="bench-search")
+            session.add(service)
+            session.flush()
+            service_id = service.id
+            existing = session.scalar(select(func.count()).select_from(LogEvent))
+
+        print(f"{'rows':>11} {'query':<13} {'like ms':>9} {'fts ms':>9} {'speedup':>8} {'hits':>5}")
+        for rows in sorted(int(value) for value in args.rows.split(",")):
+            if rows > existing:
+                rate = _fill(factory, service_id, existing, rows)
+                existing = rows
+                print(f"{rows:>11,} inserted at {rate:,.0f} rows/sec (FTS triggers enabled)")
+            for label, query_text in QUERIES:
+                timings = {}
+                for mode in ("like", "fts"):
+                    runs = [_search(factory, query_text, mode) for _ in range(args.repeat)]
+                    timings[mode] = statistics.median(seconds for seconds, _ in runs)
+                    hits = runs[0][1]
+                speedup = timings["like"] / timings["fts"]
+                print(
+                    f"{rows:>11,} {label:<13} {timings['like'] * 1000:>9.1f} "
+                    f"{timings['fts'] * 1000:>9.1f} {speedup:>7.1f}x {hits:>5}"
+                )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
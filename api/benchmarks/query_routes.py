@@ -0,0 +1,245 @@
+"""Per-endpoint latency of the query routes: ORM objects + jsonify vs projected rows + orjson."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from flask import Blueprint, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+ENDPOINTS = (
+    ("logs", "/api/logs?service=bench-0&range=1h&limit=500"),
+    ("logs 5000", "/api/logs?service=bench-0&range=1h&limit=5000"),
+    ("metrics", "/api/metrics?service=bench-0&range=1h"),
+    ("kpis", "/api/kpis?service=bench-0&range=1h"),
+    ("alerts", "/api/alerts?limit=500"),
+)
+
+# Importing ``api.app`` initialises the database from ``DB_URL``, so API modules are
+# imported inside functions, after main() has pointed it at a temporary file.
+legacy_bp = Blueprint("legacy", __name__, url_prefix="/legacy")
+
+
+@legacy_bp.get("/logs")
+def legacy_logs():
+    """``/api/logs`` as it was: full ``LogEvent`` objects, fields converted by hand."""
+    from api.db import session_scope
+    from api.models import LogEvent, Service
+    from api.utils.time import parse_range
+
+    start, end = parse_range(request.args.get("range", "1h"))
+    limit = int(request.args.get("limit", 500))
+    with session_scope() as session:
+        q = (
+            session.query(LogEvent, Service.name)
+            .join(Service)
+            .filter(
+                LogEvent.ts >= start,
+                LogEvent.ts <= end,
+                Service.name == request.args["service"],
+            )
+            .order_by(LogEvent.ts.desc(), LogEvent.id.desc())
+        )
+        results = [
+            {
+                "id": log.id,
+                "service": svc_name,
+                "ts": log.ts.isoformat(),
+                "level": log.level,
+                "message": log.message,
+                "latency_ms": log.latency_ms,
+                "status_code": log.status_code,
+                "meta": log.meta or {},
+            }
+            for log, svc_name in q.limit(limit).all()
+        ]
+    return jsonify({"items": results, "next_cursor": None}), 200
+
+
+def _legacy_series():
+    from api.db import session_scope
+    from api.models import MetricPoint, Service
+    from api.utils.time import parse_range
+
+    start, end = parse_range(request.args.get("range", "1h"))
+    with session_scope() as session:
+        points = (
+            session.query(MetricPoint)
+            .join(Service)
+            .filter(
+                Service.name == request.args["service"],
+                MetricPoint.ts >= start,
+                MetricPoint.ts <= end,
+            )
+            .order_by(MetricPoint.ts.asc())
+            .all()
+        )
+        items = [
+            {
+                "ts": point.ts.isoformat(),
+                "error_rate": float(point.error_rate),
+                "p95_latency_ms": point.p95_latency_ms,
+                "tps": float(point.tps),
+            }
+            for point in points
+        ]
+    return items, start, end
+
+
+@legacy_bp.get("/metrics")
+def legacy_metrics():
+    items, _, _ = _legacy_series()
+    return jsonify({"service": request.args["service"], "resolution": "raw", "items": items}), 200
+
+
+@legacy_bp.get("/kpis")
+def legacy_kpis():
+    items, start, end = _legacy_series()
+    return (
+        jsonify(
+            {
+                "service": request.args["service"],
+                "range": {"start": start.isoformat(), "end": end.isoformat()},
+                "resolution": "raw",
+                "items": items,
+                "latest": items[-1] if items else None,
+            }
+        ),
+        200,
+    )
+
+
+@legacy_bp.get("/alerts")
+def legacy_alerts():
+    from api.db import session_scope
+    from api.models import AlertEvent, Service
+
+    with session_scope() as session:
+        rows = (
+            session.query(AlertEvent, Service.name)
+            .join(Service)
+            .order_by(AlertEvent.ts.desc())
+            .limit(int(request.args.get("limit", 50)))
+            .all()
+        )
+        items = [
+            {
+                "id": alert.id,
+                "service": svc,
+                "channel": alert.channel,
+                "severity": alert.severity,
+                "message": alert.message,
+                "status": alert.status,
+                "ts": alert.ts.isoformat(),
+            }
+            for alert, svc in rows
+        ]
+    return jsonify({"items": items}), 200
+
+
+def _fill(session_scope, services: int, logs: int, alerts: int) -> None:
+    from api.models import AlertEvent, LogEvent, MetricPoint, Service
+    from api.services import storage
+    from api.utils.time import utc_now
+
+    rng = random.Random(0)
+    now = utc_now()
+    with session_scope() as session:
+        ids = []
+        for index in range(services):
+            service = Service(name=f"bench-{index}")
+            session.add(service)
+            session.flush()
+            ids.append(service.id)
+        storage.insert_log_events(
+            session,
+            [
+                {
+                    "service_id": ids[index % services],
+                    "ts": now - timedelta(milliseconds=index * 3600_000 // logs),
+                    "level": rng.choice(("INFO", "INFO", "WARN", "ERROR")),
+                    "message": rng.choice(("handled request", "timeout calling upstream")),
+                    "latency_ms": rng.randint(5, 900),
+                    "status_code": 200,
+                    "meta": {"path": f"/api/orders/{index}", "region": "eu-west-1"},
+                }
+                for index in range(logs)
+            ],
+        )
+        session.add_all(
+            MetricPoint(
+                service_id=service_id,
+                ts=now - timedelta(seconds=second),
+                tps=rng.uniform(1, 50),
+                error_rate=rng.uniform(0, 0.1),
+                p95_latency_ms=rng.randint(50, 900),
+            )
+            for service_id in ids
+            for second in range(3600)
+        )
+        session.add_all(
+            AlertEvent(
+                service_id=ids[index % services],
+                ts=now - timedelta(seconds=index),
+                channel="slack",
+                severity="warn",
+                message=f"Error rate {index} exceeded threshold",
+                dedupe_key=f"bench-{index}",
+                status="sent",
+            )
+            for index in range(alerts)
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--services", type=int, default=4, help="Services to generate")
+    parser.add_argument("--logs", type=int, default=200_000, help="Log events to generate")
+    parser.add_argument("--alerts", type=int, default=2000, help="Alerts to generate")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per endpoint (median)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        # Time the query paths themselves, not the response cache in front of them.
+        os.environ["RESPONSE_CACHE_TTL_SEC"] = "0"
+        from api.app import create_app
+        from api.db import session_scope
+
+        app = create_app()
+        legacy_app = create_app()
+        legacy_app.json = DefaultJSONProvider(legacy_app)
+        legacy_app.register_blueprint(legacy_bp)
+        _fill(session_scope, args.services, args.logs, args.alerts)
+
+        clients = {"legacy": legacy_app.test_client(), "projected": app.test_client()}
+        print(f"{'endpoint':<12} {'legacy ms':>10} {'projected ms':>13} {'speedup':>8} {'KB':>7}")
+        for label, url in ENDPOINTS:
+            timings = {}
+            for name, client in clients.items():
+                path = url.replace("/api/", "/legacy/") if name == "legacy" else url
+                client.get(path)
+                runs = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    runs.append(time.perf_counter() - started)
+                    assert response.status_code == 200, (path, response.status_code)
+                timings[name] = statistics.median(runs)
+                size = len(response.data) / 1024
+            speedup = timings["legacy"] / timings["projected"]
+            print(
+                f"{label:<12} {timings['legacy'] * 1000:>10.2f} "
+                f"{timings['projected'] * 1000:>13.2f} {speedup:>7.1f}x {size:>7.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
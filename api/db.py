@@ -6,26 +6,48 @@ from contextlib import contextmanager
 from typing import Generator
 
 from loguru import logger
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from api import migrations
 from api.models import Base
+from api.services import logsearch
 
 _engine: Engine | None = None
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False))
 
 
 def init_db(db_url: str) -> None:
-    """Initialise the database engine and create tables if needed."""
+    """Initialise the database engine, create missing tables and upgrade old ones."""
     global _engine
     if _engine is not None:
         return
 
     logger.info("Initialising database engine", db_url=db_url)
     _engine = create_engine(db_url, future=True, pool_pre_ping=True)
+    if _engine.dialect.name == "sqlite":
+        _enable_sqlite_savepoints(_engine)
     SessionLocal.configure(bind=_engine)
     Base.metadata.create_all(bind=_engine)
+    migrations.upgrade(_engine)
+    logsearch.install(_engine)
+
+
+def _enable_sqlite_savepoints(engine: Engine) -> None:
+    """Let SQLAlchemy own SQLite transactions so ``begin_nested()`` savepoints work.
+
+    pysqlite otherwise defers ``BEGIN`` until the first write, which makes a
+    released SAVEPOINT commit on its own.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, _):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
 
 
 @contextmanager
@@ -0,0 +1,12 @@
+"""Gunicorn settings picked up from the working directory (see Dockerfile)."""
+
+
+def worker_exit(server, worker) -> None:
+    """Publish buffered ingest batches before the worker process goes away."""
+    # Imported here: importing the app at config load would set up Celery and
+    # the database in the master, before workers fork.
+    from api.services.batching import close_ingest_buffers
+
+    app = getattr(worker, "wsgi", None)
+    if app is not None:
+        close_ingest_buffers(app)
@@ -0,0 +1,65 @@
+"""Schema upgrades for databases created by an older release.
+
+``Base.metadata.create_all`` creates missing tables but never alters a table
+that already exists. Each step in :data:`STEPS` brings such a table up to
+the current models. Steps inspect the schema before changing it, so on a
+database ``create_all`` just built they do nothing. Applied steps are
+recorded in ``schema_migrations``.
+
+``init_db`` runs :func:`upgrade` at startup. To upgrade before rolling out
+(recommended for large tables, since index builds block writes), run::
+
+    python -m api.migrations
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+from loguru import logger
+from sqlalchemy import Column, DateTime, MetaData, String, Table, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from api.migrations import m0001_alert_delivery, m0002_log_keyset_index
+from api.utils.time import utc_now
+
+STEPS = (m0001_alert_delivery, m0002_log_keyset_index)
+
+_ledger = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(64), primary_key=True),
+    Column("applied_ts", DateTime(timezone=True), nullable=False),
+)
+
+
+def upgrade(engine: Engine) -> List[str]:
+    """Apply every step not yet recorded and return the versions applied.
+
+    Each step runs in its own transaction, which first claims the step's
+    ledger row. A second process upgrading at the same time waits on that
+    row and skips the step once the first one commits.
+    """
+    _ledger.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        done = set(conn.execute(select(_ledger.c.version)).scalars())
+
+    applied = []
+    for step in STEPS:
+        if step.VERSION in done:
+            continue
+        claimed = False
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(_ledger).values(version=step.VERSION, applied_ts=utc_now()))
+                claimed = True
+                step.upgrade(conn)
+        except IntegrityError:
+            if claimed:
+                raise
+            logger.info("Schema step applied by another process", version=step.VERSION)
+            continue
+        logger.info("Applied schema step", version=step.VERSION)
+        applied.append(step.VERSION)
+    return applied
@@ -0,0 +1,8 @@
+"""Upgrade the configured database: ``python -m api.migrations``."""
+
+from api.db import init_db
+from api.utils.config import load_config
+
+if __name__ == "__main__":
+    # init_db creates missing tables and then applies pending schema steps.
+    init_db(load_config().DB_URL)
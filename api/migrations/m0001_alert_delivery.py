@@ -0,0 +1,96 @@
+"""Alert delivery state and per-channel dedupe keys on ``alert_events``.
+
+Adds ``status``, ``sent_ts`` and ``last_error``, replaces the
+``uq_alert_dedupe_key`` constraint on ``dedupe_key`` by
+``uq_alert_dedupe_key_channel`` on ``(dedupe_key, channel)`` and creates the
+dedupe and digest indexes. Alerts written before the outbox existed were
+delivered inline when they were created, so they are marked ``sent`` at
+their ``ts``.
+
+SQLite cannot drop a table constraint, so there the table is rebuilt: the
+new table is created under a temporary name, rows are copied, the old table
+is dropped and the new one renamed (the procedure the SQLite docs give for
+``ALTER TABLE``).
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import MetaData, Table, UniqueConstraint, inspect
+from sqlalchemy.schema import AddConstraint, CreateTable, DropConstraint
+
+from api.models import AlertEvent, Service
+
+VERSION = "0001_alert_delivery"
+
+OLD_UNIQUE = "uq_alert_dedupe_key"
+NEW_UNIQUE = "uq_alert_dedupe_key_channel"
+# Values for columns missing from an old table: pre-outbox alerts were sent inline.
+_BACKFILL = {"status": "'sent'", "sent_ts": "ts", "last_error": "NULL"}
+
+
+def upgrade(conn) -> None:
+    table = AlertEvent.__table__
+    inspector = inspect(conn)
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    uniques = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+    missing = [name for name in _BACKFILL if name not in existing]
+    stale_unique = OLD_UNIQUE in uniques or NEW_UNIQUE not in uniques
+
+    if conn.dialect.name == "sqlite":
+        if missing or stale_unique:
+            _rebuild_sqlite(conn, existing)
+    else:
+        _alter(conn, missing, uniques)
+
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _rebuild_sqlite(conn, existing: set) -> None:
+    table = AlertEvent.__table__
+    metadata = MetaData()
+    Service.__table__.to_metadata(metadata)  # lets the foreign key resolve
+    staging = table.to_metadata(metadata, name=f"{table.name}_new")
+    # CreateTable emits the table with its constraints but without its indexes,
+    # whose names are still taken by the old table.
+    conn.execute(CreateTable(staging))
+
+    names = [column.name for column in table.columns]
+    values = [name if name in existing else _BACKFILL[name] for name in names]
+    conn.exec_driver_sql(
+        f"INSERT INTO {staging.name} ({', '.join(names)}) "
+        f"SELECT {', '.join(values)} FROM {table.name}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {staging.name} RENAME TO {table.name}")
+
+
+def _alter(conn, missing: list, uniques: set) -> None:
+    table = AlertEvent.__table__
+    for name in missing:
+        column = table.c[name]
+        if name == "status" and hasattr(column.type, "create"):
+            column.type.create(conn, checkfirst=True)  # Postgres ENUM type
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(conn.dialect)}"
+        if name == "status":
+            # The default fills existing rows; new rows get theirs from the model.
+            conn.exec_driver_sql(f"{ddl} NOT NULL DEFAULT {_BACKFILL[name]}")
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ALTER COLUMN status DROP DEFAULT")
+        else:
+            conn.exec_driver_sql(ddl)
+    if "sent_ts" in missing:
+        conn.exec_driver_sql(f"UPDATE {table.name} SET sent_ts = ts WHERE status = 'sent'")
+
+    constraints = {constraint.name: constraint for constraint in table.constraints}
+    if OLD_UNIQUE in uniques:
+        conn.execute(DropConstraint(_named_unique(OLD_UNIQUE)))
+    if NEW_UNIQUE not in uniques:
+        conn.execute(AddConstraint(constraints[NEW_UNIQUE]))
+
+
+def _named_unique(name: str) -> UniqueConstraint:
+    """A constraint bound to a stub table; only its name matters for DROP CONSTRAINT."""
+    stub = Table(AlertEvent.__tablename__, MetaData())
+    constraint = UniqueConstraint(name=name)
+    stub.append_constraint(constraint)
+    return constraint
@@ -0,0 +1,12 @@
+"""``ix_log_events_service_ts_id`` for keyset pagination of ``/api/logs``."""
+
+from __future__ import annotations
+
+from api.models import LogEvent
+
+VERSION = "0002_log_keyset_index"
+
+
+def upgrade(conn) -> None:
+    for index in LogEvent.__table__.indexes:
+        index.create(conn, checkfirst=True)
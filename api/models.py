@@ -10,6 +10,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
@@ -21,6 +22,8 @@ from sqlalchemy.orm import declarative_base, relationship
 Base = declarative_base()
 
 LOG_LEVELS = ("DEBUG", "INFO", "WARN", "ERROR", "CRITICAL")
+ALERT_STATUSES = ("pending", "sent", "failed")
+OUTBOX_STATUSES = ("pending", "sending", "sent", "failed")
 
 
 class Service(Base):
@@ -34,6 +37,9 @@ class Service(Base):
     metric_points = relationship(
         "MetricPoint", back_populates="service", cascade="all, delete-orphan"
     )
+    metric_rollups = relationship(
+        "MetricRollup", back_populates="service", cascade="all, delete-orphan"
+    )
     alerts = relationship("AlertEvent", back_populates="service", cascade="all, delete-orphan")
 
     def __repr__(self) -> str:  # pragma: no cover - introspection helper
@@ -42,6 +48,10 @@ class Service(Base):
 
 class LogEvent(Base):
     __tablename__ = "log_events"
+    __table_args__ = (
+        # Keyset pagination of a service's logs on (ts, id), see routes/query.get_logs.
+        Index("ix_log_events_service_ts_id", "service_id", "ts", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     service_id = Column(Integer, ForeignKey("services.id"), nullable=False, index=True)
@@ -79,10 +89,55 @@ class MetricPoint(Base):
         return f"<MetricPoint id={self.id} service={self.service_id} ts={self.ts}>"
 
 
+class MetricRollup(Base):
+    __tablename__ = "metric_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "service_id", "resolution_sec", "bucket_ts", name="uq_metric_rollup_service_res_bucket"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    service_id = Column(Integer, ForeignKey("services.id"), nullable=False, index=True)
+    resolution_sec = Column(Integer, nullable=False)
+    bucket_ts = Column(DateTime(timezone=True), nullable=False)
+    avg_error_rate = Column(Numeric(10, 4), nullable=False)
+    max_error_rate = Column(Numeric(10, 4), nullable=False)
+    max_p95_latency_ms = Column(Integer, nullable=False)
+    avg_tps = Column(Numeric(10, 4), nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    created_ts = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    service = relationship("Service", back_populates="metric_rollups")
+
+    def __repr__(self) -> str:  # pragma: no cover - introspection helper
+        return (
+            f"<MetricRollup service={self.service_id} res={self.resolution_sec} "
+            f"bucket={self.bucket_ts}>"
+        )
+
+
+class MetricRollupWatermark(Base):
+    """Per resolution, the bucket up to which ``metric_rollups`` is complete."""
+
+    __tablename__ = "metric_rollup_watermarks"
+
+    resolution_sec = Column(Integer, primary_key=True, autoincrement=False)
+    # Start of the newest (possibly still open) bucket compacted so far.
+    watermark_ts = Column(DateTime(timezone=True), nullable=False)
+    updated_ts = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self) -> str:  # pragma: no cover - introspection helper
+        return f"<MetricRollupWatermark res={self.resolution_sec} ts={self.watermark_ts}>"
+
+
 class AlertEvent(Base):
     __tablename__ = "alert_events"
     __table_args__ = (
-        UniqueConstraint("dedupe_key", name="uq_alert_dedupe_key"),
+        # One alert per channel for a given trigger; the second channel must not collide.
+        UniqueConstraint("dedupe_key", "channel", name="uq_alert_dedupe_key_channel"),
+        Index("ix_alert_events_service_dedupe_ts", "service_id", "dedupe_key", "ts"),
+        Index("ix_alert_events_channel_sent_ts", "channel", "sent_ts"),
     )
 
     id = Column(Integer, primary_key=True)
@@ -92,10 +147,43 @@ class AlertEvent(Base):
     severity = Column(Enum("info", "warn", "critical", name="alert_severity_enum"), nullable=False)
     message = Column(String(1024), nullable=False)
     dedupe_key = Column(String(255), nullable=False)
+    status = Column(
+        Enum(*ALERT_STATUSES, name="alert_status_enum"), nullable=False, default="pending"
+    )
+    sent_ts = Column(DateTime(timezone=True))
+    last_error = Column(String(512))
     created_ts = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     service = relationship("Service", back_populates="alerts")
+    outbox = relationship(
+        "AlertOutbox", back_populates="alert", cascade="all, delete-orphan", uselist=False
+    )
 
     def __repr__(self) -> str:  # pragma: no cover - introspection helper
         return f"<AlertEvent id={self.id} service={self.service_id} channel={self.channel}>"
 
+
+class AlertOutbox(Base):
+    """Delivery job for an alert, written in the same transaction as the alert."""
+
+    __tablename__ = "alert_outbox"
+
+    id = Column(Integer, primary_key=True)
+    alert_id = Column(Integer, ForeignKey("alert_events.id"), nullable=False, unique=True)
+    channel = Column(String(32), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(
+        Enum(*OUTBOX_STATUSES, name="alert_outbox_status_enum"),
+        nullable=False,
+        default="pending",
+        index=True,
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_ts = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_error = Column(String(512))
+    created_ts = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    alert = relationship("AlertEvent", back_populates="outbox")
+
+    def __repr__(self) -> str:  # pragma: no cover - introspection helper
+        return f"<AlertOutbox id={self.id} alert={self.alert_id} status={self.status}>"
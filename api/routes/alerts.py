@@ -5,7 +5,9 @@ from __future__ import annotations
 from flask import Blueprint, current_app, jsonify, request
 
 from api.db import session_scope
+from api.services import response_cache
 from api.services.alerts import dispatch_test_alert
+from api.services.pipeline import dispatch_alerts_task
 
 bp = Blueprint("alerts", __name__, url_prefix="/api")
 
@@ -18,4 +20,7 @@ def test_alert() -> tuple[dict, int]:
     with session_scope() as session:
         result = dispatch_test_alert(session, config, service_name=service)
 
+    if result["dispatched"]:
+        response_cache.bump(config, [response_cache.ALERTS_SCOPE])
+        dispatch_alerts_task.delay()
     return jsonify(result), 202
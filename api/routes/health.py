@@ -1,11 +1,14 @@
 """Health endpoint."""
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
+
+from api.services.batching import EXTENSION_KEY
 
 bp = Blueprint("health", __name__, url_prefix="/api")
 
 
 @bp.get("/health")
-def health() -> tuple[dict[str, str], int]:
-    return jsonify({"status": "ok"}), 200
-
+def health() -> tuple[dict, int]:
+    buffers = current_app.extensions.get(EXTENSION_KEY, {})
+    ingest = {name: buffer.stats() for name, buffer in buffers.items()}
+    return jsonify({"status": "ok", "ingest": ingest}), 200
@@ -6,7 +6,7 @@ from flask import Blueprint, current_app, jsonify, request
 from loguru import logger
 
 from api.schemas import LogRecord, MetricRecord, validate_log_batch, validate_metric_batch
-from api.services.pipeline import aggregate_metrics_task, parse_logs_task
+from api.services.batching import EXTENSION_KEY
 
 bp = Blueprint("ingest", __name__, url_prefix="/api")
 
@@ -45,15 +45,18 @@ def ingest_logs() -> tuple[dict, int]:
         return jsonify({"status": "error", "errors": errors}), 400
 
     serialized = [_serialize_log(record) for record in records]
-    task = parse_logs_task.delay(serialized)
-    logger.bind(component="api.ingest").info(
-        "Queued log ingestion batch", count=len(serialized), task_id=task.id
+    batch = current_app.extensions[EXTENSION_KEY]["logs"].submit(
+        serialized, size_bytes=request.content_length or 0
+    )
+    logger.bind(component="api.ingest").debug(
+        "Buffered log records", count=len(serialized), batch_id=batch["batch_id"]
     )
     return (
         jsonify(
             {
                 "status": "accepted",
-                "task_id": task.id,
+                "batch_id": batch["batch_id"],
+                "task_id": batch["task_id"],
                 "accepted": len(serialized),
                 "errors": errors,
             }
@@ -74,15 +77,18 @@ def ingest_metrics() -> tuple[dict, int]:
         return jsonify({"status": "error", "errors": errors}), 400
 
     serialized = [_serialize_metric(record) for record in records]
-    task = aggregate_metrics_task.delay(serialized)
-    logger.bind(component="api.ingest").info(
-        "Queued metric ingestion batch", count=len(serialized), task_id=task.id
+    batch = current_app.extensions[EXTENSION_KEY]["metrics"].submit(
+        serialized, size_bytes=request.content_length or 0
+    )
+    logger.bind(component="api.ingest").debug(
+        "Buffered metric records", count=len(serialized), batch_id=batch["batch_id"]
     )
     return (
         jsonify(
             {
                 "status": "accepted",
-                "task_id": task.id,
+                "batch_id": batch["batch_id"],
+                "task_id": batch["task_id"],
                 "accepted": len(serialized),
                 "errors": errors,
             }
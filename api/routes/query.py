@@ -2,55 +2,205 @@
 
 from __future__ import annotations
 
-from flask import Blueprint, jsonify, request
-from sqlalchemy import and_, func
+import base64
+import json
+from datetime import datetime
+from typing import Optional
 
-from api.db import session_scope
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy import and_, func, or_, select
+
+from api.db import SessionLocal, session_scope
 from api.models import AlertEvent, LogEvent, MetricPoint, Service
-from api.services.kpis import fetch_kpi_series
+from api.services import logsearch, response_cache
+from api.services.downsample import METHODS
+from api.services.kpis import DEFAULT_MIN_POINTS, fetch_kpi_series, fetch_metric_series
+from api.services.rollups import RESOLUTION_LABELS
 from api.utils.time import parse_range
 
 bp = Blueprint("query", __name__, url_prefix="/api")
 
+LOG_PAGE_SIZE = 500
+LOG_PAGE_MAX = 5000
+# Rows fetched per round trip when streaming NDJSON.
+LOG_STREAM_BATCH = 1000
+
+# Columns served by /api/logs, selected as plain rows rather than ORM objects.
+_LOG_COLUMNS = (
+    LogEvent.id,
+    Service.name,
+    LogEvent.ts,
+    LogEvent.level,
+    LogEvent.message,
+    LogEvent.latency_ms,
+    LogEvent.status_code,
+    LogEvent.meta,
+)
+
+
+def _downsample_args() -> tuple[Optional[int], str]:
+    """Parse the ``max_points`` and ``downsample`` query parameters."""
+    raw = request.args.get("max_points")
+    max_points = None
+    if raw:
+        try:
+            max_points = int(raw)
+        except ValueError:
+            raise ValueError("max_points must be an integer") from None
+        if max_points < 3:
+            raise ValueError("max_points must be at least 3")
+    method = request.args.get("downsample", "lttb").lower()
+    if method not in METHODS:
+        raise ValueError(f"downsample must be one of: {', '.join(METHODS)}")
+    return max_points, method
+
+
+def _since_arg() -> Optional[datetime]:
+    """Parse ``since``, the ``next_since`` token of a previous series response."""
+    raw = request.args.get("since")
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError("since must be an ISO 8601 timestamp") from None
+
 
 @bp.get("/logs")
-def get_logs() -> tuple[dict, int]:
+def get_logs():
+    """Newest-first log page, or every matching row as NDJSON with ``format=ndjson``.
+
+    Pages are ordered by ``(ts, id)`` descending. ``next_cursor`` is set
+    when the page is full and is passed back as ``cursor`` to continue
+    after the last row, so deep pages cost the same as the first one.
+    """
     service_name = request.args.get("service")
     level = request.args.get("level")
     query_text = request.args.get("q")
     range_value = request.args.get("range", "1h")
     start, end = parse_range(range_value)
+    stream = request.args.get("format") == "ndjson"
+
+    try:
+        after = _decode_cursor(request.args.get("cursor"))
+        limit = _log_limit(stream)
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+
+    filters = [LogEvent.ts >= start, LogEvent.ts <= end]
+    if service_name:
+        filters.append(Service.name == service_name)
+    if level:
+        filters.append(LogEvent.level == level.upper())
+    if after is not None:
+        after_ts, after_id = after
+        filters.append(
+            or_(LogEvent.ts < after_ts, and_(LogEvent.ts == after_ts, LogEvent.id < after_id))
+        )
+
+    if stream:
+        return Response(
+            _stream_logs(filters, query_text, limit, current_app.json.dumps),
+            mimetype="application/x-ndjson",
+        )
 
     with session_scope() as session:
-        q = session.query(LogEvent, Service.name).join(Service)
-        if service_name:
-            q = q.filter(Service.name == service_name)
-        if level:
-            q = q.filter(LogEvent.level == level.upper())
+        q = (
+            session.query(*_LOG_COLUMNS)
+            .join(Service)
+            .filter(*filters)
+            .order_by(LogEvent.ts.desc(), LogEvent.id.desc())
+        )
         if query_text:
-            q = q.filter(LogEvent.message.ilike(f"%{query_text}%"))
-        q = q.filter(and_(LogEvent.ts >= start, LogEvent.ts <= end))
-        q = q.order_by(LogEvent.ts.desc()).limit(500)
+            rows = logsearch.newest(session, q, query_text, limit)
+        else:
+            rows = q.limit(limit).all()
 
-        results = [
-            {
-                "id": log.id,
-                "service": svc_name,
-                "ts": log.ts.isoformat(),
-                "level": log.level,
-                "message": log.message,
-                "latency_ms": log.latency_ms,
-                "status_code": log.status_code,
-                "meta": log.meta or {},
-            }
-            for log, svc_name in q.all()
-        ]
+    results = [_log_item(row) for row in rows]
+    next_cursor = _encode_cursor(rows[-1].ts, rows[-1].id) if len(rows) == limit else None
+    return jsonify({"items": results, "next_cursor": next_cursor}), 200
+
+
+def _log_limit(stream: bool) -> Optional[int]:
+    raw = request.args.get("limit")
+    if not raw:
+        return None if stream else LOG_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError("limit must be an integer") from None
+    if limit < 1 or (not stream and limit > LOG_PAGE_MAX):
+        raise ValueError(f"limit must be between 1 and {LOG_PAGE_MAX}")
+    return limit
+
+
+def _encode_cursor(ts: datetime, log_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), log_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
-    return jsonify({"items": results}), 200
+
+def _decode_cursor(token: Optional[str]) -> Optional[tuple[datetime, int]]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        ts, log_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(log_id)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor") from None
+
+
+def _log_item(row) -> dict:
+    log_id, service, ts, log_level, message, latency_ms, status_code, meta = row
+    return {
+        "id": log_id,
+        "service": service,
+        "ts": ts,
+        "level": log_level,
+        "message": message,
+        "latency_ms": latency_ms,
+        "status_code": status_code,
+        "meta": meta or {},
+    }
+
+
+def _stream_logs(filters: list, query_text: Optional[str], limit: Optional[int], dumps):
+    """Yield matching rows as NDJSON, fetched in batches through a server-side cursor.
+
+    Only one batch of rows is held in memory at a time, however large the
+    export. Uses its own session because the request's scoped session is
+    torn down before a streamed body is consumed.
+    """
+    session = SessionLocal.session_factory()
+    try:
+        statement = (
+            select(*_LOG_COLUMNS)
+            .join(Service, Service.id == LogEvent.service_id)
+            .where(*filters)
+            .order_by(LogEvent.ts.desc(), LogEvent.id.desc())
+        )
+        if query_text:
+            match = logsearch.condition(session, query_text)
+            if match is not None:
+                statement = statement.where(match)
+        if limit is not None:
+            statement = statement.limit(limit)
+        result = session.execute(statement.execution_options(yield_per=LOG_STREAM_BATCH))
+        for rows in result.partitions():
+            yield "".join(dumps(_log_item(row)) + "\n" for row in rows)
+    finally:
+        session.close()
 
 
 @bp.get("/metrics")
+@response_cache.cached()
 def get_metrics() -> tuple[dict, int]:
+    """Metric series for ``service`` over ``range``.
+
+    With ``since`` (the ``next_since`` of the previous response) only points
+    at or after it are returned; the client replaces its series from the
+    first returned point on, which also picks up a re-aggregated last point.
+    """
     service_name = request.args.get("service")
     if not service_name:
         return jsonify({"status": "error", "message": "service query parameter required"}), 400
@@ -58,33 +208,33 @@ def get_metrics() -> tuple[dict, int]:
     range_value = request.args.get("range", "1h")
     start, end = parse_range(range_value)
 
+    min_points = current_app.config.get("METRIC_SERIES_MIN_POINTS", DEFAULT_MIN_POINTS)
+    try:
+        max_points, method = _downsample_args()
+        since = _since_arg()
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+
     with session_scope() as session:
-        points = (
-            session.query(MetricPoint)
-            .join(Service)
-            .filter(
-                Service.name == service_name,
-                MetricPoint.ts >= start,
-                MetricPoint.ts <= end,
-            )
-            .order_by(MetricPoint.ts.asc())
-            .all()
+        items, resolution = fetch_metric_series(
+            session, service_name, start, end, min_points, max_points, method, since
         )
 
-        items = [
+    return (
+        jsonify(
             {
-                "ts": point.ts.isoformat(),
-                "tps": float(point.tps),
-                "error_rate": float(point.error_rate),
-                "p95_latency_ms": point.p95_latency_ms,
+                "service": service_name,
+                "resolution": RESOLUTION_LABELS[resolution],
+                "items": items,
+                "next_since": items[-1]["ts"] if items else since,
             }
-            for point in points
-        ]
-
-    return jsonify({"service": service_name, "items": items}), 200
+        ),
+        200,
+    )
 
 
 @bp.get("/kpis")
+@response_cache.cached()
 def get_kpis() -> tuple[dict, int]:
     service_name = request.args.get("service")
     if not service_name:
@@ -93,35 +243,53 @@ def get_kpis() -> tuple[dict, int]:
     range_value = request.args.get("range", "1h")
     start, end = parse_range(range_value)
 
+    min_points = current_app.config.get("METRIC_SERIES_MIN_POINTS", DEFAULT_MIN_POINTS)
+    try:
+        max_points, method = _downsample_args()
+        since = _since_arg()
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+
     with session_scope() as session:
-        data = fetch_kpi_series(session, service_name, start, end)
+        data = fetch_kpi_series(
+            session, service_name, start, end, min_points, max_points, method, since
+        )
 
     return jsonify(data), 200
 
 
 @bp.get("/alerts")
+@response_cache.cached(response_cache.ALERTS_SCOPE)
 def get_alerts() -> tuple[dict, int]:
     limit = int(request.args.get("limit", 50))
 
     with session_scope() as session:
-        rows = (
-            session.query(AlertEvent, Service.name)
-            .join(Service)
+        rows = session.execute(
+            select(
+                AlertEvent.id,
+                Service.name,
+                AlertEvent.channel,
+                AlertEvent.severity,
+                AlertEvent.message,
+                AlertEvent.status,
+                AlertEvent.ts,
+            )
+            .join(Service, Service.id == AlertEvent.service_id)
             .order_by(AlertEvent.ts.desc())
             .limit(limit)
-            .all()
-        )
+        ).all()
 
-        items = [
-            {
-                "id": alert.id,
-                "service": svc,
-                "channel": alert.channel,
-                "severity": alert.severity,
-                "message": alert.message,
-                "ts": alert.ts.isoformat(),
-            }
-            for alert, svc in rows
-        ]
+    items = [
+        {
+            "id": alert_id,
+            "service": svc,
+            "channel": channel,
+            "severity": severity,
+            "message": message,
+            "status": status,
+            "ts": ts,
+        }
+        for alert_id, svc, channel, severity, message, status, ts in rows
+    ]
 
     return jsonify({"items": items}), 200
@@ -3,49 +3,53 @@
 from __future__ import annotations
 
 import json
-import smtplib
+import time
 from collections import defaultdict
-from datetime import timedelta
+from datetime import timedelta, timezone
 from email.message import EmailMessage
 from typing import Dict, Iterable, List, Optional
-from urllib import request as urlrequest
 
 from loguru import logger
-from sqlalchemy import and_
+from sqlalchemy import and_, event
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
-from api.models import AlertEvent, Service
+from api.models import AlertEvent, AlertOutbox, Service
+from api.services import rules, transports
+from api.utils.cache import TTLCache
 from api.utils.time import utc_now
 
+# Services listed individually in a digest; the rest are summarised in one line.
+DIGEST_MAX_SERVICES = 25
+_SEVERITY_RANK = {"info": 0, "warn": 1, "critical": 2}
 
-def handle_alerts(session, service: Service, snapshot: dict, anomaly: dict, config: dict) -> List[dict]:
-    """Check thresholds and anomalies and dispatch alerts if needed."""
-    threshold_error_rate = config.get("ALERT_ERROR_RATE_THRESHOLD", 0.05)
-    threshold_latency = config.get("ALERT_P95_LATENCY_MS", 500)
-    window_min = config.get("FLOWGUARD_ALERT_WINDOW_MIN", 10)
-    channels = config.get("ALERT_CHANNELS", [])
 
-    triggers: List[dict] = []
+def handle_alerts(
+    session,
+    service: Service,
+    snapshot: dict,
+    anomaly: dict,
+    config: dict,
+    triggers: Optional[List[dict]] = None,
+) -> List[dict]:
+    """Queue alerts for fired rules and anomalies.
 
-    if snapshot["error_rate"] >= threshold_error_rate:
-        severity = "critical" if snapshot["error_rate"] >= threshold_error_rate * 2 else "warn"
-        triggers.append(
-            {
-                "reason": "error_rate_threshold",
-                "severity": severity,
-                "message": f"Error rate {snapshot['error_rate']:.2%} exceeded threshold",
-            }
-        )
+    ``triggers`` are the rule triggers for this snapshot when the caller
+    already evaluated the rules for a whole batch (see
+    :func:`api.services.rules.evaluate_snapshots`); otherwise the rules are
+    evaluated here for this snapshot alone and their state is saved when
+    the caller's transaction commits. Alerts are written with a
+    matching ``alert_outbox`` row in the caller's transaction; delivery
+    happens asynchronously in :mod:`api.services.outbox`.
+    """
+    window_min = config.get("FLOWGUARD_ALERT_WINDOW_MIN", 10)
+    channels = config.get("ALERT_CHANNELS", [])
 
-    if snapshot["p95_latency_ms"] >= threshold_latency:
-        severity = "critical" if snapshot["p95_latency_ms"] >= threshold_latency * 1.5 else "warn"
-        triggers.append(
-            {
-                "reason": "latency_threshold",
-                "severity": severity,
-                "message": f"p95 latency {snapshot['p95_latency_ms']}ms exceeded threshold",
-            }
-        )
+    if triggers is None:
+        evaluation = rules.evaluate_snapshots([snapshot], config, time.time())
+        session.info.setdefault(_PENDING_RULE_STATES, []).append(evaluation)
+        triggers = evaluation.triggers[0]
+    triggers = list(triggers)
 
     if anomaly.get("is_anomaly"):
         triggers.append(
@@ -60,48 +64,64 @@ def handle_alerts(session, service: Service, snapshot: dict, anomaly: dict, conf
     if not triggers:
         return dispatched
 
+    now = utc_now()
+    cache = _dedupe_cache(config)
     for trigger in triggers:
         dedupe_key = f"{service.name}:{trigger['reason']}:{snapshot['ts'][:16]}"
-        if _is_duplicate(session, service.id, dedupe_key, window_min):
+        if _is_duplicate(session, service.id, dedupe_key, window_min, cache):
             continue
         for channel in channels:
-            if _dispatch_channel(channel, service, snapshot, trigger, config):
-                alert = AlertEvent(
-                    service_id=service.id,
-                    ts=utc_now(),
-                    channel=channel,
-                    severity=trigger["severity"],
-                    message=trigger["message"],
-                    dedupe_key=dedupe_key,
-                )
-                session.add(alert)
-                dispatched.append(
-                    {
-                        "channel": channel,
-                        "severity": trigger["severity"],
-                        "message": trigger["message"],
-                    }
-                )
-
-    try:
-        session.flush()
-    except IntegrityError:  # pragma: no cover - dedupe floor
-        session.rollback()
+            channel = channel.lower()
+            if not _channel_configured(channel, config):
+                continue
+            alert = AlertEvent(
+                service_id=service.id,
+                ts=now,
+                channel=channel,
+                severity=trigger["severity"],
+                message=trigger["message"],
+                dedupe_key=dedupe_key,
+                status="pending",
+            )
+            # Delivered later by the outbox dispatcher, never inside this transaction.
+            alert.outbox = AlertOutbox(
+                channel=channel,
+                payload=_payload(service, snapshot, trigger),
+                next_attempt_ts=now,
+            )
+            # A savepoint per alert: losing a race with another worker on
+            # (dedupe_key, channel) drops only that alert, not the caller's transaction.
+            try:
+                with session.begin_nested():
+                    session.add(alert)
+            except IntegrityError:
+                logger.debug("Alert already recorded", dedupe_key=dedupe_key, channel=channel)
+                continue
+            dispatched.append(
+                {
+                    "channel": channel,
+                    "severity": trigger["severity"],
+                    "message": trigger["message"],
+                    "status": "pending",
+                }
+            )
+        _remember_on_commit(session, cache, (service.id, dedupe_key), window_min)
 
     return dispatched
 
 
 def dispatch_test_alert(session, config: dict, service_name: Optional[str] = None) -> dict:
-    """Send a test alert across configured channels."""
+    """Send a test alert across configured channels.
+
+    The alert carries its own ``test_alert`` trigger, so the rules are not
+    run against the fabricated snapshot and the service's rule state is left
+    untouched.
+    """
     service_label = service_name or "demo"
-    service = (
-        session.query(Service).filter(Service.name == service_label).one_or_none()
-        if service_name
-        else None
-    )
+    service = session.query(Service).filter(Service.name == service_label).one_or_none()
     if service is None:
         service = Service(name=service_label)
-        session.merge(service)
+        session.add(service)
         session.flush()
 
     snapshot = {
@@ -111,94 +131,201 @@ def dispatch_test_alert(session, config: dict, service_name: Optional[str] = Non
         "p95_latency_ms": int(config.get("ALERT_P95_LATENCY_MS", 500) * 1.1),
         "tps": 0.0,
     }
-    anomaly = {"is_anomaly": True, "reason": "Test alert"}
-    dispatched = handle_alerts(session, service, snapshot, anomaly, config)
+    trigger = {"reason": "test_alert", "severity": "warn", "message": "Test alert"}
+    dispatched = handle_alerts(
+        session, service, snapshot, {"is_anomaly": False}, config, triggers=[trigger]
+    )
 
     return {"status": "accepted", "dispatched": dispatched}
 
 
-def _dispatch_channel(channel: str, service: Service, snapshot: dict, trigger: dict, config: dict) -> bool:
-    channel = channel.lower()
+class AlertDeliveryError(Exception):
+    """Raised when a channel rejects or cannot receive an alert."""
+
+
+def _channel_configured(channel: str, config: dict) -> bool:
     if channel == "slack":
-        return _send_slack(service, snapshot, trigger, config)
+        if not config.get("SLACK_WEBHOOK_URL"):
+            logger.debug("Slack webhook not configured; skipping alert")
+            return False
+        return True
     if channel == "email":
-        return _send_email(service, snapshot, trigger, config)
+        # SMTP_USER/SMTP_PASS are optional: relays on a private network often skip auth.
+        required = ("SMTP_HOST", "SMTP_TO", "SMTP_FROM")
+        if not all(config.get(key) for key in required):
+            logger.debug("Email alert not fully configured; skipping")
+            return False
+        return True
     logger.warning("Unsupported alert channel", channel=channel)
     return False
 
 
-def _send_slack(service: Service, snapshot: dict, trigger: dict, config: dict) -> bool:
-    webhook = config.get("SLACK_WEBHOOK_URL")
-    if not webhook:
-        logger.debug("Slack webhook not configured; skipping alert")
-        return False
+def _payload(service: Service, snapshot: dict, trigger: dict) -> dict:
+    return {
+        "service": service.name,
+        "reason": trigger["reason"],
+        "message": trigger["message"],
+        "severity": trigger["severity"],
+        "error_rate": snapshot["error_rate"],
+        "p95_latency_ms": snapshot["p95_latency_ms"],
+        "tps": snapshot["tps"],
+    }
+
+
+def deliver(channel: str, payload: dict, config: dict) -> None:
+    """Send one queued alert, raising :class:`AlertDeliveryError` on failure."""
+    if channel == "slack":
+        _send_slack(payload, config)
+    elif channel == "email":
+        _send_email(payload, config)
+    else:
+        raise AlertDeliveryError(f"Unsupported alert channel: {channel}")
+
 
-    payload = {
+def deliver_digest(channel: str, payloads: List[dict], config: dict) -> None:
+    """Send several queued alerts as one digest message with per-service counts."""
+    services: Dict[str, dict] = {}
+    for payload in payloads:
+        entry = services.setdefault(
+            payload["service"], {"count": 0, "severity": "info", "reasons": []}
+        )
+        entry["count"] += 1
+        if _SEVERITY_RANK[payload["severity"]] > _SEVERITY_RANK[entry["severity"]]:
+            entry["severity"] = payload["severity"]
+        reason = payload.get("reason", payload["message"])
+        if reason not in entry["reasons"]:
+            entry["reasons"].append(reason)
+    ranked = sorted(
+        services.items(),
+        key=lambda item: (-_SEVERITY_RANK[item[1]["severity"]], -item[1]["count"], item[0]),
+    )
+    lines = [
+        f"{name}: {entry['count']} alert(s), {entry['severity']} ({', '.join(entry['reasons'])})"
+        for name, entry in ranked[:DIGEST_MAX_SERVICES]
+    ]
+    if len(ranked) > DIGEST_MAX_SERVICES:
+        lines.append(f"...and {len(ranked) - DIGEST_MAX_SERVICES} more service(s)")
+    summary = f"{len(payloads)} alerts across {len(services)} service(s)"
+
+    if channel == "slack":
+        text = f"*FlowGuard alert digest*: {summary}\n" + "\n".join(f"• {line}" for line in lines)
+        _post_slack({"text": text}, config)
+    elif channel == "email":
+        _send_message(f"FlowGuard alert digest: {summary}", "\n".join(lines) + "\n", config)
+    else:
+        raise AlertDeliveryError(f"Unsupported alert channel: {channel}")
+
+
+def _send_slack(payload: dict, config: dict) -> None:
+    body = {
         "text": (
-            f"*FlowGuard alert* for `{service.name}`\\n"
-            f"{trigger['message']}\\n"
-            f"Error rate: {snapshot['error_rate']:.2%}, "
-            f"p95 latency: {snapshot['p95_latency_ms']}ms, "
-            f"TPS: {snapshot['tps']:.2f}"
+            f"*FlowGuard alert* for `{payload['service']}`\\n"
+            f"{payload['message']}\\n"
+            f"Error rate: {payload['error_rate']:.2%}, "
+            f"p95 latency: {payload['p95_latency_ms']}ms, "
+            f"TPS: {payload['tps']:.2f}"
         )
     }
-    try:
-        req = urlrequest.Request(
-            webhook, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
-        )
-        with urlrequest.urlopen(req, timeout=5) as resp:
-            return 200 <= resp.status < 300
-    except Exception as exc:  # pragma: no cover - IO
-        logger.warning("Slack alert failed", error=str(exc))
-        return False
+    _post_slack(body, config)
 
 
-def _send_email(service: Service, snapshot: dict, trigger: dict, config: dict) -> bool:
-    host = config.get("SMTP_HOST")
-    user = config.get("SMTP_USER")
-    password = config.get("SMTP_PASS")
-    to_addr = config.get("SMTP_TO")
-    from_addr = config.get("SMTP_FROM")
+def _post_slack(body: dict, config: dict) -> None:
+    transport = transports.get_http_transport(config)
+    status = transport.post_json(config["SLACK_WEBHOOK_URL"], json.dumps(body).encode("utf-8"))
+    if not 200 <= status < 300:
+        raise AlertDeliveryError(f"Slack webhook returned HTTP {status}")
 
-    if not all([host, user, password, to_addr, from_addr]):
-        logger.debug("Email alert not fully configured; skipping")
-        return False
 
-    subject = f"FlowGuard alert: {service.name}"
+def _send_email(payload: dict, config: dict) -> None:
+    subject = f"FlowGuard alert: {payload['service']}"
     body = (
-        f"Service: {service.name}\\n"
-        f"Reason: {trigger['message']}\\n"
-        f"Error rate: {snapshot['error_rate']:.2%}\\n"
-        f"p95 latency: {snapshot['p95_latency_ms']}ms\\n"
-        f"TPS: {snapshot['tps']:.2f}\\n"
+        f"Service: {payload['service']}\\n"
+        f"Reason: {payload['message']}\\n"
+        f"Error rate: {payload['error_rate']:.2%}\\n"
+        f"p95 latency: {payload['p95_latency_ms']}ms\\n"
+        f"TPS: {payload['tps']:.2f}\\n"
     )
+    _send_message(subject, body, config)
 
+
+def _send_message(subject: str, body: str, config: dict) -> None:
     message = EmailMessage()
     message["Subject"] = subject
-    message["From"] = from_addr
-    message["To"] = to_addr
+    message["From"] = config["SMTP_FROM"]
+    message["To"] = config["SMTP_TO"]
     message.set_content(body)
 
-    try:
-        with smtplib.SMTP(host, config.get("SMTP_PORT", 587)) as smtp:
-            smtp.starttls()
-            smtp.login(user, password)
-            smtp.send_message(message)
-        return True
-    except Exception as exc:  # pragma: no cover - IO
-        logger.warning("Email alert failed", error=str(exc))
-        return False
+    transports.get_smtp_transport(config).send(message)
+
+
+_dedupe_caches: Dict[int, TTLCache] = {}
 
 
-def _is_duplicate(session, service_id: int, dedupe_key: str, window_min: int) -> bool:
-    cutoff = utc_now() - timedelta(minutes=window_min)
-    exists = (
-        session.query(AlertEvent)
+def _dedupe_cache(config: dict) -> TTLCache:
+    """Process-wide cache of ``(service_id, dedupe_key)`` pairs alerted on recently."""
+    size = config.get("ALERT_DEDUPE_CACHE_SIZE", 10000)
+    if size not in _dedupe_caches:
+        window_sec = config.get("FLOWGUARD_ALERT_WINDOW_MIN", 10) * 60
+        _dedupe_caches[size] = TTLCache(maxsize=size, ttl=window_sec)
+    return _dedupe_caches[size]
+
+
+def _is_duplicate(
+    session, service_id: int, dedupe_key: str, window_min: int, cache: TTLCache
+) -> bool:
+    """True when the key was alerted on within ``window_min`` minutes.
+
+    The cache only ever holds positive answers, so a miss (e.g. the alert
+    was raised by another worker) falls through to an indexed lookup whose
+    result is cached until it leaves the window.
+    """
+    key = (service_id, dedupe_key)
+    if key in cache:
+        return True
+    now = utc_now()
+    last_ts = (
+        session.query(AlertEvent.ts)
         .filter(
             AlertEvent.service_id == service_id,
             AlertEvent.dedupe_key == dedupe_key,
-            AlertEvent.ts >= cutoff,
+            AlertEvent.ts >= now - timedelta(minutes=window_min),
         )
-        .first()
+        .order_by(AlertEvent.ts.desc())
+        .limit(1)
+        .scalar()
     )
-    return exists is not None
+    if last_ts is None:
+        return False
+    if last_ts.tzinfo is None:
+        last_ts = last_ts.replace(tzinfo=timezone.utc)
+    remaining = (last_ts + timedelta(minutes=window_min) - now).total_seconds()
+    cache.set(key, True, expires_at=time.monotonic() + remaining)
+    return True
+
+
+_PENDING_DEDUPE = "flowguard.pending_alert_dedupe"
+_PENDING_RULE_STATES = "flowguard.pending_rule_states"
+
+
+def _remember_on_commit(session, cache: TTLCache, key: tuple, window_min: int) -> None:
+    # Only cache once committed, so a rolled-back alert never suppresses a retry.
+    expires_at = time.monotonic() + window_min * 60
+    session.info.setdefault(_PENDING_DEDUPE, []).append((cache, key, expires_at))
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_alerts(session) -> None:
+    # Also fired when a savepoint is released; wait for the outer commit.
+    if session.in_nested_transaction():
+        return
+    for cache, key, expires_at in session.info.pop(_PENDING_DEDUPE, ()):
+        cache.set(key, True, expires_at=expires_at)
+    for evaluation in session.info.pop(_PENDING_RULE_STATES, ()):
+        evaluation.save()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back_alerts(session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_DEDUPE, None)
+        session.info.pop(_PENDING_RULE_STATES, None)
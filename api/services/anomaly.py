@@ -2,28 +2,20 @@
 
 from __future__ import annotations
 
-from collections import defaultdict, deque
-from dataclasses import dataclass
-from statistics import mean, pstdev
-from typing import Deque, Dict, Optional
+import time
+from typing import Callable, List, Sequence
 
 import numpy as np
 from loguru import logger
 from sklearn.ensemble import IsolationForest
 
-WINDOW_SIZE = 64
-MIN_POINTS = 12
-
-
-@dataclass
-class DetectorState:
-    window: Deque[np.ndarray]
-    model: Optional[IsolationForest] = None
-
+from api.services import detector_state, streaming
+from api.services.celery_app import TRAIN_DETECTOR_TASK, TRAINING_QUEUE, celery
+from api.services.detector_state import WINDOW_SIZE, DetectorState, DetectorStore
 
-_detectors: Dict[str, DetectorState] = defaultdict(
-    lambda: DetectorState(window=deque(maxlen=WINDOW_SIZE))
-)
+MIN_POINTS = 12
+# Smallest per-feature spread used when measuring drift, so flat series still refit on a shift.
+_DRIFT_EPSILON = 1e-6
 
 
 def _to_vector(snapshot: dict) -> np.ndarray:
@@ -37,53 +29,197 @@ def _to_vector(snapshot: dict) -> np.ndarray:
     )
 
 
-def evaluate(service_name: str, snapshot: dict, config: dict) -> dict:
-    """Evaluate anomaly scores for a KPI snapshot."""
-    state = _detectors[service_name]
-    vector = _to_vector(snapshot)
-    state.window.append(vector)
+def _fit(state: DetectorState, data: np.ndarray) -> IsolationForest:
+    model = IsolationForest(
+        n_estimators=50,
+        contamination=0.1,
+        random_state=42,
+    )
+    model.fit(data)
+    state.model = model
+    state.model_version += 1
+    state.fit_count = state.count
+    state.fitted_at = time.time()
+    state.fit_mean = data.mean(axis=0)
+    state.fit_std = data.std(axis=0)
+    return model
+
+
+def _needs_refit(state: DetectorState, data: np.ndarray, config: dict) -> bool:
+    """Refit after ``ANOMALY_REFIT_POINTS`` points, ``ANOMALY_REFIT_SEC`` seconds or on drift.
+
+    Drift is flagged when the mean of the newest ``MIN_POINTS`` vectors has
+    moved more than ``ANOMALY_DRIFT_Z`` standard deviations (of the data the
+    model was fitted on) away from the fit-time mean for any feature.
+    """
+    if state.model is None:
+        return True
+    if state.points_since_fit >= config.get("ANOMALY_REFIT_POINTS", 32):
+        return True
+    if time.time() - state.fitted_at >= config.get("ANOMALY_REFIT_SEC", 300.0):
+        return True
+    recent = data[-MIN_POINTS:].mean(axis=0)
+    spread = np.maximum(state.fit_std, _DRIFT_EPSILON)
+    drift = float(np.max(np.abs(recent - state.fit_mean) / spread))
+    return drift >= config.get("ANOMALY_DRIFT_Z", 3.0)
 
-    if len(state.window) < MIN_POINTS:
-        return {"is_anomaly": False, "reason": None, "score": 0.0}
 
+def evaluate(service_name: str, snapshot: dict, config: dict) -> dict:
+    """Evaluate anomaly scores for a KPI snapshot.
+
+    State is loaded from and written back to the configured detector store
+    (``ANOMALY_STATE_BACKEND``), so every worker sees the same history.
+    Every snapshot is first scored by the constant-time EWMA, Welford and
+    median/MAD detectors in :mod:`api.services.streaming`; only those
+    scoring at least ``ANOMALY_SUSPECT_Z`` reach the ``IsolationForest``,
+    which is reused until :func:`_needs_refit` asks for a new one. Its score
+    and prediction come from a single ``score_samples`` call, shifted by the
+    model's ``offset_`` exactly as ``decision_function`` does.
+    """
+    return _evaluate_batch([service_name], [snapshot], config)[0]
+
+
+def evaluate_many(snapshots: Sequence[dict], config: dict) -> List[dict]:
+    """Evaluate one KPI snapshot per service in a single vectorized pass.
+
+    Services are taken from each snapshot's ``service`` key. Detector state
+    for the whole batch is loaded at once, stacked into 2-D arrays and
+    screened and updated with one call each; only suspicious services are
+    then scored individually by their ``IsolationForest``. Results are in
+    the order of ``snapshots`` and match :func:`evaluate`.
+    """
+    return _evaluate_batch([snapshot["service"] for snapshot in snapshots], snapshots, config)
+
+
+def _evaluate_batch(
+    service_names: Sequence[str], snapshots: Sequence[dict], config: dict
+) -> List[dict]:
+    if not snapshots:
+        return []
+    store = detector_state.get_store(config)
+    states = store.load_many(service_names)
+    versions = [state.model_version for state in states]
+    vectors = np.stack([_to_vector(snapshot) for snapshot in snapshots])
+    counts = np.array([state.count for state in states], dtype=np.int64)
+    online = np.stack([state.online for state in states])
+
+    screens = np.zeros(len(states))
+    ready = np.minimum(counts, WINDOW_SIZE) >= MIN_POINTS
+    if ready.any():
+        windows = np.stack([states[index].window for index in np.flatnonzero(ready)])
+        windows = windows.astype(np.float64)
+        windows[np.arange(WINDOW_SIZE)[None, :] >= counts[ready][:, None]] = np.nan
+        screens[ready] = streaming.scores(online[ready], counts[ready], windows, vectors[ready])
+    streaming.update(online, counts, vectors, config.get("ANOMALY_EWMA_ALPHA", 0.1))
+
+    suspect_z = config.get("ANOMALY_SUSPECT_Z", 3.0)
+    results: List[dict] = []
+    for index, (state, snapshot) in enumerate(zip(states, snapshots)):
+        state.online = online[index]
+        state.append(vectors[index])
+        screen = float(screens[index])
+        if len(state) < MIN_POINTS:
+            results.append({"is_anomaly": False, "reason": None, "score": 0.0})
+        elif screen < suspect_z:
+            results.append({"is_anomaly": False, "reason": None, "score": screen})
+        else:
+            name = service_names[index]
+            results.append(
+                _confirm(
+                    state,
+                    vectors[index],
+                    snapshot,
+                    screen,
+                    config,
+                    lambda: _request_training(store, name, config),
+                )
+            )
+
+    store.save_many(
+        [
+            (name, state, state.model_version != version)
+            for name, state, version in zip(service_names, states, versions)
+        ]
+    )
+    return results
+
+
+def _confirm(
+    state: DetectorState,
+    vector: np.ndarray,
+    snapshot: dict,
+    screen: float,
+    config: dict,
+    request_refit: Callable[[], None],
+) -> dict:
+    """Run a suspicious snapshot through the IsolationForest.
+
+    With ``ANOMALY_TRAINER=inline`` a due refit happens here; otherwise
+    ``request_refit`` queues it and the current model keeps scoring until
+    the trainer swaps in the new one. Without any model yet, or if scoring
+    fails, the streaming verdict stands.
+    """
     try:
-        model = IsolationForest(
-            n_estimators=50,
-            contamination=0.1,
-            random_state=42,
-        )
-        data = np.stack(tuple(state.window))
-        model.fit(data)
-        score = float(model.decision_function([vector])[0])
-        prediction = int(model.predict([vector])[0])
-        state.model = model
-        if prediction == -1:
-            reason = _build_reason(snapshot)
-            return {"is_anomaly": True, "reason": reason, "score": score}
+        data = state.values()
+        if _needs_refit(state, data, config):
+            if _trainer(config) == "inline":
+                _fit(state, data)
+            else:
+                request_refit()
+        model = state.model
+        if model is not None:
+            score = float(model.score_samples(vector.reshape(1, -1))[0] - model.offset_)
     except Exception as exc:  # pragma: no cover - defensive
-        logger.warning("IsolationForest failed, falling back to z-score", error=str(exc))
+        logger.warning("IsolationForest failed, falling back to streaming score", error=str(exc))
+        model = None
 
-    # Fallback to simple z-score detection
-    error_rate_z = _z_score([vec[0] for vec in state.window], vector[0])
-    latency_z = _z_score([vec[1] for vec in state.window], vector[1])
-    tps_z = _z_score([vec[2] for vec in state.window], vector[2])
+    if model is None:
+        # The screen already crossed the suspicion threshold.
+        return {"is_anomaly": True, "reason": _build_reason(snapshot), "score": screen}
+    if score < 0:
+        return {"is_anomaly": True, "reason": _build_reason(snapshot), "score": score}
+    return {"is_anomaly": False, "reason": None, "score": score}
 
-    max_score = max(abs(error_rate_z), abs(latency_z), abs(tps_z))
-    if max_score >= 3:
-        reason = _build_reason(snapshot)
-        return {"is_anomaly": True, "reason": reason, "score": float(max_score)}
 
-    return {"is_anomaly": False, "reason": None, "score": float(max_score)}
+def _trainer(config: dict) -> str:
+    # A process-local store cannot be shared with a trainer worker.
+    if config.get("ANOMALY_STATE_BACKEND", "redis") == "memory":
+        return "inline"
+    return config.get("ANOMALY_TRAINER", "celery")
 
 
-def _z_score(series, value) -> float:
-    if len(series) < 2:
-        return 0.0
-    mu = mean(series)
-    sigma = pstdev(series)
-    if sigma == 0:
-        return 0.0
-    return (value - mu) / sigma
+def _request_training(store: DetectorStore, service_name: str, config: dict) -> None:
+    """Queue a refit on the training queue unless one is already pending."""
+    if not store.claim_training(service_name, config.get("ANOMALY_TRAIN_TIMEOUT_SEC", 300)):
+        return
+    try:
+        celery.send_task(TRAIN_DETECTOR_TASK, args=[service_name], queue=TRAINING_QUEUE)
+    except Exception as exc:  # pragma: no cover - broker IO
+        store.release_training(service_name)
+        logger.warning("Failed to queue detector training", service=service_name, error=str(exc))
+
+
+def train(service_name: str, config: dict) -> bool:
+    """Fit a new model from the service's current window and swap it in.
+
+    Runs on the training queue, away from ingest and evaluation. Only the
+    model keys are written, in one transaction, so evaluators pick up the
+    new version on their next load while never waiting for the fit.
+    """
+    store = detector_state.get_store(config)
+    try:
+        state = store.load(service_name)
+        if len(state) < MIN_POINTS:
+            return False
+        _fit(state, state.values())
+        saved = store.save_model(service_name, state)
+    finally:
+        store.release_training(service_name)
+    if not saved:
+        logger.info("Discarded detector fit; a newer model is stored", service=service_name)
+        return False
+    logger.info("Trained anomaly detector", service=service_name, version=state.model_version)
+    return True
 
 
 def _build_reason(snapshot: dict) -> str:
@@ -0,0 +1,272 @@
+"""Micro-batching of accepted ingest payloads in front of Celery."""
+
+from __future__ import annotations
+
+import atexit
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from flask import Flask
+from loguru import logger
+
+from api.services.pipeline import aggregate_metrics_task, parse_logs_task
+
+EXTENSION_KEY = "flowguard.ingest_buffers"
+
+
+@dataclass
+class PendingBatch:
+    batch_id: str
+    task_id: str
+    opened_at: float
+    records: List[dict] = field(default_factory=list)
+    size_bytes: int = 0
+    # Failed publish attempts and when the next one is due (monotonic clock).
+    attempts: int = 0
+    retry_at: float = 0.0
+
+
+class IngestBuffer:
+    """Coalesce records from many requests into one Celery task.
+
+    A batch is sent once it holds ``max_records`` records or ``max_bytes``
+    bytes of request payload, or ``max_delay_ms`` after it was opened,
+    whichever comes first. Task ids are allocated when a batch opens so the
+    API can report them to clients before the task is actually published.
+
+    A batch the broker rejects keeps its task id and is re-published by the
+    flusher after ``publish_backoff_ms``, doubling per attempt, up to
+    ``publish_retries`` times. At most ``max_pending`` batches wait for a
+    retry; beyond that, or once its retries run out, a batch is dropped.
+    Drops are logged and counted in :meth:`stats`.
+
+    :meth:`close` spends at most ``close_timeout_ms`` publishing what is
+    left, so a broker outage cannot hold up process exit; batches still
+    waiting after that are dropped.
+    """
+
+    def __init__(
+        self,
+        task,
+        *,
+        max_records: int,
+        max_bytes: int,
+        max_delay_ms: int,
+        name: str,
+        publish_retries: int = 5,
+        publish_backoff_ms: int = 500,
+        max_pending: int = 100,
+        close_timeout_ms: int = 5000,
+    ) -> None:
+        self.task = task
+        self.max_records = max(1, max_records)
+        self.max_bytes = max(1, max_bytes)
+        self.max_delay = max(0, max_delay_ms) / 1000.0
+        self.name = name
+        self.publish_retries = max(0, publish_retries)
+        self.publish_backoff = max(0, publish_backoff_ms) / 1000.0
+        self.max_pending = max(1, max_pending)
+        self.close_timeout = max(0, close_timeout_ms) / 1000.0
+        self._batch: Optional[PendingBatch] = None
+        self._retries: List[PendingBatch] = []
+        self._counts = {"published": 0, "retried": 0, "dropped": 0}
+        self._cond = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, records: List[dict], size_bytes: int = 0) -> dict:
+        """Add records to the open batch and return its batch and task ids."""
+        ready: Optional[PendingBatch] = None
+        with self._cond:
+            if self._closed or self.max_delay == 0:
+                ready = self._open_batch()
+                batch = ready
+            else:
+                self._ensure_flusher()
+                batch = self._batch or self._open_batch()
+                self._batch = batch
+            batch.records.extend(records)
+            batch.size_bytes += size_bytes
+            if ready is None and (
+                len(batch.records) >= self.max_records or batch.size_bytes >= self.max_bytes
+            ):
+                ready, self._batch = batch, None
+            self._cond.notify()
+
+        if ready is not None:
+            self._send(ready)
+        return {"batch_id": batch.batch_id, "task_id": batch.task_id}
+
+    def flush(self) -> Optional[str]:
+        """Send the open batch immediately, returning its task id."""
+        with self._cond:
+            batch, self._batch = self._batch, None
+        if batch is None:
+            return None
+        self._send(batch)
+        return batch.task_id
+
+    def close(self) -> None:
+        """Stop the background flusher, then flush pending records and retry failed batches."""
+        deadline = time.monotonic() + self.close_timeout
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            flusher = self._flusher
+        # A send in flight may still fail and re-queue its batch; wait for it
+        # so the drain below sees that batch.
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join(max(0.0, deadline - time.monotonic()))
+        self.flush()
+        self._drain(deadline)
+
+    def stats(self) -> Dict[str, int]:
+        """Batches published, re-queued after a failed publish and dropped so far."""
+        with self._cond:
+            return {**self._counts, "pending_retries": len(self._retries)}
+
+    def _open_batch(self) -> PendingBatch:
+        return PendingBatch(
+            batch_id=uuid.uuid4().hex,
+            task_id=str(uuid.uuid4()),
+            opened_at=time.monotonic(),
+        )
+
+    def _ensure_flusher(self) -> None:
+        # Started lazily so pre-forking servers spawn it inside each worker.
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(
+                target=self._run, name=f"ingest-buffer-{self.name}", daemon=True
+            )
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    deadlines = [batch.retry_at for batch in self._retries]
+                    if self._batch is not None:
+                        deadlines.append(self._batch.opened_at + self.max_delay)
+                    if not deadlines:
+                        self._cond.wait()
+                        continue
+                    remaining = min(deadlines) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                due = [batch for batch in self._retries if batch.retry_at <= now]
+                self._retries = [batch for batch in self._retries if batch.retry_at > now]
+                ready = None
+                if self._batch is not None and self._batch.opened_at + self.max_delay <= now:
+                    ready, self._batch = self._batch, None
+            for batch in due + ([ready] if ready else []):
+                self._send(batch)
+
+    def _drain(self, deadline: float) -> None:
+        # Called on close, once the flusher has stopped: retry in this thread instead.
+        expired: List[PendingBatch] = []
+        while True:
+            with self._cond:
+                if not self._retries:
+                    break
+                batch = min(self._retries, key=lambda pending: pending.retry_at)
+                if batch.retry_at > deadline:
+                    expired, self._retries = self._retries, []
+                    self._counts["dropped"] += len(expired)
+                    break
+                self._retries.remove(batch)
+            time.sleep(max(0.0, batch.retry_at - time.monotonic()))
+            self._send(batch)
+        for lost in expired:
+            self._log_drop(lost, "Dropped ingest batch at shutdown")
+
+    def _send(self, batch: PendingBatch) -> None:
+        log = logger.bind(component="api.ingest")
+        try:
+            self.task.apply_async(args=[batch.records], task_id=batch.task_id)
+        except Exception as exc:  # pragma: no cover - broker IO
+            batch.attempts += 1
+            log.warning(
+                "Failed to publish ingest batch",
+                buffer=self.name,
+                batch_id=batch.batch_id,
+                attempt=batch.attempts,
+                error=str(exc),
+            )
+            self._requeue(batch)
+            return
+        with self._cond:
+            self._counts["published"] += 1
+        log.info(
+            "Queued ingestion batch",
+            buffer=self.name,
+            batch_id=batch.batch_id,
+            task_id=batch.task_id,
+            count=len(batch.records),
+        )
+
+    def _requeue(self, batch: PendingBatch) -> None:
+        dropped: List[PendingBatch] = []
+        with self._cond:
+            if batch.attempts > self.publish_retries:
+                dropped.append(batch)
+            else:
+                batch.retry_at = time.monotonic() + self.publish_backoff * 2 ** (batch.attempts - 1)
+                self._retries.append(batch)
+                self._counts["retried"] += 1
+                if len(self._retries) > self.max_pending:
+                    dropped.append(self._retries.pop(0))
+                if not self._closed:
+                    self._ensure_flusher()
+                self._cond.notify()
+            self._counts["dropped"] += len(dropped)
+        for lost in dropped:
+            self._log_drop(lost, "Dropped ingest batch")
+
+    def _log_drop(self, batch: PendingBatch, message: str) -> None:
+        logger.bind(component="api.ingest").error(
+            message,
+            buffer=self.name,
+            batch_id=batch.batch_id,
+            task_id=batch.task_id,
+            count=len(batch.records),
+            attempts=batch.attempts,
+        )
+
+
+def init_ingest_buffers(app: Flask) -> Dict[str, IngestBuffer]:
+    """Create the log/metric buffers for an app and flush them at exit.
+
+    Servers should also call :func:`close_ingest_buffers` from their worker
+    shutdown hook (see ``gunicorn.conf.py``) so flushing does not depend on
+    ``atexit`` alone.
+    """
+    options = {
+        "max_records": app.config.get("INGEST_BATCH_MAX_RECORDS", 5000),
+        "max_bytes": app.config.get("INGEST_BATCH_MAX_BYTES", 1_048_576),
+        "max_delay_ms": app.config.get("INGEST_BATCH_MAX_DELAY_MS", 250),
+        "publish_retries": app.config.get("INGEST_PUBLISH_RETRIES", 5),
+        "publish_backoff_ms": app.config.get("INGEST_PUBLISH_BACKOFF_MS", 500),
+        "max_pending": app.config.get("INGEST_PUBLISH_MAX_PENDING", 100),
+        "close_timeout_ms": app.config.get("INGEST_CLOSE_TIMEOUT_MS", 5000),
+    }
+    buffers = {
+        "logs": IngestBuffer(parse_logs_task, name="logs", **options),
+        "metrics": IngestBuffer(aggregate_metrics_task, name="metrics", **options),
+    }
+    app.extensions[EXTENSION_KEY] = buffers
+    for buffer in buffers.values():
+        atexit.register(buffer.close)
+    return buffers
+
+
+def close_ingest_buffers(app: Flask) -> None:
+    """Flush every ingest buffer of ``app``; safe to call more than once."""
+    for buffer in app.extensions.get(EXTENSION_KEY, {}).values():
+        buffer.close()
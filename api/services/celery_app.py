@@ -3,15 +3,20 @@
 from __future__ import annotations
 
 from celery import Celery
-from celery.signals import worker_init, worker_process_init
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from flask import Flask
 from loguru import logger
 
 from api.db import init_db
+from api.services import transports
 from api.utils.config import load_config
 
 celery = Celery("flowguard")
 
+# Anomaly model fits run on their own queue so they never hold up ingestion.
+TRAINING_QUEUE = "flowguard.training"
+TRAIN_DETECTOR_TASK = "flowguard.train_detector"
+
 
 def init_celery(app: Flask | None = None) -> Celery:
     """Configure and return the Celery application."""
@@ -26,6 +31,21 @@ def init_celery(app: Flask | None = None) -> Celery:
         enable_utc=True,
         task_track_started=True,
         include=["api.services.pipeline"],
+        task_routes={TRAIN_DETECTOR_TASK: {"queue": TRAINING_QUEUE}},
+        beat_schedule={
+            "flowguard-evaluate-kpis": {
+                "task": "flowguard.evaluate_kpis",
+                "schedule": config["KPI_EVAL_INTERVAL_SEC"],
+            },
+            "flowguard-dispatch-alerts": {
+                "task": "flowguard.dispatch_alerts",
+                "schedule": config["ALERT_DISPATCH_INTERVAL_SEC"],
+            },
+            "flowguard-compact-metrics": {
+                "task": "flowguard.compact_metrics",
+                "schedule": config["ROLLUP_INTERVAL_SEC"],
+            },
+        },
     )
 
     init_db(load_config().DB_URL)
@@ -49,3 +69,8 @@ def setup_worker_db(**_):
 @worker_process_init.connect
 def setup_worker_child_db(**_):
     init_db(load_config().DB_URL)
+
+
+@worker_process_shutdown.connect
+def close_worker_transports(**_):
+    transports.close_all()
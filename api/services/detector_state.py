@@ -0,0 +1,364 @@
+"""Anomaly detector state shared by every worker process.
+
+Models are stored in Redis as pickles and unpickled on load, and
+unpickling can run arbitrary code. The Redis instance at ``REDIS_URL``
+must therefore be trusted and reachable only by FlowGuard: anyone who can
+write ``flowguard:anomaly:*`` keys can execute code in the workers.
+"""
+
+from __future__ import annotations
+
+import pickle
+import struct
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from api.services import streaming
+from api.utils.redis_client import get_redis
+
+WINDOW_SIZE = 64
+FEATURES = 3
+KEY_PREFIX = "flowguard:anomaly"
+
+# count; followed by the float64 streaming stats and the float32 window.
+_WINDOW_HEADER = struct.Struct("<Q")
+# model_version, fit_count, fitted_at, fit_mean[3], fit_std[3]
+_FIT = struct.Struct(f"<QQd{FEATURES}d{FEATURES}d")
+
+
+def _empty_window() -> np.ndarray:
+    return np.zeros((WINDOW_SIZE, FEATURES), dtype=np.float32)
+
+
+def _empty_online() -> np.ndarray:
+    return streaming.new_stats(FEATURES)
+
+
+@dataclass
+class DetectorState:
+    """Fixed-size float32 ring of recent feature vectors plus the fitted model.
+
+    ``count`` is the total number of vectors ever appended; the newest one
+    sits at ``(count - 1) % WINDOW_SIZE``. ``online`` holds the streaming
+    detector statistics (see :mod:`api.services.streaming`). The ``fit_*``
+    fields and ``model_version`` describe the current model; the version
+    increases on every refit so stores can tell whether a cached model is
+    current.
+    """
+
+    window: np.ndarray = field(default_factory=_empty_window)
+    online: np.ndarray = field(default_factory=_empty_online)
+    count: int = 0
+    model: Optional[IsolationForest] = None
+    model_version: int = 0
+    fit_count: int = 0
+    fitted_at: float = 0.0
+    fit_mean: Optional[np.ndarray] = None
+    fit_std: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return min(self.count, WINDOW_SIZE)
+
+    @property
+    def points_since_fit(self) -> int:
+        return self.count - self.fit_count
+
+    def append(self, vector: np.ndarray) -> None:
+        self.window[self.count % WINDOW_SIZE] = vector
+        self.count += 1
+
+    def values(self) -> np.ndarray:
+        """Window contents as float64 rows, oldest first."""
+        if self.count < WINDOW_SIZE:
+            return self.window[: self.count].astype(np.float64)
+        return np.roll(self.window, -(self.count % WINDOW_SIZE), axis=0).astype(np.float64)
+
+
+def encode_window(state: DetectorState) -> bytes:
+    """Serialize the window and streaming stats into a fixed-size blob (~870 bytes)."""
+    return (
+        _WINDOW_HEADER.pack(state.count)
+        + state.online.tobytes()
+        + state.window.astype(np.float32).tobytes()
+    )
+
+
+def decode_window(payload: bytes) -> DetectorState:
+    (count,) = _WINDOW_HEADER.unpack_from(payload)
+    online = np.frombuffer(
+        payload,
+        dtype=np.float64,
+        count=streaming.STAT_ROWS * FEATURES,
+        offset=_WINDOW_HEADER.size,
+    ).reshape(streaming.STAT_ROWS, FEATURES)
+    window = np.frombuffer(
+        payload, dtype=np.float32, offset=_WINDOW_HEADER.size + online.nbytes
+    ).reshape(WINDOW_SIZE, FEATURES)
+    return DetectorState(window=window.copy(), online=online.copy(), count=count)
+
+
+def encode_fit(state: DetectorState) -> bytes:
+    return _FIT.pack(
+        state.model_version,
+        state.fit_count,
+        state.fitted_at,
+        *(float(value) for value in state.fit_mean),
+        *(float(value) for value in state.fit_std),
+    )
+
+
+def apply_fit(state: DetectorState, payload: bytes) -> None:
+    version, fit_count, fitted_at, *stats = _FIT.unpack_from(payload)
+    state.model_version = version
+    state.fit_count = fit_count
+    state.fitted_at = fitted_at
+    state.fit_mean = np.array(stats[:FEATURES])
+    state.fit_std = np.array(stats[FEATURES:])
+
+
+def _stored_version(payload: Optional[bytes]) -> int:
+    return 0 if payload is None else _FIT.unpack_from(payload)[0]
+
+
+def _copy_fit(source: DetectorState, target: DetectorState) -> None:
+    target.model = source.model
+    target.model_version = source.model_version
+    target.fit_count = source.fit_count
+    target.fitted_at = source.fitted_at
+    target.fit_mean = source.fit_mean
+    target.fit_std = source.fit_std
+
+
+class DetectorStore(ABC):
+    """Storage for per-service detector state.
+
+    The window (written by evaluators) and the fitted model (written by
+    whoever trains it) are stored separately, so a trainer can swap in a
+    new model without racing evaluators that keep appending to the window.
+    """
+
+    def load(self, service_name: str) -> DetectorState:
+        """Return the service's state, or a fresh one when none is stored."""
+        return self.load_many([service_name])[0]
+
+    @abstractmethod
+    def load_many(self, service_names: Sequence[str]) -> List[DetectorState]:
+        ...
+
+    def save(self, service_name: str, state: DetectorState, model_changed: bool) -> None:
+        """Persist the window; the model is only written when ``model_changed``."""
+        self.save_many([(service_name, state, model_changed)])
+
+    @abstractmethod
+    def save_many(self, items: Iterable[Tuple[str, DetectorState, bool]]) -> None:
+        """Persist ``(service_name, state, model_changed)`` entries."""
+
+    @abstractmethod
+    def save_model(self, service_name: str, state: DetectorState) -> bool:
+        """Atomically replace the service's model without touching its window.
+
+        The model is only written when ``state.model_version`` is newer than
+        the stored one, so of two concurrent refits of the same version the
+        first wins. Returns whether it was written.
+        """
+
+    @abstractmethod
+    def claim_training(self, service_name: str, ttl: int) -> bool:
+        """Mark a training job pending; False if one already is."""
+
+    @abstractmethod
+    def release_training(self, service_name: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class MemoryDetectorStore(DetectorStore):
+    """Process-local state for single-process deployments and development."""
+
+    def __init__(self) -> None:
+        self._states: Dict[str, DetectorState] = {}
+        self._training: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def load_many(self, service_names: Sequence[str]) -> List[DetectorState]:
+        with self._lock:
+            return [
+                self._states.setdefault(service_name, DetectorState())
+                for service_name in service_names
+            ]
+
+    def save_many(self, items: Iterable[Tuple[str, DetectorState, bool]]) -> None:
+        with self._lock:
+            for service_name, state, _ in items:
+                self._states[service_name] = state
+
+    def save_model(self, service_name: str, state: DetectorState) -> bool:
+        with self._lock:
+            current = self._states.setdefault(service_name, DetectorState())
+            if current is state:
+                return True  # loaded from this store and refitted in place
+            if current.model_version >= state.model_version:
+                return False
+            _copy_fit(state, current)
+            return True
+
+    def claim_training(self, service_name: str, ttl: int) -> bool:
+        with self._lock:
+            if service_name in self._training:
+                return False
+            self._training.add(service_name)
+            return True
+
+    def release_training(self, service_name: str) -> None:
+        with self._lock:
+            self._training.discard(service_name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+            self._training.clear()
+
+
+class RedisDetectorStore(DetectorStore):
+    """State kept in Redis so every worker scores against the same history.
+
+    Per service, ``<prefix>:<service>:window`` holds the window blob,
+    ``:fit`` the model version and fit statistics and ``:model`` the
+    pickled model; ``:fit`` and ``:model`` are always written together in
+    one transaction, and only over an older version (checked under
+    ``WATCH``). Unpickled models are cached per process and only
+    reloaded when ``:fit`` reports a newer version. Keys expire after
+    ``ttl`` seconds without updates. Concurrent evaluations of the same
+    service are last-writer-wins on the window; the KPI scheduler already
+    hands each service to one worker per tick.
+    """
+
+    def __init__(self, url: str, ttl: int) -> None:
+        self.url = url
+        self.ttl = max(1, ttl)
+        self._models: Dict[str, Tuple[int, IsolationForest]] = {}
+
+    def _key(self, service_name: str, kind: str) -> str:
+        return f"{KEY_PREFIX}:{service_name}:{kind}"
+
+    def load_many(self, service_names: Sequence[str]) -> List[DetectorState]:
+        """Fetch windows and fits in one round trip and only the models not cached locally."""
+        client = get_redis(self.url)
+        pipe = client.pipeline(transaction=False)
+        pipe.mget([self._key(name, "window") for name in service_names])
+        pipe.mget([self._key(name, "fit") for name in service_names])
+        payloads, fits = pipe.execute()
+
+        states: List[DetectorState] = []
+        stale: List[int] = []
+        for index, (name, payload, fit) in enumerate(zip(service_names, payloads, fits)):
+            state = DetectorState() if payload is None else decode_window(payload)
+            states.append(state)
+            if fit is None:
+                continue
+            apply_fit(state, fit)
+            cached = self._models.get(name)
+            if cached is not None and cached[0] == state.model_version:
+                state.model = cached[1]
+            else:
+                stale.append(index)
+        if stale:
+            blobs = client.mget([self._key(service_names[index], "model") for index in stale])
+            for index, blob in zip(stale, blobs):
+                if blob is None:
+                    continue
+                model = pickle.loads(blob)
+                self._models[service_names[index]] = (states[index].model_version, model)
+                states[index].model = model
+        return states
+
+    def save_many(self, items: Iterable[Tuple[str, DetectorState, bool]]) -> None:
+        items = list(items)
+        changed = [
+            (service_name, state)
+            for service_name, state, model_changed in items
+            if model_changed and state.model is not None
+        ]
+        fit_keys = [self._key(service_name, "fit") for service_name, _ in changed]
+
+        def write(pipe) -> List[Tuple[str, DetectorState]]:
+            stored = pipe.mget(fit_keys) if fit_keys else []
+            newer = [
+                (service_name, state)
+                for (service_name, state), fit in zip(changed, stored)
+                if _stored_version(fit) < state.model_version
+            ]
+            pipe.multi()
+            for service_name, state, _ in items:
+                pipe.set(self._key(service_name, "window"), encode_window(state), ex=self.ttl)
+                pipe.expire(self._key(service_name, "fit"), self.ttl)
+                pipe.expire(self._key(service_name, "model"), self.ttl)
+            for service_name, state in newer:
+                self._write_model(pipe, service_name, state)
+            return newer
+
+        written = get_redis(self.url).transaction(write, *fit_keys, value_from_callable=True)
+        self._cache_models(written)
+
+    def save_model(self, service_name: str, state: DetectorState) -> bool:
+        fit_key = self._key(service_name, "fit")
+
+        def write(pipe) -> bool:
+            if _stored_version(pipe.get(fit_key)) >= state.model_version:
+                return False
+            pipe.multi()
+            self._write_model(pipe, service_name, state)
+            return True
+
+        written = get_redis(self.url).transaction(write, fit_key, value_from_callable=True)
+        if written:
+            self._cache_models([(service_name, state)])
+        return written
+
+    def _write_model(self, pipe, service_name: str, state: DetectorState) -> None:
+        blob = pickle.dumps(state.model, protocol=pickle.HIGHEST_PROTOCOL)
+        pipe.set(self._key(service_name, "model"), blob, ex=self.ttl)
+        pipe.set(self._key(service_name, "fit"), encode_fit(state), ex=self.ttl)
+
+    def _cache_models(self, written: Iterable[Tuple[str, DetectorState]]) -> None:
+        # Only after the transaction committed, so the cache never holds a rejected model.
+        for service_name, state in written:
+            self._models[service_name] = (state.model_version, state.model)
+
+    def claim_training(self, service_name: str, ttl: int) -> bool:
+        key = self._key(service_name, "training")
+        return bool(get_redis(self.url).set(key, 1, nx=True, ex=max(1, ttl)))
+
+    def release_training(self, service_name: str) -> None:
+        get_redis(self.url).delete(self._key(service_name, "training"))
+
+    def clear(self) -> None:
+        client = get_redis(self.url)
+        keys = list(client.scan_iter(match=f"{KEY_PREFIX}:*"))
+        if keys:
+            client.delete(*keys)
+        self._models.clear()
+
+
+_stores: Dict[str, DetectorStore] = {}
+
+
+def get_store(config: dict) -> DetectorStore:
+    """Return the detector store for the configured ``ANOMALY_STATE_BACKEND``."""
+    backend = config.get("ANOMALY_STATE_BACKEND", "redis")
+    if backend not in _stores:
+        if backend == "memory":
+            _stores[backend] = MemoryDetectorStore()
+        else:
+            _stores[backend] = RedisDetectorStore(
+                config.get("REDIS_URL"), int(config.get("ANOMALY_STATE_TTL_SEC", 604800))
+            )
+    return _stores[backend]
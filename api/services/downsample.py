@@ -0,0 +1,84 @@
+"""Server-side downsampling of chart series."""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices selected by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    selected point and the average of the next bucket. Bucket averages come
+    from cumulative sums and each bucket's areas are computed in one numpy
+    expression.
+    """
+    size = len(y)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=np.float64) - float(x[0])
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = (hi, edges[bucket + 2]) if bucket + 2 < len(edges) else (size - 1, size)
+        avg_x = (cum_x[next_hi] - cum_x[next_lo]) / (next_hi - next_lo)
+        avg_y = (cum_y[next_hi] - cum_y[next_lo]) / (next_hi - next_lo)
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[lo:hi] - y[anchor])
+            - (x[anchor] - x[lo:hi]) * (avg_y - y[anchor])
+        )
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the minimum and maximum of ``(threshold - 2) // 2`` equal buckets.
+
+    Keeps every spike, at the cost of a less faithful overall shape than
+    LTTB. Like LTTB, the first and last points are always kept, so the
+    newest point of a series survives. Fully vectorized: points are sorted
+    by ``(bucket, value)`` and the first and last point of each bucket are
+    taken.
+    """
+    size = len(y)
+    buckets = max(1, (threshold - 2) // 2)
+    if threshold >= size or buckets >= size:
+        return np.arange(size)
+    edges = np.linspace(0, size, buckets + 1).astype(np.int64)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+    order = np.lexsort((np.asarray(y), bucket_ids))
+    return np.unique(
+        np.concatenate(([0, size - 1], order[edges[:-1]], order[edges[1:] - 1]))
+    )
+
+
+def downsample_indices(
+    x: np.ndarray, columns: Sequence[np.ndarray], max_points: int, method: str = "lttb"
+) -> np.ndarray:
+    """Sorted row indices keeping at most ``max_points`` rows across ``columns``.
+
+    The point budget is split evenly between the value columns and the
+    per-column selections are merged, so every chart line keeps its shape.
+    """
+    size = len(x)
+    if not columns or max_points <= 0 or size <= max_points:
+        return np.arange(size)
+    budget = max(3, max_points // len(columns))
+    if method == "minmax":
+        picked = [minmax_indices(column, budget) for column in columns]
+    else:
+        picked = [lttb_indices(x, column, budget) for column in columns]
+    return np.unique(np.concatenate(picked))
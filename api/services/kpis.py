@@ -4,116 +4,297 @@ from __future__ import annotations
 
 from collections import defaultdict
 from datetime import datetime, timedelta
-from decimal import Decimal
 from statistics import mean
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import numpy as np
-from sqlalchemy import desc
+from sqlalchemy import Float, and_, case, cast, desc, func, select
 
 from api.models import LogEvent, MetricPoint, Service
+from api.services import downsample, rollups, storage, windows
+from api.services.sketch import QuantileSketch
 from api.utils.time import utc_now
 
+# Extra latency percentiles reported alongside p95 when logs carry latencies.
+LATENCY_PERCENTILES = (50, 90, 99)
+_WINDOW_PERCENTILES = (*LATENCY_PERCENTILES, 95)
+# Minimum points a chart series should have before a coarser rollup is used.
+DEFAULT_MIN_POINTS = 120
 
-def _percentile(values: List[int], percentile: float) -> int:
-    if not values:
-        return 0
-    array = np.array(values)
-    return int(round(float(np.percentile(array, percentile))))
+# (log_count, error_count, {percentile: latency_ms})
+_LogStats = Tuple[int, int, Dict[int, int]]
 
 
-def _ensure_decimal(value: float | int) -> Decimal:
-    return Decimal(str(round(float(value), 6)))
+def _sql_log_stats(
+    session, service_ids: Sequence[int], start: datetime, end: datetime
+) -> Dict[int, _LogStats]:
+    """Aggregate window logs per service in SQL as ``(count, errors, percentiles)``.
 
+    Counts come from one ``GROUP BY service_id`` query. Only the
+    ``(service_id, latency_ms)`` columns are streamed back, into one quantile
+    sketch per service; on Postgres percentiles are computed server-side with
+    ``percentile_cont``.
+    """
+    in_window = (
+        LogEvent.service_id.in_(service_ids),
+        LogEvent.ts >= start,
+        LogEvent.ts <= end,
+    )
+    is_error = case((LogEvent.level.in_(sorted(windows.ERROR_LEVELS)), 1), else_=0)
+    rows = session.execute(
+        select(LogEvent.service_id, func.count(LogEvent.id), func.coalesce(func.sum(is_error), 0))
+        .where(*in_window)
+        .group_by(LogEvent.service_id)
+    )
+    stats: Dict[int, _LogStats] = {
+        service_id: (log_count, error_count, {}) for service_id, log_count, error_count in rows
+    }
+    if not stats:
+        return stats
 
-def refresh_kpis(session, service: Service, config: Dict) -> Optional[dict]:
-    """Recompute KPIs for a service over the configured lookback window."""
+    pcts = _WINDOW_PERCENTILES
+    if session.get_bind().dialect.name == "postgresql":
+        columns = [
+            func.percentile_cont(pct / 100.0).within_group(LogEvent.latency_ms) for pct in pcts
+        ]
+        rows = session.execute(
+            select(LogEvent.service_id, *columns).where(*in_window).group_by(LogEvent.service_id)
+        )
+        for service_id, *values in rows:
+            if values[0] is not None:
+                stats[service_id][2].update(
+                    {pct: int(round(value)) for pct, value in zip(pcts, values)}
+                )
+        return stats
+
+    sketches: Dict[int, QuantileSketch] = defaultdict(
+        lambda: QuantileSketch(windows.LATENCY_ACCURACY)
+    )
+    rows = session.execute(
+        select(LogEvent.service_id, LogEvent.latency_ms)
+        .where(*in_window, LogEvent.latency_ms.is_not(None))
+        .execution_options(yield_per=10000)
+    )
+    for service_id, latency_ms in rows:
+        sketches[service_id].add(latency_ms)
+    for service_id, sketch in sketches.items():
+        stats[service_id][2].update({pct: int(round(sketch.quantile(pct / 100.0))) for pct in pcts})
+    return stats
+
+
+def _rolling_log_stats(
+    session, service_ids: Sequence[int], config: Dict, end: datetime
+) -> Tuple[Dict[int, _LogStats], int]:
+    loaded, window_seconds = windows.load_windows(session, service_ids, config, end)
+    stats: Dict[int, _LogStats] = {}
+    for service_id, window in loaded.items():
+        percentiles = {}
+        if window.latency.count:
+            percentiles = {pct: window.percentile(pct) for pct in _WINDOW_PERCENTILES}
+        stats[service_id] = (window.log_count, window.error_count, percentiles)
+    return stats, window_seconds
+
+
+def _latest_metrics(
+    session, service_ids: Sequence[int], start: datetime, end: datetime
+) -> Dict[int, tuple]:
+    """Return ``{service_id: (count, tps, error_rate, p95)}`` for the newest point per service."""
+    latest = (
+        select(
+            MetricPoint.service_id,
+            func.max(MetricPoint.ts).label("ts"),
+            func.count(MetricPoint.id).label("metric_count"),
+        )
+        .where(
+            MetricPoint.service_id.in_(service_ids),
+            MetricPoint.ts >= start,
+            MetricPoint.ts <= end,
+        )
+        .group_by(MetricPoint.service_id)
+        .subquery()
+    )
+    rows = session.execute(
+        select(
+            latest.c.service_id,
+            latest.c.metric_count,
+            MetricPoint.tps,
+            MetricPoint.error_rate,
+            MetricPoint.p95_latency_ms,
+        ).join(
+            MetricPoint,
+            and_(MetricPoint.service_id == latest.c.service_id, MetricPoint.ts == latest.c.ts),
+        )
+    )
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def refresh_kpis_many(session, services: Sequence[Service], config: Dict) -> List[dict]:
+    """Compute KPI snapshots for several services with grouped queries.
+
+    ``KPI_AGGREGATION=rolling`` (default) reads the incremental bucket
+    windows; ``sql`` aggregates ``log_events`` with ``GROUP BY service_id``
+    queries. The latest metric per service comes from one grouped query and
+    all snapshot points are written with a single upsert. Snapshots are
+    returned in the order of ``services``.
+    """
+    if not services:
+        return []
     lookback = config.get("ALERT_LOOKBACK_MIN", 10)
     window = timedelta(minutes=lookback)
     end = utc_now()
     start = end - window
+    service_ids = [service.id for service in services]
 
-    logs: List[LogEvent] = (
-        session.query(LogEvent)
-        .filter(LogEvent.service_id == service.id, LogEvent.ts >= start, LogEvent.ts <= end)
-        .order_by(LogEvent.ts.desc())
-        .all()
-    )
-    metrics: List[MetricPoint] = (
-        session.query(MetricPoint)
-        .filter(MetricPoint.service_id == service.id, MetricPoint.ts >= start, MetricPoint.ts <= end)
-        .order_by(MetricPoint.ts.asc())
-        .all()
-    )
+    if config.get("KPI_AGGREGATION", "rolling") == "sql":
+        log_stats = _sql_log_stats(session, service_ids, start, end)
+        window_seconds = window.total_seconds()
+    else:
+        log_stats, window_seconds = _rolling_log_stats(session, service_ids, config, end)
+    latest = _latest_metrics(session, service_ids, start, end)
 
-    error_rate = float(metrics[-1].error_rate) if metrics else 0.0
-    p95_latency_ms = metrics[-1].p95_latency_ms if metrics else 0
-    tps = float(metrics[-1].tps) if metrics else 0.0
-
-    if logs:
-        total = len(logs)
-        error_count = sum(1 for log in logs if log.level in {"ERROR", "CRITICAL"})
-        latency_values = [log.latency_ms for log in logs if log.latency_ms is not None]
-
-        if total > 0:
-            error_rate = error_count / total
-        if latency_values:
-            p95_latency_ms = _percentile(latency_values, 95)
-        duration_seconds = max((window.total_seconds()), 1)
-        tps = total / duration_seconds
-
-    snapshot = {
-        "service": service.name,
-        "service_id": service.id,
-        "ts": end.isoformat(),
-        "error_rate": float(error_rate),
-        "p95_latency_ms": int(p95_latency_ms),
-        "tps": float(tps),
-        "log_count": len(logs),
-        "metric_count": len(metrics),
-    }
+    snapshots: List[dict] = []
+    rows: List[dict] = []
+    for service in services:
+        log_count, error_count, percentiles = log_stats.get(service.id, (0, 0, {}))
+        metric_count, tps, error_rate, p95_latency_ms = latest.get(service.id, (0, 0.0, 0.0, 0))
+        tps, error_rate = float(tps), float(error_rate)
+
+        if log_count:
+            error_rate = error_count / log_count
+            p95_latency_ms = percentiles.get(95, p95_latency_ms)
+            tps = log_count / max(window_seconds, 1)
+
+        snapshots.append(
+            {
+                "service": service.name,
+                "service_id": service.id,
+                "ts": end.isoformat(),
+                "error_rate": float(error_rate),
+                "p95_latency_ms": int(p95_latency_ms),
+                **{f"p{pct}_latency_ms": percentiles.get(pct) for pct in LATENCY_PERCENTILES},
+                "tps": float(tps),
+                "log_count": log_count,
+                "metric_count": metric_count,
+            }
+        )
+        rows.append(storage.metric_row(service.id, end, tps, error_rate, p95_latency_ms))
+
+    storage.upsert_metric_points(session, rows)
+    return snapshots
 
-    point = MetricPoint(
-        service_id=service.id,
-        ts=end,
-        error_rate=_ensure_decimal(error_rate),
-        p95_latency_ms=int(p95_latency_ms),
-        tps=_ensure_decimal(tps),
+
+def refresh_kpis(session, service: Service, config: Dict) -> Optional[dict]:
+    """Recompute KPIs for a single service over the configured lookback window."""
+    snapshots = refresh_kpis_many(session, [service], config)
+    return snapshots[0] if snapshots else None
+
+
+def _downsample_rows(rows: List[tuple], max_points: Optional[int], method: str) -> List[tuple]:
+    """Keep at most ``max_points`` of ``(ts, *values)`` rows before serialization."""
+    if not max_points or len(rows) <= max_points:
+        return rows
+    first_ts = rows[0][0]
+    offsets = np.fromiter(
+        ((row[0] - first_ts).total_seconds() for row in rows), dtype=np.float64, count=len(rows)
     )
-    session.merge(point)
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+    keep = downsample.downsample_indices(offsets, list(values.T), max_points, method)
+    return [rows[index] for index in keep]
+
 
-    return snapshot
+def fetch_metric_series(
+    session,
+    service_name: str,
+    start: datetime,
+    end: datetime,
+    min_points: int = DEFAULT_MIN_POINTS,
+    max_points: Optional[int] = None,
+    method: str = "lttb",
+    since: Optional[datetime] = None,
+) -> Tuple[List[dict], int]:
+    """Return ``(items, resolution_sec)`` for a service's metric series.
 
+    Only the served columns are selected, with ``Numeric`` columns cast to
+    floats in SQL, so items hold driver values (``ts`` is a ``datetime``
+    left to the JSON encoder) and no ``Decimal`` is ever built.
 
-def fetch_kpi_series(session, service_name: str, start: datetime, end: datetime) -> dict:
-    """Fetch KPI series for charts."""
-    points = (
-        session.query(MetricPoint)
+    Long ranges are served from the coarsest rollup that still yields
+    ``min_points`` buckets (see :func:`rollups.series_rows`, which fills
+    buckets not yet compacted from raw points); short ranges read raw
+    ``metric_points`` (resolution 0). Rollup items carry the bucket's average error rate and
+    TPS, its maximum p95 and an extra ``error_rate_max``. With ``max_points``
+    the raw columns are downsampled (``lttb`` or ``minmax``) before any item
+    is built. ``since`` keeps only items at or after it, at the resolution
+    the full range would use.
+    """
+    resolution = rollups.select_resolution(start, end, min_points)
+    if resolution:
+        lower = max(start, since) if since else start
+        rows = rollups.series_rows(session, service_name, resolution, lower, end)
+        items = [
+            {
+                "ts": bucket_ts,
+                "error_rate": avg_error_rate,
+                "error_rate_max": max_error_rate,
+                "p95_latency_ms": max_p95,
+                "tps": avg_tps,
+            }
+            for bucket_ts, avg_error_rate, max_error_rate, max_p95, avg_tps in _downsample_rows(
+                rows, max_points, method
+            )
+        ]
+        return items, resolution
+
+    rows = session.execute(
+        select(
+            MetricPoint.ts,
+            cast(MetricPoint.error_rate, Float),
+            MetricPoint.p95_latency_ms,
+            cast(MetricPoint.tps, Float),
+        )
         .join(Service)
-        .filter(
+        .where(
             Service.name == service_name,
             MetricPoint.ts >= start,
             MetricPoint.ts <= end,
+            *((MetricPoint.ts >= since,) if since else ()),
         )
         .order_by(MetricPoint.ts.asc())
-        .all()
-    )
+    ).all()
 
     items = [
         {
-            "ts": point.ts.isoformat(),
-            "error_rate": float(point.error_rate),
-            "p95_latency_ms": point.p95_latency_ms,
-            "tps": float(point.tps),
+            "ts": ts,
+            "error_rate": error_rate,
+            "p95_latency_ms": p95_latency_ms,
+            "tps": tps,
         }
-        for point in points
+        for ts, error_rate, p95_latency_ms, tps in _downsample_rows(rows, max_points, method)
     ]
+    return items, 0
 
+
+def fetch_kpi_series(
+    session,
+    service_name: str,
+    start: datetime,
+    end: datetime,
+    min_points: int = DEFAULT_MIN_POINTS,
+    max_points: Optional[int] = None,
+    method: str = "lttb",
+    since: Optional[datetime] = None,
+) -> dict:
+    """Fetch KPI series for charts; with ``since``, only the newer points."""
+    items, resolution = fetch_metric_series(
+        session, service_name, start, end, min_points, max_points, method, since
+    )
     latest = items[-1] if items else None
 
     return {
         "service": service_name,
         "range": {"start": start.isoformat(), "end": end.isoformat()},
+        "resolution": rollups.RESOLUTION_LABELS[resolution],
         "items": items,
         "latest": latest,
+        "next_since": latest["ts"] if latest else since,
     }
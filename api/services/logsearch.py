@@ -0,0 +1,208 @@
+"""Full-text search over ``log_events.message``.
+
+Queries are parsed into terms that both backends understand the same way:
+
+- ``timeout`` matches the token ``timeout``;
+- ``"connection reset"`` matches the tokens adjacent and in order;
+- ``conn*`` matches any token starting with ``conn``.
+
+Terms are ANDed. Words are split on non-alphanumeric characters exactly
+like the index tokenizers do, so ``user-42`` is searched as the phrase
+``user 42``. Matching is case-insensitive and unstemmed.
+
+On SQLite the messages are indexed by an external-content FTS5 table kept
+in sync by triggers; on Postgres by a GIN index on
+``to_tsvector('simple', message)``. Other databases, and SQLite builds
+without FTS5, fall back to one ``LIKE`` scan per term.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    and_,
+    func,
+    literal_column,
+    select,
+    text,
+)
+from sqlalchemy.engine import Engine
+
+from api.models import LogEvent
+
+FTS_TABLE = "log_events_fts"
+PG_INDEX = "ix_log_events_message_tsv"
+# Newest ids searched first on SQLite before widening, see :func:`newest`.
+SEARCH_WINDOW = 1024
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+# Only used to build queries; the table itself is created by :func:`install`.
+_fts = Table(FTS_TABLE, MetaData(), Column("rowid", Integer), Column("message", Text))
+
+_SQLITE_DDL = (
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        message, content='log_events', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON log_events BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON log_events BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF message ON log_events BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+)
+_PG_DDL = (
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON log_events "
+    "USING gin (to_tsvector('simple', message))"
+)
+
+# Dialects whose full-text index was installed, keyed by engine URL.
+_installed: dict = {}
+
+
+@dataclass(frozen=True)
+class Term:
+    words: Tuple[str, ...]
+    prefix: bool = False  # last word is a prefix
+
+
+def parse_query(query_text: str) -> List[Term]:
+    """Split a search string into AND-ed token, phrase and prefix terms."""
+    terms: List[Term] = []
+    for match in _TERM.finditer(query_text):
+        phrase, bare = match.groups()
+        raw = phrase if phrase is not None else bare
+        words = tuple(word.lower() for word in _WORD.findall(raw))
+        if words:
+            terms.append(Term(words, prefix=bare is not None and bare.endswith("*")))
+    return terms
+
+
+def fts5_query(terms: List[Term]) -> str:
+    """Render terms as an FTS5 MATCH expression; every word is quoted, so input is inert."""
+    parts = []
+    for term in terms:
+        quoted = '"' + " ".join(term.words) + '"'
+        parts.append(quoted + "*" if term.prefix else quoted)
+    return " AND ".join(parts)
+
+
+def tsquery(terms: List[Term]) -> str:
+    """Render terms as ``to_tsquery`` input (words are ``\\w+`` only, so no escaping needed)."""
+    parts = []
+    for term in terms:
+        words = list(term.words)
+        if term.prefix:
+            words[-1] += ":*"
+        parts.append(words[0] if len(words) == 1 else "(" + " <-> ".join(words) + ")")
+    return " & ".join(parts)
+
+
+def install(engine: Engine) -> None:
+    """Create the dialect's full-text index if missing (idempotent, run at startup)."""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE},
+            ).first()
+            if exists is None:
+                try:
+                    conn.exec_driver_sql(_SQLITE_DDL[0])
+                except Exception as exc:  # pragma: no cover - SQLite built without FTS5
+                    logger.warning("FTS5 unavailable; log search falls back to LIKE", error=exc)
+                    return
+                # Index rows written before the table existed.
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            for statement in _SQLITE_DDL[1:]:
+                conn.exec_driver_sql(statement)
+    elif dialect == "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql(_PG_DDL)
+    else:
+        return
+    _installed[str(engine.url)] = dialect
+    logger.info("Log full-text index ready", dialect=dialect)
+
+
+def condition(session, query_text: str, mode: Optional[str] = None, min_id: int = 0):
+    """SQL condition matching ``query_text`` against ``LogEvent.message``.
+
+    ``mode`` forces ``"fts"`` or ``"like"``; by default the index is used
+    whenever :func:`install` set it up for the session's engine. On SQLite
+    ``min_id`` limits the index lookup to rows with a larger id.
+    """
+    terms = parse_query(query_text)
+    if not terms:
+        return None
+    dialect = _installed.get(str(session.get_bind().url)) if mode != "like" else None
+    if dialect == "sqlite":
+        matches = select(_fts.c.rowid).where(_fts.c.message.op("MATCH")(fts5_query(terms)))
+        if min_id:
+            matches = matches.where(_fts.c.rowid > min_id)
+        return LogEvent.id.in_(matches)
+    if dialect == "postgresql":
+        # The configuration must be a literal so the expression matches the GIN index.
+        config = literal_column("'simple'::regconfig")
+        vector = func.to_tsvector(config, LogEvent.message)
+        return vector.op("@@")(func.to_tsquery(config, tsquery(terms)))
+    # Unindexed fallback: each term's words must appear in order (substring match).
+    return and_(
+        *(
+            LogEvent.message.ilike(
+                "%" + "%".join(word.replace("_", "\\_") for word in term.words) + "%",
+                escape="\\",
+            )
+            for term in terms
+        )
+    )
+
+
+def newest(session, query, query_text: str, limit: int, mode: Optional[str] = None) -> list:
+    """Return the first ``limit`` rows of ``query`` whose message matches ``query_text``.
+
+    ``query`` must be ordered by ``LogEvent.ts`` descending and yield
+    ``LogEvent`` instances or rows with a ``ts`` column. On SQLite an
+    FTS5 match materializes every matching rowid, which for a frequent
+    term costs far more than the ``ts`` index walk it replaces. So the
+    index is searched over the newest ``SEARCH_WINDOW`` ids first and the
+    window grows until it holds ``limit`` matches. Ids follow insertion
+    order, so the result is only accepted if no row outside the window is
+    newer than the oldest match; otherwise the window keeps growing.
+    """
+    dialect = _installed.get(str(session.get_bind().url)) if mode != "like" else None
+    if dialect != "sqlite":
+        match = condition(session, query_text, mode)
+        return (query if match is None else query.filter(match)).limit(limit).all()
+    if condition(session, query_text, mode) is None:
+        return query.limit(limit).all()
+
+    max_id = session.query(func.max(LogEvent.id)).scalar() or 0
+    window = SEARCH_WINDOW
+    while window < max_id:
+        min_id = max_id - window
+        rows = query.filter(condition(session, query_text, mode, min_id)).limit(limit).all()
+        if len(rows) == limit:
+            outside = query.filter(LogEvent.id <= min_id, LogEvent.ts > rows[-1].ts)
+            if not session.query(outside.exists()).scalar():
+                return rows
+        window *= 8
+    return query.filter(condition(session, query_text, mode)).limit(limit).all()
@@ -0,0 +1,166 @@
+"""Asynchronous delivery of alerts queued in the ``alert_outbox`` table."""
+
+from __future__ import annotations
+
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import distinct, func
+
+from api.db import session_scope
+from api.models import AlertEvent, AlertOutbox
+from api.services import alerts
+from api.utils.time import utc_now
+
+# How long a claimed job stays invisible to other dispatchers before it is retried.
+CLAIM_LEASE_SEC = 60
+RETRY_MAX_SEC = 600
+
+# (outbox_id, channel, payload)
+_Job = Tuple[int, str, dict]
+
+
+def claim(session, limit: int, now: datetime, config: dict) -> List[_Job]:
+    """Lease due jobs to this dispatcher, up to ``limit`` per channel.
+
+    Rows are locked with ``FOR UPDATE SKIP LOCKED`` on Postgres so
+    concurrent dispatchers never claim the same job; jobs left ``sending``
+    by a crashed dispatcher become due again once their lease expires.
+    Channels that are throttled (see :func:`_throttled`) are skipped, so
+    their jobs pile up and go out together in the next digest.
+    """
+    due = AlertOutbox.status.in_(("pending", "sending")), AlertOutbox.next_attempt_ts <= now
+    channels = [row.channel for row in session.query(AlertOutbox.channel).filter(*due).distinct()]
+    jobs: List[_Job] = []
+    for channel in channels:
+        if _throttled(session, channel, now, config):
+            continue
+        rows = (
+            session.query(AlertOutbox)
+            .filter(AlertOutbox.channel == channel, *due)
+            .order_by(AlertOutbox.next_attempt_ts, AlertOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for row in rows:
+            row.status = "sending"
+            row.attempts += 1
+            row.next_attempt_ts = now + timedelta(seconds=CLAIM_LEASE_SEC)
+        jobs.extend((row.id, row.channel, row.payload) for row in rows)
+    return jobs
+
+
+def _throttled(session, channel: str, now: datetime, config: dict) -> bool:
+    """True while ``channel`` must not receive another message yet.
+
+    A channel gets at most one message per ``ALERT_DIGEST_WINDOW_SEC`` and
+    at most ``ALERT_CHANNEL_MAX_PER_MIN`` per minute. Every alert delivered
+    by one message shares its ``sent_ts``, so distinct ``sent_ts`` values
+    count messages across all dispatchers.
+    """
+    window = config.get("ALERT_DIGEST_WINDOW_SEC", 10.0)
+    if window > 0 and _messages_since(session, channel, now - timedelta(seconds=window)):
+        return True
+    max_per_min = config.get("ALERT_CHANNEL_MAX_PER_MIN", 0)
+    if max_per_min > 0:
+        return _messages_since(session, channel, now - timedelta(minutes=1)) >= max_per_min
+    return False
+
+
+def _messages_since(session, channel: str, since: datetime) -> int:
+    return (
+        session.query(func.count(distinct(AlertEvent.sent_ts)))
+        .filter(AlertEvent.channel == channel, AlertEvent.sent_ts >= since)
+        .scalar()
+    )
+
+
+def _backoff(attempts: int, base: float) -> float:
+    delay = min(base * 2 ** (attempts - 1), RETRY_MAX_SEC)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _deliver(channel: str, payloads: List[dict], config: dict) -> Optional[str]:
+    """Deliver one channel's jobs as a single message, returning an error message on failure."""
+    try:
+        if len(payloads) == 1:
+            alerts.deliver(channel, payloads[0], config)
+        else:
+            alerts.deliver_digest(channel, payloads, config)
+    except Exception as exc:  # pragma: no cover - IO
+        return str(exc) or exc.__class__.__name__
+    return None
+
+
+def dispatch_pending(config: dict) -> dict:
+    """Claim due jobs, deliver them concurrently and record each outcome.
+
+    All jobs claimed for a channel are coalesced into one message: a lone
+    alert is sent as-is, several become a digest. Each channel thus gets at
+    most one message per call, so ``ALERT_DISPATCH_CONCURRENCY`` only
+    parallelizes across channels and is effectively capped by the number
+    of channels with due jobs. Claiming, delivery and bookkeeping use
+    separate short transactions, so no database lock is held while waiting
+    on a webhook or SMTP server. Failed jobs are retried with jittered
+    exponential backoff until ``ALERT_MAX_ATTEMPTS``. Once a job is sent or
+    has failed for good, its status is copied onto the alert and the job is
+    deleted, so the outbox only holds work still to do.
+    """
+    now = utc_now()
+    with session_scope() as session:
+        jobs = claim(session, config.get("ALERT_DISPATCH_BATCH", 100), now, config)
+    if not jobs:
+        return {"sent": 0, "retrying": 0, "failed": 0}
+
+    batches: Dict[str, List[dict]] = defaultdict(list)
+    for _, channel, payload in jobs:
+        batches[channel].append(payload)
+    workers = max(1, min(config.get("ALERT_DISPATCH_CONCURRENCY", 8), len(batches)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alert-dispatch") as pool:
+        outcomes = dict(
+            zip(
+                batches,
+                pool.map(lambda channel: _deliver(channel, batches[channel], config), batches),
+            )
+        )
+    errors = [outcomes[channel] for _, channel, _ in jobs]
+
+    max_attempts = config.get("ALERT_MAX_ATTEMPTS", 5)
+    retry_base = config.get("ALERT_RETRY_BASE_SEC", 5.0)
+    counts = {"sent": 0, "retrying": 0, "failed": 0}
+    finished = utc_now()
+    with session_scope() as session:
+        for (outbox_id, channel, _), error in zip(jobs, errors):
+            row = session.get(AlertOutbox, outbox_id)
+            alert = row.alert
+            if error is None:
+                alert.status = "sent"
+                alert.sent_ts = finished
+                session.delete(row)
+                counts["sent"] += 1
+                continue
+            row.last_error = alert.last_error = error[:512]
+            if row.attempts >= max_attempts:
+                alert.status = "failed"
+                session.delete(row)
+                counts["failed"] += 1
+                logger.warning(
+                    "Alert delivery failed permanently",
+                    alert_id=alert.id,
+                    channel=channel,
+                    attempts=row.attempts,
+                    error=error,
+                )
+            else:
+                row.status = "pending"
+                row.next_attempt_ts = finished + timedelta(
+                    seconds=_backoff(row.attempts, retry_base)
+                )
+                counts["retrying"] += 1
+    logger.info("Dispatched alerts", messages=len(batches), **counts)
+    return counts
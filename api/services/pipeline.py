@@ -2,21 +2,21 @@
 
 from __future__ import annotations
 
-from decimal import Decimal
+import time
 from typing import Dict, Iterable, List
 
 from loguru import logger
-from sqlalchemy.exc import IntegrityError
 
 from api.db import session_scope
-from api.models import LogEvent, MetricPoint, Service
+from api.models import Service
 from api.schemas import validate_log_batch, validate_metric_batch
-from api.services.celery_app import celery
+from api.services.celery_app import TRAIN_DETECTOR_TASK, celery
 from api.utils.config import load_config
 from api.utils.time import utc_now
 from api.services import alerts as alerts_service
 from api.services import anomaly as anomaly_service
 from api.services import kpis as kpi_service
+from api.services import outbox, response_cache, rollups, rules, scheduler, storage, windows
 
 
 def _ensure_services(session, service_names: Iterable[str]) -> Dict[str, Service]:
@@ -45,33 +45,15 @@ def parse_logs_task(payload: List[dict]) -> dict:
 
     with session_scope() as session:
         services = _ensure_services(session, {record.service for record in records})
-        inserted = 0
-        for record in records:
-            service = services[record.service]
-            event = LogEvent(
-                service_id=service.id,
-                ts=record.ts,
-                level=record.level,
-                message=record.message,
-                latency_ms=record.latency_ms,
-                status_code=record.status_code,
-                meta=record.meta,
-            )
-            session.add(event)
-            inserted += 1
-
-        session.flush()
-
-        snapshots = []
-        for service in services.values():
-            snapshot = kpi_service.refresh_kpis(session, service, config)
-            if snapshot:
-                anomaly = anomaly_service.evaluate(service.name, snapshot, config)
-                alerts_service.handle_alerts(session, service, snapshot, anomaly, config)
-                snapshots.append({**snapshot, "anomaly": anomaly})
+        service_ids = {name: svc.id for name, svc in services.items()}
+        windows.hold_rebuilds(session, service_ids.values())
+        last_id = storage.insert_log_events(session, storage.log_rows(records, service_ids))
 
-    logger.info("Processed log batch", inserted=inserted, services=len(services))
-    return {"status": "ok", "inserted": inserted, "errors": errors, "snapshots": snapshots}
+    windows.record_logs(config, records, service_ids, utc_now(), last_id)
+    scheduler.mark_dirty(config, service_ids.values())
+    inserted = len(records)
+    logger.info("Processed log batch", inserted=inserted, services=len(service_ids))
+    return {"status": "ok", "inserted": inserted, "errors": errors, "services": sorted(service_ids)}
 
 
 @celery.task(name="flowguard.aggregate_metrics")
@@ -84,30 +66,97 @@ def aggregate_metrics_task(payload: List[dict]) -> dict:
 
     with session_scope() as session:
         services = _ensure_services(session, {record.service for record in records})
-        upserted = 0
-        for record in records:
-            service = services[record.service]
-            point = MetricPoint(
-                service_id=service.id,
-                ts=record.ts,
-                tps=Decimal(str(round(record.tps, 6))),
-                error_rate=Decimal(str(round(record.error_rate, 6))),
-                p95_latency_ms=record.p95_latency_ms,
+        rows = [
+            storage.metric_row(
+                services[record.service].id,
+                record.ts,
+                record.tps,
+                record.error_rate,
+                record.p95_latency_ms,
             )
-            try:
-                session.merge(point)
-            except IntegrityError:
-                session.rollback()
-                session.merge(point)
-            upserted += 1
-
-        snapshots = []
-        for service in services.values():
-            snapshot = kpi_service.refresh_kpis(session, service, config)
-            if snapshot:
-                anomaly = anomaly_service.evaluate(service.name, snapshot, config)
-                alerts_service.handle_alerts(session, service, snapshot, anomaly, config)
+            for record in records
+        ]
+        upserted = storage.upsert_metric_points(session, rows)
+        service_ids = {name: svc.id for name, svc in services.items()}
+
+    scheduler.mark_dirty(config, service_ids.values())
+    response_cache.bump_services(config, service_ids)
+    logger.info("Processed metric batch", count=upserted, services=len(service_ids))
+    return {"status": "ok", "upserted": upserted, "errors": errors, "services": sorted(service_ids)}
+
+
+@celery.task(name="flowguard.evaluate_kpis")
+def evaluate_kpis_task() -> dict:
+    """Refresh KPIs, anomalies and alerts for services marked dirty by ingestion."""
+    config = load_config()
+    service_ids = scheduler.claim_due_services(config)
+    if not service_ids:
+        return {"status": "idle", "evaluated": 0}
+
+    try:
+        with session_scope() as session:
+            services = session.query(Service).filter(Service.id.in_(service_ids)).all()
+            kpi_snapshots = kpi_service.refresh_kpis_many(session, services, config)
+
+        # Scored between transactions so an inline model fit never holds database locks.
+        anomalies = anomaly_service.evaluate_many(kpi_snapshots, config)
+        evaluation = rules.evaluate_snapshots(kpi_snapshots, config, time.time())
+
+        with session_scope() as session:
+            services = {
+                service.id: service
+                for service in session.query(Service).filter(Service.id.in_(service_ids))
+            }
+            snapshots = []
+            queued = 0
+            for snapshot, anomaly, triggers in zip(kpi_snapshots, anomalies, evaluation.triggers):
+                service = services[snapshot["service_id"]]
+                queued += len(
+                    alerts_service.handle_alerts(
+                        session, service, snapshot, anomaly, config, triggers=triggers
+                    )
+                )
                 snapshots.append({**snapshot, "anomaly": anomaly})
+        # Saved only once the alerts are committed, so a failed tick re-fires them.
+        evaluation.save()
+    except Exception:
+        # Put the claimed services back so the next tick retries them.
+        scheduler.mark_dirty(config, service_ids)
+        raise
+
+    # The refresh wrote a metric point for every evaluated service.
+    response_cache.bump_services(config, [snapshot["service"] for snapshot in snapshots])
+    if queued:
+        response_cache.bump(config, [response_cache.ALERTS_SCOPE])
+        dispatch_alerts_task.delay()
+    logger.info("Evaluated KPIs", services=len(snapshots), alerts=queued)
+    return {"status": "ok", "evaluated": len(snapshots), "snapshots": snapshots}
+
+
+@celery.task(name="flowguard.dispatch_alerts")
+def dispatch_alerts_task() -> dict:
+    """Deliver alerts waiting in the outbox."""
+    config = load_config()
+    counts = outbox.dispatch_pending(config)
+    if any(counts.values()):
+        response_cache.bump(config, [response_cache.ALERTS_SCOPE])
+    return {"status": "ok", **counts}
+
+
+@celery.task(name=TRAIN_DETECTOR_TASK)
+def train_detector_task(service_name: str) -> dict:
+    """Refit a service's anomaly model on the training queue."""
+    config = load_config()
+    trained = anomaly_service.train(service_name, config)
+    return {"status": "ok" if trained else "skipped", "service": service_name}
 
-    logger.info("Processed metric batch", count=upserted, services=len(services))
-    return {"status": "ok", "upserted": upserted, "errors": errors, "snapshots": snapshots}
+
+@celery.task(name="flowguard.compact_metrics")
+def compact_metrics_task() -> dict:
+    """Roll recent metric points up into the 1m/5m/1h rollup tables."""
+    config = load_config()
+    with session_scope() as session:
+        written, service_names = rollups.compact(session, config)
+    response_cache.bump_services(config, service_names)
+    logger.info("Compacted metric rollups", rows=written)
+    return {"status": "ok", "rollups": written}
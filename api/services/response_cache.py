@@ -0,0 +1,267 @@
+"""Short-lived response cache for the dashboard read endpoints.
+
+Responses are cached by endpoint and normalized query (the ``range`` is
+reduced to its length in seconds, so ``60m`` and ``1h`` share an entry)
+for ``RESPONSE_CACHE_TTL_SEC``. Every key also carries the current
+*generation* of the data it was built from: the service's scope for
+``/api/metrics`` and ``/api/kpis`` and the alerts scope for
+``/api/alerts``. Pipeline tasks :func:`bump` a scope after writing to it,
+which moves readers to new keys at once; stale entries are never read
+again and simply age out.
+
+The cache fails open: if the backend is unreachable the view is served
+uncached and a bump is skipped (entries still expire after the TTL). After
+a failure the backend is left alone for ``RETRY_AFTER_SEC``, so an outage
+costs one warning and one failed connection per interval, not per request.
+
+Responses carry an ``ETag`` (hash of the body) and answer a matching
+``If-None-Match`` with ``304 Not Modified``.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import redis
+from flask import current_app, request
+from loguru import logger
+
+from api.utils.cache import TTLCache
+from api.utils.redis_client import get_redis
+from api.utils.time import parse_range
+
+GENERATIONS_KEY = "flowguard:response_cache:generations"
+ENTRY_PREFIX = "flowguard:response_cache:entry:"
+
+ALERTS_SCOPE = "alerts"
+# How long the cache is bypassed after a backend error before it is tried again.
+RETRY_AFTER_SEC = 5.0
+
+
+def service_scope(service_name: str) -> str:
+    return f"service:{service_name}"
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    etag: str
+    body: bytes
+    mimetype: str
+
+
+class ResponseCache(ABC):
+    """Generation counters and cached response bodies."""
+
+    @abstractmethod
+    def generations(self, scopes: Tuple[str, ...]) -> Tuple[int, ...]:
+        ...
+
+    @abstractmethod
+    def bump(self, scopes: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class MemoryResponseCache(ResponseCache):
+    """Per-process LRU for single-process setups.
+
+    Bumps made by other processes (e.g. Celery workers) are not seen here,
+    so their writes show up once entries expire after the TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._entries: TTLCache[CachedResponse] = TTLCache(maxsize, ttl)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generations(self, scopes: Tuple[str, ...]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(scope, 0) for scope in scopes)
+
+    def bump(self, scopes: Iterable[str]) -> None:
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self._entries.get(key)
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        # Entries share the TTL the cache was built with (part of the get_cache key).
+        self._entries.set(key, entry)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        with self._lock:
+            self._generations.clear()
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared by every API process; generations are bumped by the Celery workers."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    def generations(self, scopes: Tuple[str, ...]) -> Tuple[int, ...]:
+        values = get_redis(self.url).hmget(GENERATIONS_KEY, scopes)
+        return tuple(int(value or 0) for value in values)
+
+    def bump(self, scopes: Iterable[str]) -> None:
+        pipe = get_redis(self.url).pipeline(transaction=False)
+        for scope in set(scopes):
+            pipe.hincrby(GENERATIONS_KEY, scope, 1)
+        pipe.execute()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        fields = get_redis(self.url).hmget(ENTRY_PREFIX + key, ("etag", "body", "mimetype"))
+        if fields[0] is None:
+            return None
+        etag, body, mimetype = fields
+        return CachedResponse(etag.decode("ascii"), body, mimetype.decode("ascii"))
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        name = ENTRY_PREFIX + key
+        pipe = get_redis(self.url).pipeline(transaction=True)
+        fields = {"etag": entry.etag, "body": entry.body, "mimetype": entry.mimetype}
+        pipe.hset(name, mapping=fields)
+        pipe.pexpire(name, max(1, int(ttl * 1000)))
+        pipe.execute()
+
+    def clear(self) -> None:
+        client = get_redis(self.url)
+        keys = list(client.scan_iter(match=ENTRY_PREFIX + "*"))
+        client.delete(GENERATIONS_KEY, *keys)
+
+
+# Backend errors the cache absorbs instead of failing the request or task.
+_BACKEND_ERRORS = (redis.RedisError, ConnectionError)
+
+
+class _Outage:
+    """Process-wide record of the last backend error."""
+
+    def __init__(self) -> None:
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def active(self) -> bool:
+        return time.monotonic() < self._until
+
+    def record(self, message: str, **fields) -> None:
+        """Start a ``RETRY_AFTER_SEC`` pause, logging ``message`` unless one is running."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._until:
+                return
+            self._until = now + RETRY_AFTER_SEC
+        logger.warning(message, retry_after_sec=RETRY_AFTER_SEC, **fields)
+
+
+_outage = _Outage()
+
+_caches: Dict[Tuple[str, int, float], ResponseCache] = {}
+
+
+def get_cache(config: dict) -> ResponseCache:
+    """Return the cache for the configured ``RESPONSE_CACHE_BACKEND``."""
+    backend = config.get("RESPONSE_CACHE_BACKEND", "redis")
+    ttl = config.get("RESPONSE_CACHE_TTL_SEC", 5.0)
+    key = (backend, config.get("RESPONSE_CACHE_SIZE", 1024), ttl)
+    if key not in _caches:
+        if backend == "memory":
+            _caches[key] = MemoryResponseCache(key[1], ttl)
+        else:
+            _caches[key] = RedisResponseCache(config.get("REDIS_URL"))
+    return _caches[key]
+
+
+def bump(config: dict, scopes: Iterable[str]) -> None:
+    """Invalidate every cached response built from ``scopes``."""
+    scopes = list(scopes)
+    if not scopes or config.get("RESPONSE_CACHE_TTL_SEC", 5.0) <= 0 or _outage.active():
+        return
+    try:
+        get_cache(config).bump(scopes)
+    except _BACKEND_ERRORS as exc:
+        _outage.record("Response cache bump failed", scopes=scopes, error=str(exc))
+
+
+def bump_services(config: dict, service_names: Iterable[str]) -> None:
+    bump(config, [service_scope(name) for name in service_names])
+
+
+def _request_key(scopes: Tuple[str, ...], generations: Tuple[int, ...]) -> str:
+    args = request.args.to_dict(flat=False)
+    if "range" in args:
+        start, end = parse_range(args["range"][-1])
+        args["range"] = [str(round((end - start).total_seconds()))]
+    query = "&".join(f"{name}={value}" for name in sorted(args) for value in args[name])
+    stamp = ",".join(f"{scope}={generation}" for scope, generation in zip(scopes, generations))
+    raw = f"{request.path}?{query}#{stamp}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def cached(scope: Optional[str] = None):
+    """Serve a GET view from the response cache.
+
+    ``scope`` names the data the view reads; by default it is the scope of
+    the ``service`` query parameter. Only ``200`` responses are cached.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            ttl = config.get("RESPONSE_CACHE_TTL_SEC", 5.0)
+            if ttl <= 0 or _outage.active():
+                return view(*args, **kwargs)
+
+            cache = get_cache(config)
+            scopes = (scope or service_scope(request.args.get("service", "")),)
+            try:
+                key = _request_key(scopes, cache.generations(scopes))
+                entry = cache.get(key)
+            except _BACKEND_ERRORS as exc:
+                _outage.record("Response cache unavailable", path=request.path, error=str(exc))
+                return view(*args, **kwargs)
+
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = CachedResponse(hashlib.sha1(body).hexdigest(), body, response.mimetype)
+                try:
+                    cache.set(key, entry, ttl)
+                except _BACKEND_ERRORS as exc:
+                    _outage.record("Response cache write failed", path=request.path, error=str(exc))
+                status = "miss"
+            else:
+                response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+                status = "hit"
+
+            response.set_etag(entry.etag)
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Cache"] = status
+            return response.make_conditional(request)
+
+        return wrapper
+
+    return decorator
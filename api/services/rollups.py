@@ -0,0 +1,200 @@
+"""Pre-aggregated metric rollups for long-range chart queries.
+
+Each resolution has a watermark in ``metric_rollup_watermarks``: the start
+of the newest bucket compacted so far. ``metric_rollups`` is complete from
+the oldest metric point up to the watermark. :func:`compact` aggregates
+only from the watermark on, stepping back ``ROLLUP_LOOKBACK_MIN`` to catch
+late points. A database with history but no watermark is backfilled from
+its oldest point, ``ROLLUP_BACKFILL_HOURS`` per run. :func:`series_rows`
+reads rollups below the watermark and aggregates raw points above it, so
+charts are complete while a backfill runs and include the open bucket.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Set, Tuple
+
+from sqlalchemy import BigInteger, Float, Integer, cast, func, select
+
+from api.models import MetricPoint, MetricRollup, MetricRollupWatermark, Service
+from api.services import storage
+from api.utils.time import utc_now
+
+# Rollup bucket widths in seconds, finest first.
+RESOLUTIONS = (60, 300, 3600)
+RESOLUTION_LABELS = {0: "raw", 60: "1m", 300: "5m", 3600: "1h"}
+
+
+def _epoch_seconds(column, dialect: str):
+    """Whole seconds since the epoch, truncated like SQLite's ``strftime('%s')``."""
+    if dialect == "postgresql":
+        # extract() keeps the microseconds and a bare cast would round them.
+        return cast(func.floor(func.extract("epoch", column)), BigInteger)
+    return cast(func.strftime("%s", column), Integer)
+
+
+def _epoch(ts: datetime) -> int:
+    """Seconds since the epoch; naive values (SQLite) are UTC."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+def _utc(epoch: int) -> datetime:
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc)
+
+
+def _decimal(value) -> Decimal:
+    return Decimal(str(round(float(value), 6)))
+
+
+def _bucketed(dialect: str, resolution: int):
+    """``metric_points`` grouped per service into ``resolution``-wide buckets."""
+    epoch = _epoch_seconds(MetricPoint.ts, dialect)
+    bucket = ((epoch // resolution) * resolution).label("bucket")
+    return select(
+        MetricPoint.service_id,
+        bucket,
+        cast(func.avg(MetricPoint.error_rate), Float),
+        cast(func.max(MetricPoint.error_rate), Float),
+        func.max(MetricPoint.p95_latency_ms),
+        cast(func.avg(MetricPoint.tps), Float),
+        func.count(MetricPoint.id),
+    ).group_by(MetricPoint.service_id, bucket)
+
+
+def compact(session, config: dict, now: datetime | None = None) -> Tuple[int, List[str]]:
+    """Roll new ``metric_points`` up into ``metric_rollups`` and advance the watermarks.
+
+    Per resolution, aggregates from the watermark (less the lookback) up to
+    ``now`` with a ``GROUP BY service_id, bucket`` query and upserts the
+    result. Without a watermark it starts at the oldest point. A run covers
+    at most ``ROLLUP_BACKFILL_HOURS``, and spans without points are
+    skipped. Returns the number of rollup rows written and the names of the
+    services they belong to.
+    """
+    now_epoch = _epoch(now or utc_now())
+    lookback = int(config.get("ROLLUP_LOOKBACK_MIN", 5)) * 60
+    backfill = int(config.get("ROLLUP_BACKFILL_HOURS", 24)) * 3600
+    dialect = session.get_bind().dialect.name
+
+    written = 0
+    service_ids: Set[int] = set()
+    for resolution in RESOLUTIONS:
+        state = session.get(MetricRollupWatermark, resolution)
+        start = 0 if state is None else min(_epoch(state.watermark_ts), now_epoch - lookback)
+        # Skip spans without points so a backfill never stalls on a gap.
+        first = session.scalar(
+            select(func.min(MetricPoint.ts)).where(MetricPoint.ts >= _utc(start))
+        )
+        if first is None:
+            continue
+        start = max(start, _epoch(first)) // resolution * resolution
+        span = max(backfill, resolution)
+        caught_up = start + span >= now_epoch
+        if caught_up:
+            end = now_epoch
+            in_range = MetricPoint.ts <= _utc(end)
+            watermark = now_epoch // resolution * resolution
+        else:
+            end = (start + span) // resolution * resolution
+            in_range = MetricPoint.ts < _utc(end)
+            watermark = end
+
+        rows = session.execute(
+            _bucketed(dialect, resolution).where(MetricPoint.ts >= _utc(start), in_range)
+        )
+        rollups: List[dict] = [
+            {
+                "service_id": service_id,
+                "resolution_sec": resolution,
+                "bucket_ts": _utc(bucket_epoch),
+                "avg_error_rate": _decimal(avg_error),
+                "max_error_rate": _decimal(max_error),
+                "max_p95_latency_ms": int(max_p95),
+                "avg_tps": _decimal(avg_tps),
+                "sample_count": int(count),
+            }
+            for service_id, bucket_epoch, avg_error, max_error, max_p95, avg_tps, count in rows
+        ]
+        written += storage.upsert_metric_rollups(session, rollups)
+        service_ids.update(row["service_id"] for row in rollups)
+        session.merge(
+            MetricRollupWatermark(
+                resolution_sec=resolution, watermark_ts=_utc(watermark), updated_ts=utc_now()
+            )
+        )
+    if not service_ids:
+        return written, []
+    names = session.scalars(select(Service.name).where(Service.id.in_(service_ids)))
+    return written, sorted(names)
+
+
+def series_rows(
+    session, service_name: str, resolution: int, start: datetime, end: datetime
+) -> List[tuple]:
+    """``(bucket_ts, avg_error_rate, max_error_rate, max_p95, avg_tps)`` rows, oldest first.
+
+    Buckets before the resolution's watermark come from ``metric_rollups``;
+    later ones, or all of them before the first compaction, are aggregated
+    from ``metric_points`` on the fly. Only buckets starting at or after
+    ``start`` are returned.
+    """
+    start_epoch, end_epoch = _epoch(start), _epoch(end)
+    state = session.get(MetricRollupWatermark, resolution)
+    split = start_epoch
+    if state is not None:
+        split = min(max(_epoch(state.watermark_ts), start_epoch), end_epoch)
+
+    rows: List[tuple] = []
+    if split > start_epoch:
+        rows.extend(
+            (_utc(_epoch(bucket_ts)), *values)
+            for bucket_ts, *values in session.execute(
+                select(
+                    MetricRollup.bucket_ts,
+                    cast(MetricRollup.avg_error_rate, Float),
+                    cast(MetricRollup.max_error_rate, Float),
+                    MetricRollup.max_p95_latency_ms,
+                    cast(MetricRollup.avg_tps, Float),
+                )
+                .join(Service)
+                .where(
+                    Service.name == service_name,
+                    MetricRollup.resolution_sec == resolution,
+                    MetricRollup.bucket_ts >= start,
+                    MetricRollup.bucket_ts < _utc(split),
+                )
+                .order_by(MetricRollup.bucket_ts.asc())
+            )
+        )
+
+    dialect = session.get_bind().dialect.name
+    live = session.execute(
+        _bucketed(dialect, resolution)
+        .join(Service, Service.id == MetricPoint.service_id)
+        .where(
+            Service.name == service_name,
+            MetricPoint.ts >= _utc(split),
+            MetricPoint.ts <= end,
+        )
+        .order_by("bucket")
+    )
+    rows.extend(
+        (_utc(bucket_epoch), avg_error_rate, max_error_rate, max_p95, avg_tps)
+        for _, bucket_epoch, avg_error_rate, max_error_rate, max_p95, avg_tps, _ in live
+        # A bucket that begins before ``start`` would only be partly covered.
+        if bucket_epoch >= start_epoch
+    )
+    return rows
+
+
+def select_resolution(start: datetime, end: datetime, min_points: int) -> int:
+    """Pick the coarsest rollup that still yields ``min_points`` buckets; 0 means raw."""
+    span = (end - start).total_seconds()
+    for resolution in sorted(RESOLUTIONS, reverse=True):
+        if span / resolution >= min_points:
+            return resolution
+    return 0
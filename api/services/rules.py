@@ -0,0 +1,509 @@
+"""Compiled alert rules evaluated over a batch of KPI snapshots at once.
+
+A rule compares one snapshot metric against a threshold, or against its
+own recent baseline (``"op": "rise"``), and fires once the condition has
+held for ``for`` consecutive evaluations. Rules may be scoped to named
+services or to a tier; a rule with the same name and a narrower scope
+overrides the broader one for the services it covers. Definitions come
+from ``ALERT_RULES_FILE`` (JSON) or, when unset, from the legacy
+``ALERT_ERROR_RATE_THRESHOLD`` / ``ALERT_P95_LATENCY_MS`` thresholds::
+
+    {
+      "tiers": {"gold": ["checkout", "payments"]},
+      "rules": [
+        {"name": "latency_threshold", "metric": "p99_latency_ms", "op": ">",
+         "threshold": 800, "for": 3, "tier": "gold"},
+        {"name": "error_rate_rising", "metric": "error_rate", "op": "rise",
+         "factor": 2.0, "over_sec": 300, "min_baseline": 0.01, "severity": "critical"}
+      ]
+    }
+
+Definitions are compiled once into per-rule arrays; evaluation is a
+handful of numpy operations over a ``rules x services`` matrix. The only
+per-service state is a streak counter and, for rise rules, a baseline.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from api.utils.redis_client import get_redis
+
+KEY_PREFIX = "flowguard:rules"
+METRICS = (
+    "error_rate",
+    "p50_latency_ms",
+    "p90_latency_ms",
+    "p95_latency_ms",
+    "p99_latency_ms",
+    "tps",
+    "log_count",
+)
+OPS = (">", ">=", "<", "<=", "rise")
+SEVERITIES = ("info", "warn", "critical")
+MAX_STREAK = np.iinfo(np.uint16).max
+
+_METRIC_LABELS = {
+    "error_rate": "Error rate",
+    "p50_latency_ms": "p50 latency",
+    "p90_latency_ms": "p90 latency",
+    "p95_latency_ms": "p95 latency",
+    "p99_latency_ms": "p99 latency",
+    "tps": "TPS",
+    "log_count": "Log volume",
+}
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """Rule definitions compiled into parallel arrays, one entry per rule."""
+
+    digest: bytes
+    names: Tuple[str, ...]
+    definitions: Tuple[dict, ...]
+    metric: np.ndarray  # column in the snapshot matrix
+    sign: np.ndarray  # -1 for "<"/"<=" so every comparison becomes ">"/">="
+    strict: np.ndarray
+    rise: np.ndarray
+    threshold: np.ndarray  # signed threshold, or the rise factor
+    critical: np.ndarray  # signed critical threshold / factor, NaN when unset
+    min_baseline: np.ndarray
+    over_sec: np.ndarray
+    hold: np.ndarray  # consecutive evaluations required
+    severity: Tuple[str, ...]
+    messages: Tuple[str, ...]  # str.format templates taking ``value``
+    services: Tuple[Optional[frozenset], ...]
+    tier: Tuple[Optional[str], ...]
+    tiers: Dict[str, str]  # service name -> tier
+    # Indices of same-named rules, most specific scope first, for rules that are overridden.
+    overrides: Tuple[Tuple[int, ...], ...]
+    columns: Tuple[int, ...]  # METRICS columns read by at least one rule
+    state_dtype: np.dtype
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def default_definitions(config: dict) -> dict:
+    """Rules equivalent to the original hard-coded threshold checks."""
+    error_rate = float(config.get("ALERT_ERROR_RATE_THRESHOLD", 0.05))
+    latency = float(config.get("ALERT_P95_LATENCY_MS", 500))
+    return {
+        "rules": [
+            {
+                "name": "error_rate_threshold",
+                "metric": "error_rate",
+                "op": ">=",
+                "threshold": error_rate,
+                "critical": error_rate * 2,
+                "message": "Error rate {value:.2%} exceeded threshold",
+            },
+            {
+                "name": "latency_threshold",
+                "metric": "p95_latency_ms",
+                "op": ">=",
+                "threshold": latency,
+                "critical": latency * 1.5,
+                "message": "p95 latency {value:.0f}ms exceeded threshold",
+            },
+        ]
+    }
+
+
+def _message_template(rule: dict, rise: bool, hold: int) -> str:
+    template = rule.get("message")
+    if template is None:
+        label = _METRIC_LABELS[rule["metric"]]
+        if rise:
+            template = f"{label} {{value:g}} rose {float(rule['factor']):g}x above baseline"
+        else:
+            template = f"{label} {{value:g}} {rule.get('op', '>=')} {float(rule['threshold']):g}"
+        if hold > 1:
+            template += f" for {hold} evaluations"
+    return template
+
+
+def compile_rules(definitions: dict) -> RuleSet:
+    """Validate rule definitions and compile them into a :class:`RuleSet`.
+
+    Raises ``ValueError`` describing the first invalid rule.
+    """
+    rules = list(definitions.get("rules", []))
+    tiers: Dict[str, str] = {}
+    for tier, members in (definitions.get("tiers") or {}).items():
+        for service_name in members:
+            tiers[service_name] = tier
+
+    columns: Dict[str, list] = defaultdict(list)
+    names, severity, messages, services, tier_scopes = [], [], [], [], []
+    for index, rule in enumerate(rules):
+        name = rule.get("name")
+        metric = rule.get("metric")
+        op = rule.get("op", ">=")
+        if not name:
+            raise ValueError(f"rule #{index} has no name")
+        if metric not in METRICS:
+            raise ValueError(f"rule {name!r}: metric must be one of {', '.join(METRICS)}")
+        if op not in OPS:
+            raise ValueError(f"rule {name!r}: op must be one of {', '.join(OPS)}")
+        if rule.get("severity", "warn") not in SEVERITIES:
+            raise ValueError(f"rule {name!r}: severity must be one of {', '.join(SEVERITIES)}")
+        if rule.get("services") and rule.get("tier"):
+            raise ValueError(f"rule {name!r}: use either services or tier, not both")
+        rise = op == "rise"
+        try:
+            threshold = float(rule["factor"] if rise else rule["threshold"])
+            critical = float(rule["critical"]) if rule.get("critical") is not None else math.nan
+            hold = int(rule.get("for", 1))
+            over_sec = float(rule.get("over_sec", 300))
+            min_baseline = float(rule.get("min_baseline", 0.0))
+        except KeyError as exc:
+            raise ValueError(f"rule {name!r}: missing {exc.args[0]!r}") from exc
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"rule {name!r}: {exc}") from exc
+        if hold < 1 or over_sec <= 0:
+            raise ValueError(f"rule {name!r}: 'for' must be >= 1 and 'over_sec' > 0")
+
+        sign = -1.0 if op in ("<", "<=") else 1.0
+        columns["metric"].append(METRICS.index(metric))
+        columns["sign"].append(sign)
+        columns["strict"].append(op in (">", "<"))
+        columns["rise"].append(rise)
+        columns["threshold"].append(threshold * (1.0 if rise else sign))
+        columns["critical"].append(critical * (1.0 if rise else sign))
+        columns["min_baseline"].append(min_baseline)
+        columns["over_sec"].append(over_sec)
+        columns["hold"].append(min(hold, MAX_STREAK))
+        names.append(name)
+        severity.append(rule.get("severity", "warn"))
+        messages.append(_message_template(rule, rise, min(hold, MAX_STREAK)))
+        services.append(frozenset(rule["services"]) if rule.get("services") else None)
+        tier_scopes.append(rule.get("tier"))
+
+    by_name: Dict[str, List[int]] = {}
+    for index, name in enumerate(names):
+        by_name.setdefault(name, []).append(index)
+    overrides = tuple(
+        tuple(sorted(indices, key=lambda i: (services[i] is None, tier_scopes[i] is None)))
+        for indices in by_name.values()
+        if len(indices) > 1
+    )
+
+    canonical = json.dumps(definitions, sort_keys=True, default=str).encode("utf-8")
+    metric = np.array(columns["metric"], dtype=np.intp)
+    used = tuple(sorted(set(columns["metric"])))
+    return RuleSet(
+        digest=hashlib.blake2b(canonical, digest_size=8).digest(),
+        names=tuple(names),
+        definitions=tuple(rules),
+        # Re-indexed into the matrix of used columns built by ``_snapshot_matrix``.
+        metric=np.searchsorted(used, metric).astype(np.intp),
+        sign=np.array(columns["sign"]),
+        strict=np.array(columns["strict"], dtype=bool),
+        rise=np.array(columns["rise"], dtype=bool),
+        threshold=np.array(columns["threshold"]),
+        critical=np.array(columns["critical"]),
+        min_baseline=np.array(columns["min_baseline"]),
+        over_sec=np.array(columns["over_sec"]),
+        hold=np.array(columns["hold"], dtype=np.uint16),
+        severity=tuple(severity),
+        messages=tuple(messages),
+        services=tuple(services),
+        tier=tuple(tier_scopes),
+        tiers=tiers,
+        overrides=overrides,
+        columns=used,
+        state_dtype=np.dtype(
+            [
+                ("digest", "S8"),
+                ("evaluated_at", "<f8"),
+                ("streak", "<u2", (len(names),)),
+                ("baseline", "<f4", (len(names),)),
+            ]
+        ),
+    )
+
+
+_compiled: Dict[tuple, RuleSet] = {}
+_compiled_lock = threading.Lock()
+
+
+def load_rules(config: dict) -> RuleSet:
+    """Return the compiled rules for ``config``; recompiled only when the source changes.
+
+    A missing ``ALERT_RULES_FILE`` falls back to the default rules, with a
+    warning logged once until the file appears.
+    """
+    path = config.get("ALERT_RULES_FILE")
+    mtime = None
+    if path:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    if mtime is not None:
+        key: tuple = ("file", path, mtime)
+    else:
+        key = (
+            "defaults",
+            path,
+            config.get("ALERT_ERROR_RATE_THRESHOLD", 0.05),
+            config.get("ALERT_P95_LATENCY_MS", 500),
+        )
+    with _compiled_lock:
+        ruleset = _compiled.get(key)
+    if ruleset is None:
+        if mtime is not None:
+            with open(path, encoding="utf-8") as handle:
+                ruleset = compile_rules(json.load(handle))
+        else:
+            if path:
+                logger.warning("Alert rules file not found; using default rules", path=path)
+            ruleset = compile_rules(default_definitions(config))
+        with _compiled_lock:
+            _compiled.clear()
+            _compiled[key] = ruleset
+    return ruleset
+
+
+def new_states(ruleset: RuleSet, count: int) -> np.ndarray:
+    """Fresh state records for ``count`` services.
+
+    Rule state is a structured array with one fixed-size record per
+    service (``ruleset.state_dtype``): the rule set digest, the last
+    evaluation time and, per rule, a uint16 streak counter and a float32
+    baseline (NaN until first seen, unused by non-rise rules).
+    """
+    states = np.zeros(count, dtype=ruleset.state_dtype)
+    states["digest"] = ruleset.digest
+    states["baseline"] = np.nan
+    return states
+
+
+def encode_states(states: np.ndarray) -> List[bytes]:
+    size = states.dtype.itemsize
+    raw = states.tobytes()
+    return [raw[offset : offset + size] for offset in range(0, len(raw), size)]
+
+
+def decode_states(ruleset: RuleSet, payloads: Sequence[Optional[bytes]]) -> np.ndarray:
+    """Decode stored records in one pass; missing or stale ones (other rule set) start fresh."""
+    size = ruleset.state_dtype.itemsize
+    # A zeroed record never matches the digest, so missing payloads are reset with the stale ones.
+    blank = bytes(size)
+    raw = b"".join([payload if payload and len(payload) == size else blank for payload in payloads])
+    states = np.frombuffer(raw, dtype=ruleset.state_dtype).copy()
+    stale = states["digest"] != ruleset.digest
+    if stale.any():
+        states[stale] = new_states(ruleset, 1)
+    return states
+
+
+class RuleStateStore(ABC):
+    """Storage for per-service rule state, shared by every evaluator."""
+
+    @abstractmethod
+    def load_many(self, ruleset: RuleSet, service_names: Sequence[str]) -> np.ndarray:
+        """Return one state record per service (see :func:`new_states`)."""
+
+    @abstractmethod
+    def save_many(self, service_names: Sequence[str], states: np.ndarray) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class MemoryRuleStateStore(RuleStateStore):
+    """Process-local rule state for single-process deployments and development."""
+
+    def __init__(self) -> None:
+        self._states: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def load_many(self, ruleset: RuleSet, service_names: Sequence[str]) -> np.ndarray:
+        with self._lock:
+            payloads = [self._states.get(name) for name in service_names]
+        return decode_states(ruleset, payloads)
+
+    def save_many(self, service_names: Sequence[str], states: np.ndarray) -> None:
+        payloads = encode_states(states)
+        with self._lock:
+            self._states.update(zip(service_names, payloads))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+
+class RedisRuleStateStore(RuleStateStore):
+    """Rule state in Redis: one small blob per service, read and written in one round trip."""
+
+    def __init__(self, url: str, ttl: int) -> None:
+        self.url = url
+        self.ttl = max(1, ttl)
+
+    def _key(self, service_name: str) -> str:
+        return f"{KEY_PREFIX}:{service_name}"
+
+    def load_many(self, ruleset: RuleSet, service_names: Sequence[str]) -> np.ndarray:
+        payloads = get_redis(self.url).mget([self._key(name) for name in service_names])
+        return decode_states(ruleset, payloads)
+
+    def save_many(self, service_names: Sequence[str], states: np.ndarray) -> None:
+        pipe = get_redis(self.url).pipeline(transaction=False)
+        for service_name, payload in zip(service_names, encode_states(states)):
+            pipe.set(self._key(service_name), payload, ex=self.ttl)
+        pipe.execute()
+
+    def clear(self) -> None:
+        client = get_redis(self.url)
+        keys = list(client.scan_iter(match=f"{KEY_PREFIX}:*"))
+        if keys:
+            client.delete(*keys)
+
+
+_stores: Dict[str, RuleStateStore] = {}
+
+
+def get_store(config: dict) -> RuleStateStore:
+    """Return the rule state store for the configured ``ALERT_RULE_STATE_BACKEND``."""
+    backend = config.get("ALERT_RULE_STATE_BACKEND", "redis")
+    if backend not in _stores:
+        if backend == "memory":
+            _stores[backend] = MemoryRuleStateStore()
+        else:
+            _stores[backend] = RedisRuleStateStore(
+                config.get("REDIS_URL"), int(config.get("ALERT_RULE_STATE_TTL_SEC", 86400))
+            )
+    return _stores[backend]
+
+
+def _snapshot_matrix(ruleset: RuleSet, snapshots: Sequence[dict]) -> np.ndarray:
+    """``used metrics x services`` float matrix; missing values are NaN.
+
+    Filled a metric row at a time, which avoids building a Python list per snapshot.
+    """
+    matrix = np.empty((len(ruleset.columns), len(snapshots)), dtype=np.float64)
+    for row, column in enumerate(ruleset.columns):
+        metric = METRICS[column]
+        matrix[row] = [snapshot.get(metric) for snapshot in snapshots]
+    return matrix
+
+
+def _scope_mask(ruleset: RuleSet, service_names: Sequence[str]) -> np.ndarray:
+    """``rules x services`` mask of which rule applies to which service."""
+    mask = np.ones((len(ruleset), len(service_names)), dtype=bool)
+    names = np.array(service_names, dtype=object)
+    service_tiers = None
+    for index, (members, tier) in enumerate(zip(ruleset.services, ruleset.tier)):
+        if members is not None:
+            mask[index] = np.isin(names, list(members))
+        elif tier is not None:
+            if service_tiers is None:
+                service_tiers = np.array([ruleset.tiers.get(name) for name in service_names])
+            mask[index] = service_tiers == tier
+    for indices in ruleset.overrides:
+        covered = np.zeros(len(service_names), dtype=bool)
+        for index in indices:
+            mask[index] &= ~covered
+            covered |= mask[index]
+    return mask
+
+
+def evaluate(
+    ruleset: RuleSet, snapshots: Sequence[dict], states: np.ndarray, now: float
+) -> List[List[dict]]:
+    """Evaluate every rule against every snapshot and advance ``states`` in place.
+
+    ``states`` holds one record per snapshot (see :func:`new_states`).
+    Returns one list of triggers per snapshot, each shaped like the
+    triggers ``handle_alerts`` queues (``reason``, ``severity``, ``message``).
+    """
+    if not snapshots or not len(ruleset):
+        return [[] for _ in snapshots]
+    values = _snapshot_matrix(ruleset, snapshots)[ruleset.metric]  # rules x services
+    streak = states["streak"].T
+    baseline = states["baseline"].T.astype(np.float64)
+    elapsed = np.clip(now - states["evaluated_at"], 0.0, None)
+    applies = _scope_mask(ruleset, [snapshot["service"] for snapshot in snapshots])
+
+    rise = ruleset.rise[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = values / baseline
+        ratio[~(baseline > ruleset.min_baseline[:, None])] = np.nan
+        measured = np.where(rise, ratio, values * ruleset.sign[:, None])
+        threshold = ruleset.threshold[:, None]
+        breached = np.where(ruleset.strict[:, None], measured > threshold, measured >= threshold)
+        breached &= applies
+        streak = np.where(breached, np.minimum(streak.astype(np.uint32) + 1, MAX_STREAK), 0)
+        fired = breached & (streak >= ruleset.hold[:, None])
+        critical = fired & (measured >= ruleset.critical[:, None])
+
+        # Rise baselines are exponential moving averages with time constant ``over_sec``.
+        if ruleset.rise.any():
+            alpha = 1.0 - np.exp(-elapsed[None, :] / ruleset.over_sec[:, None])
+            updated = np.where(np.isnan(baseline), values, baseline + alpha * (values - baseline))
+            states["baseline"] = np.where(rise & ~np.isnan(values), updated, baseline).T
+
+    states["streak"] = streak.T
+    states["evaluated_at"] = now
+
+    # Plain Python scalars from here on: indexing numpy arrays per trigger is slow.
+    triggers: List[List[dict]] = [[] for _ in snapshots]
+    rule_index, column_index = np.nonzero(fired)
+    for rule, column, value, is_critical in zip(
+        rule_index.tolist(), column_index.tolist(), values[fired].tolist(), critical[fired].tolist()
+    ):
+        triggers[column].append(
+            {
+                "reason": ruleset.names[rule],
+                "severity": "critical" if is_critical else ruleset.severity[rule],
+                "message": ruleset.messages[rule].format(value=value),
+            }
+        )
+    return triggers
+
+
+@dataclass
+class RuleEvaluation:
+    """Triggers for a batch of snapshots and the advanced rule state, not yet saved."""
+
+    triggers: List[List[dict]]
+    service_names: List[str]
+    states: Optional[np.ndarray] = None
+    store: Optional[RuleStateStore] = None
+
+    def save(self) -> None:
+        """Persist the new state; call once the alerts raised from ``triggers`` are committed."""
+        if self.service_names:
+            self.store.save_many(self.service_names, self.states)
+
+
+def evaluate_snapshots(snapshots: Sequence[dict], config: dict, now: float) -> RuleEvaluation:
+    """Load state and evaluate the configured rules over ``snapshots``.
+
+    The new state is only persisted by :meth:`RuleEvaluation.save`, so an
+    alert transaction that rolls back leaves streaks and baselines as they
+    were and the next evaluation fires again.
+    """
+    if not snapshots:
+        return RuleEvaluation([], [])
+    ruleset = load_rules(config)
+    store = get_store(config)
+    service_names = [snapshot["service"] for snapshot in snapshots]
+    states = store.load_many(ruleset, service_names)
+    triggers = evaluate(ruleset, snapshots, states, now)
+    return RuleEvaluation(triggers, service_names, states, store)
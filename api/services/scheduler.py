@@ -0,0 +1,129 @@
+"""Debounced scheduling of per-service KPI evaluation."""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Set
+
+from api.utils.redis_client import get_redis
+
+DIRTY_KEY = "flowguard:kpi:dirty"
+LAST_EVAL_KEY = "flowguard:kpi:last_eval"
+# Slack allowed on the cooldown: a fraction of the interval, at most MAX_JITTER_SEC.
+JITTER_TOLERANCE = 0.1
+MAX_JITTER_SEC = 1.0
+
+
+def _cooldown(min_interval: float) -> float:
+    """Seconds a service must rest between evaluations.
+
+    The beat task fires every ``min_interval`` seconds, but ticks arrive a
+    little early or late. Without some slack a service evaluated on a late
+    tick would still be cooling down on the next one, halving its rate.
+    """
+    return min_interval - min(min_interval * JITTER_TOLERANCE, MAX_JITTER_SEC)
+
+
+class DirtyServiceTracker(ABC):
+    """Tracks services with new data and hands them out at most once per interval."""
+
+    @abstractmethod
+    def mark_dirty(self, service_ids: Iterable[int]) -> None:
+        ...
+
+    @abstractmethod
+    def claim_due(self, min_interval: float) -> List[int]:
+        """Return dirty services not evaluated within ``min_interval`` seconds.
+
+        A small tolerance (see :func:`_cooldown`) absorbs beat jitter.
+        Claimed services are cleared from the dirty set; services that are
+        still cooling down stay dirty for a later tick.
+        """
+
+
+class MemoryDirtyTracker(DirtyServiceTracker):
+    """Process-local tracker for single-process deployments and development."""
+
+    def __init__(self) -> None:
+        self._dirty: Set[int] = set()
+        self._last_eval: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark_dirty(self, service_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._dirty.update(service_ids)
+
+    def claim_due(self, min_interval: float) -> List[int]:
+        now = time.time()
+        cooldown = _cooldown(min_interval)
+        with self._lock:
+            due = [sid for sid in self._dirty if now - self._last_eval.get(sid, 0.0) >= cooldown]
+            for sid in due:
+                self._dirty.discard(sid)
+                self._last_eval[sid] = now
+        return due
+
+
+class RedisDirtyTracker(DirtyServiceTracker):
+    """Tracker shared by every API and worker process through Redis."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    def mark_dirty(self, service_ids: Iterable[int]) -> None:
+        ids = list(service_ids)
+        if ids:
+            get_redis(self.url).sadd(DIRTY_KEY, *ids)
+
+    def claim_due(self, min_interval: float) -> List[int]:
+        client = get_redis(self.url)
+        pipe = client.pipeline(transaction=True)
+        pipe.smembers(DIRTY_KEY)
+        pipe.delete(DIRTY_KEY)
+        members, _ = pipe.execute()
+        claimed = sorted(int(member) for member in members)
+        if not claimed:
+            return []
+
+        now = time.time()
+        cooldown = _cooldown(min_interval)
+        last_eval = client.hmget(LAST_EVAL_KEY, claimed)
+        due = [
+            sid
+            for sid, last in zip(claimed, last_eval)
+            if last is None or now - float(last) >= cooldown
+        ]
+        due_set = set(due)
+        cooling = [sid for sid in claimed if sid not in due_set]
+
+        pipe = client.pipeline(transaction=True)
+        if cooling:
+            pipe.sadd(DIRTY_KEY, *cooling)
+        if due:
+            pipe.hset(LAST_EVAL_KEY, mapping={sid: now for sid in due})
+        pipe.execute()
+        return due
+
+
+_trackers: Dict[str, DirtyServiceTracker] = {}
+
+
+def get_tracker(config: dict) -> DirtyServiceTracker:
+    """Return the tracker for the configured ``KPI_SCHEDULER_BACKEND``."""
+    backend = config.get("KPI_SCHEDULER_BACKEND", "redis")
+    if backend not in _trackers:
+        if backend == "memory":
+            _trackers[backend] = MemoryDirtyTracker()
+        else:
+            _trackers[backend] = RedisDirtyTracker(config.get("REDIS_URL"))
+    return _trackers[backend]
+
+
+def mark_dirty(config: dict, service_ids: Iterable[int]) -> None:
+    get_tracker(config).mark_dirty(service_ids)
+
+
+def claim_due_services(config: dict) -> List[int]:
+    return get_tracker(config).claim_due(config.get("KPI_EVAL_INTERVAL_SEC", 5.0))
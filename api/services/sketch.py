@@ -0,0 +1,131 @@
+"""Mergeable quantile sketch with a relative-error guarantee (DDSketch)."""
+
+from __future__ import annotations
+
+import math
+import struct
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+
+_HEADER = struct.Struct("<dIIQ")
+_BIN = struct.Struct("<iQ")
+
+
+class QuantileSketch:
+    """Log-bucketed sketch of non-negative values.
+
+    Every value ``x > 0`` lands in bin ``ceil(log_gamma(x))`` with
+    ``gamma = (1 + alpha) / (1 - alpha)``, so any quantile is returned within
+    a relative error of ``alpha`` of the true value. Sketches with the same
+    accuracy merge by adding bin counts, which makes them safe to combine
+    across time buckets and worker processes. When more than ``max_bins``
+    bins are in use the lowest ones are collapsed, keeping memory bounded
+    while preserving the accuracy of upper quantiles.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "gamma", "_log_gamma", "bins", "zero_count")
+
+    def __init__(
+        self,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+        max_bins: int = DEFAULT_MAX_BINS,
+    ) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max(1, max_bins)
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key(self, value: float) -> Optional[int]:
+        """Bin index for ``value``; ``None`` for zero and negative values."""
+        if value <= 0:
+            return None
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def bin_value(self, index: int) -> float:
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        index = self.key(value)
+        if index is None:
+            self.zero_count += count
+        else:
+            self.add_bin(index, count)
+
+    def add_bin(self, index: int, count: int) -> None:
+        self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def update(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if not math.isclose(other.gamma, self.gamma):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """Return the ``q``-quantile (``0 <= q <= 1``), or 0.0 when empty."""
+        total = self.count
+        if not total:
+            return 0.0
+        rank = min(max(q, 0.0), 1.0) * (total - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self.bin_value(index)
+        return self.bin_value(max(self.bins))
+
+    def quantiles(self, qs: Iterable[float]) -> Tuple[float, ...]:
+        return tuple(self.quantile(q) for q in qs)
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact little-endian byte string."""
+        header = _HEADER.pack(
+            self.relative_accuracy, self.max_bins, len(self.bins), self.zero_count
+        )
+        body = b"".join(_BIN.pack(index, count) for index, count in sorted(self.bins.items()))
+        return header + body
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "QuantileSketch":
+        accuracy, max_bins, size, zero_count = _HEADER.unpack_from(payload)
+        sketch = cls(accuracy, max_bins)
+        sketch.zero_count = zero_count
+        for offset in range(_HEADER.size, _HEADER.size + size * _BIN.size, _BIN.size):
+            index, count = _BIN.unpack_from(payload, offset)
+            sketch.bins[index] = count
+        return sketch
+
+    def copy(self) -> "QuantileSketch":
+        clone = QuantileSketch(self.relative_accuracy, self.max_bins)
+        clone.bins = dict(self.bins)
+        clone.zero_count = self.zero_count
+        return clone
+
+    def _collapse(self) -> None:
+        ordered = sorted(self.bins)
+        excess = ordered[: len(ordered) - self.max_bins + 1]
+        target = ordered[len(excess)]
+        self.bins[target] += sum(self.bins.pop(index) for index in excess)
@@ -0,0 +1,132 @@
+"""Bulk write helpers for high-volume ingestion paths."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api.models import LogEvent, MetricPoint, MetricRollup
+from api.schemas import LogRecord
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+_METRIC_VALUE_COLUMNS = ("tps", "error_rate", "p95_latency_ms")
+_ROLLUP_VALUE_COLUMNS = (
+    "avg_error_rate",
+    "max_error_rate",
+    "max_p95_latency_ms",
+    "avg_tps",
+    "sample_count",
+)
+# Most rows per upsert statement.
+UPSERT_CHUNK_SIZE = 500
+# Bound parameters allowed per statement: SQLite before 3.32 accepts 999,
+# Postgres 65535.
+_MAX_PARAMETERS = {"sqlite": 999, "postgresql": 65535}
+
+
+def log_rows(records: Sequence[LogRecord], service_ids: dict) -> List[dict]:
+    """Build plain parameter rows for ``log_events`` from validated records."""
+    return [
+        {
+            "service_id": service_ids[record.service],
+            "ts": record.ts,
+            "level": record.level,
+            "message": record.message,
+            "latency_ms": record.latency_ms,
+            "status_code": record.status_code,
+            "meta": record.meta,
+        }
+        for record in records
+    ]
+
+
+def insert_log_events(session, rows: Sequence[dict]) -> int:
+    """Insert log rows with a single executemany INSERT and return the highest new id.
+
+    Goes through Core rather than the ORM unit of work, so no ``LogEvent``
+    instances or identity-map entries are created. SQLAlchemy batches the
+    parameter sets into multi-row ``INSERT ... VALUES ... RETURNING``
+    statements on both SQLite and psycopg2 ("insertmanyvalues"). Returns 0
+    when ``rows`` is empty.
+    """
+    if not rows:
+        return 0
+    result = session.execute(insert(LogEvent.__table__).returning(LogEvent.id), list(rows))
+    return max(result.scalars())
+
+
+def metric_row(
+    service_id: int, ts: datetime, tps: float, error_rate: float, p95_latency_ms: int
+) -> dict:
+    """Build a ``metric_points`` parameter row with the column precision applied."""
+    return {
+        "service_id": service_id,
+        "ts": ts,
+        "tps": Decimal(str(round(float(tps), 6))),
+        "error_rate": Decimal(str(round(float(error_rate), 6))),
+        "p95_latency_ms": int(p95_latency_ms),
+    }
+
+
+def upsert_metric_points(session, rows: Sequence[dict]) -> int:
+    """Insert or update metric rows keyed on ``(service_id, ts)`` in one statement.
+
+    Uses ``INSERT ... ON CONFLICT (service_id, ts) DO UPDATE`` on SQLite and
+    Postgres, chunked by ``UPSERT_CHUNK_SIZE`` rows or fewer, so a statement
+    stays under the dialect's bound parameter limit. Rows repeating a key
+    within the batch collapse to the last one, since Postgres refuses to
+    touch the same row twice in a single upsert. Other dialects fall back to
+    ``session.merge`` per row.
+    """
+    return _upsert(session, MetricPoint, ("service_id", "ts"), _METRIC_VALUE_COLUMNS, rows)
+
+
+def upsert_metric_rollups(session, rows: Sequence[dict]) -> int:
+    """Insert or update rollup rows keyed on ``(service_id, resolution_sec, bucket_ts)``."""
+    return _upsert(
+        session,
+        MetricRollup,
+        ("service_id", "resolution_sec", "bucket_ts"),
+        _ROLLUP_VALUE_COLUMNS,
+        rows,
+    )
+
+
+def _upsert(
+    session, model, keys: Tuple[str, ...], value_columns: Tuple[str, ...], rows: Sequence[dict]
+) -> int:
+    if not rows:
+        return 0
+
+    unique: Dict[tuple, dict] = {}
+    for row in rows:
+        unique[tuple(row[key] for key in keys)] = row
+    values = list(unique.values())
+
+    dialect = session.get_bind().dialect.name
+    dialect_insert = _UPSERT_DIALECTS.get(dialect)
+    if dialect_insert is None:
+        for row in values:
+            existing = (
+                session.query(model)
+                .filter(*(getattr(model, key) == row[key] for key in keys))
+                .one_or_none()
+            )
+            session.merge(model(id=existing.id if existing else None, **row))
+        session.flush()
+        return len(values)
+
+    chunk_size = min(UPSERT_CHUNK_SIZE, _MAX_PARAMETERS[dialect] // len(values[0]))
+    for offset in range(0, len(values), chunk_size):
+        chunk = values[offset : offset + chunk_size]
+        stmt = dialect_insert(model.__table__).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: stmt.excluded[column] for column in value_columns},
+        )
+        session.execute(stmt)
+    return len(values)
@@ -0,0 +1,63 @@
+"""Constant-time online detectors that screen snapshots before IsolationForest.
+
+Per-feature state is a small float64 array with one row per statistic:
+
+* ``EWMA_MEAN`` / ``EWMA_VAR`` – exponentially weighted control chart.
+* ``MEAN`` / ``M2`` – Welford running mean and sum of squared deviations.
+
+A third, robust detector scores against the median and MAD of the
+detector's bounded ring window. All functions broadcast over leading
+dimensions, so the same code scores one service or a stacked batch.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+EWMA_MEAN, EWMA_VAR, MEAN, M2 = range(4)
+STAT_ROWS = 4
+# Scales MAD to a standard deviation estimate for normally distributed data.
+_MAD_SCALE = 1.4826
+# Spread floors so perfectly flat series still score a change instead of dividing by zero.
+_ABS_FLOOR = 1e-6
+_REL_FLOOR = 1e-6
+
+
+def new_stats(features: int) -> np.ndarray:
+    return np.zeros((STAT_ROWS, features), dtype=np.float64)
+
+
+def _z(vectors: np.ndarray, center: np.ndarray, spread: np.ndarray) -> np.ndarray:
+    floor = np.maximum(_ABS_FLOOR, _REL_FLOOR * np.abs(center))
+    return np.abs(vectors - center) / np.maximum(spread, floor)
+
+
+def update(stats: np.ndarray, counts, vectors: np.ndarray, alpha: float) -> None:
+    """Fold ``vectors`` into ``stats`` in place; ``counts`` are points seen before them."""
+    counts = np.asarray(counts, dtype=np.float64)[..., None]
+    first = counts == 0
+    diff = vectors - stats[..., EWMA_MEAN, :]
+    step = alpha * diff
+    ewma_var = (1 - alpha) * (stats[..., EWMA_VAR, :] + diff * step)
+    stats[..., EWMA_VAR, :] = np.where(first, 0.0, ewma_var)
+    stats[..., EWMA_MEAN, :] = np.where(first, vectors, stats[..., EWMA_MEAN, :] + step)
+
+    delta = vectors - stats[..., MEAN, :]
+    stats[..., MEAN, :] += delta / (counts + 1)
+    stats[..., M2, :] += delta * (vectors - stats[..., MEAN, :])
+
+
+def scores(stats: np.ndarray, counts, windows: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Largest absolute z-score over every detector and feature.
+
+    ``windows`` holds the recent vectors (``NaN`` rows are ignored) and
+    ``counts`` the number of points already folded into ``stats``.
+    """
+    counts = np.asarray(counts, dtype=np.float64)[..., None]
+    ewma = _z(vectors, stats[..., EWMA_MEAN, :], np.sqrt(stats[..., EWMA_VAR, :]))
+    variance = stats[..., M2, :] / np.maximum(counts, 1)
+    welford = _z(vectors, stats[..., MEAN, :], np.sqrt(variance))
+    median = np.nanmedian(windows, axis=-2)
+    mad = np.nanmedian(np.abs(windows - median[..., None, :]), axis=-2)
+    robust = _z(vectors, median, _MAD_SCALE * mad)
+    return np.max(np.maximum(np.maximum(ewma, welford), robust), axis=-1)
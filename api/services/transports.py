@@ -0,0 +1,255 @@
+"""Reusable, connection-pooled delivery transports for alert channels."""
+
+from __future__ import annotations
+
+import http.client
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+# Errors meaning a pooled keep-alive connection was closed by the peer while idle.
+_STALE_HTTP_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class HTTPTransport:
+    """Keep-alive HTTP(S) connection pool for webhook delivery.
+
+    At most ``max_connections`` requests are in flight at once; idle
+    connections are kept per ``(scheme, host, port)`` and reused, so a storm
+    of Slack alerts pays for one TLS handshake per pooled connection
+    instead of one per alert. A request that fails because a pooled
+    connection went stale is retried once on a fresh connection.
+    """
+
+    def __init__(self, max_connections: int = 4, timeout: float = 5.0) -> None:
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_connections))
+        self._idle: Dict[Tuple[str, str, int], Deque[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def post_json(self, url: str, body: bytes) -> int:
+        """POST ``body`` as JSON and return the response status."""
+        parts = urlsplit(url)
+        scheme = parts.scheme or "https"
+        origin = (scheme, parts.hostname or "", parts.port or (443 if scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+        with self._slots:
+            conn, reused = self._checkout(origin)
+            try:
+                return self._send(origin, conn, path, body, headers)
+            except _STALE_HTTP_ERRORS:
+                if not reused:
+                    raise
+            # The server closed the idle connection; retry once on a fresh one.
+            return self._send(origin, self._connect(origin), path, body, headers)
+
+    def _send(
+        self,
+        origin: Tuple[str, str, int],
+        conn: http.client.HTTPConnection,
+        path: str,
+        body: bytes,
+        headers: Dict[str, str],
+    ) -> int:
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except Exception:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(origin, conn)
+        return response.status
+
+    def _checkout(self, origin: Tuple[str, str, int]) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+        return self._connect(origin), False
+
+    def _connect(self, origin: Tuple[str, str, int]) -> http.client.HTTPConnection:
+        scheme, host, port = origin
+        factory = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return factory(host, port, timeout=self.timeout)
+
+    def _checkin(self, origin: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(origin, deque()).append(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for pool in idle.values():
+            for conn in pool:
+                conn.close()
+
+
+class SMTPTransport:
+    """Pool of persistent, authenticated SMTP sessions.
+
+    Up to ``max_sessions`` sessions are open at once. A session is reused
+    for later messages until it has been idle for ``idle_timeout`` seconds,
+    after which it is closed and the next message reconnects. A message
+    that fails because the server dropped the session is resent once on a
+    new session; one that timed out is not, as the server may have taken it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str],
+        password: Optional[str],
+        *,
+        starttls: bool = True,
+        max_sessions: int = 2,
+        idle_timeout: float = 60.0,
+        timeout: float = 10.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_sessions))
+        self._idle: Deque[Tuple[smtplib.SMTP, float]] = deque()
+        self._lock = threading.Lock()
+
+    def send(self, message: EmailMessage) -> None:
+        with self._slots:
+            smtp, reused = self._checkout()
+            try:
+                self._send(smtp, message)
+                return
+            except smtplib.SMTPServerDisconnected as exc:
+                # smtplib reports a read timeout as a disconnect too; the server
+                # may still accept that message, so it is never resent.
+                if not reused or isinstance(exc.__context__, TimeoutError):
+                    raise
+            # The server dropped the idle session; resend once on a new one.
+            self._send(self._connect(), message)
+
+    def _send(self, smtp: smtplib.SMTP, message: EmailMessage) -> None:
+        try:
+            smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            smtp.close()
+            raise
+        except Exception:
+            self._discard(smtp)
+            raise
+        with self._lock:
+            self._idle.append((smtp, time.monotonic()))
+
+    def _checkout(self) -> Tuple[smtplib.SMTP, bool]:
+        now = time.monotonic()
+        expired = []
+        session = None
+        with self._lock:
+            while self._idle:
+                smtp, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    session = smtp
+                    break
+                expired.append(smtp)
+        for smtp in expired:
+            self._discard(smtp)
+        if session is not None:
+            return session, True
+        return self._connect(), False
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password or "")
+        except Exception:
+            self._discard(smtp)
+            raise
+        logger.debug("Opened SMTP session", host=self.host, port=self.port)
+        return smtp
+
+    def _discard(self, smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:  # pragma: no cover - already disconnected
+            smtp.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for smtp, _ in idle:
+            self._discard(smtp)
+
+
+_http_transports: Dict[Tuple, HTTPTransport] = {}
+_smtp_transports: Dict[Tuple, SMTPTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_http_transport(config: dict) -> HTTPTransport:
+    """Return the process-wide webhook transport for ``config``."""
+    key = (config.get("ALERT_HTTP_MAX_CONNECTIONS", 4), config.get("ALERT_HTTP_TIMEOUT_SEC", 5.0))
+    with _transports_lock:
+        if key not in _http_transports:
+            _http_transports[key] = HTTPTransport(max_connections=key[0], timeout=key[1])
+        return _http_transports[key]
+
+
+def get_smtp_transport(config: dict) -> SMTPTransport:
+    """Return the process-wide SMTP transport for the configured server and account."""
+    key = (
+        config["SMTP_HOST"],
+        int(config.get("SMTP_PORT", 587)),
+        config.get("SMTP_USER"),
+        config.get("SMTP_PASS"),
+        config.get("SMTP_STARTTLS", True),
+        config.get("SMTP_MAX_SESSIONS", 2),
+        config.get("SMTP_IDLE_TIMEOUT_SEC", 60.0),
+    )
+    with _transports_lock:
+        if key not in _smtp_transports:
+            host, port, user, password, starttls, max_sessions, idle_timeout = key
+            _smtp_transports[key] = SMTPTransport(
+                host,
+                port,
+                user,
+                password,
+                starttls=starttls,
+                max_sessions=max_sessions,
+                idle_timeout=idle_timeout,
+            )
+        return _smtp_transports[key]
+
+
+def close_all() -> None:
+    """Close every pooled connection, e.g. when a worker shuts down."""
+    with _transports_lock:
+        transports = [*_http_transports.values(), *_smtp_transports.values()]
+        _http_transports.clear()
+        _smtp_transports.clear()
+    for transport in transports:
+        transport.close()
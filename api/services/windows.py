@@ -0,0 +1,429 @@
+"""Rolling per-service KPI aggregates kept in fixed time buckets.
+
+A cold window is rebuilt from ``log_events`` while committed batches are
+folded into warm ones, so the two must not count a batch twice or miss
+it. A rebuild holds a per-service lock and records the highest log id it
+read as the window's high-water mark. :func:`record_logs` skips windows
+whose high-water mark already covers the batch. For a cold service it
+waits for a running rebuild to finish and then checks again.
+
+The high-water mark relies on every batch with lower ids having committed
+before the rebuild reads. SQLite serializes writers, so that holds there.
+On Postgres concurrent inserts draw sequence ids that can commit out of
+order, so ingestion takes a shared advisory lock per service before
+inserting (:func:`hold_rebuilds`) and a rebuild takes the exclusive one
+before reading: it waits for in-flight batches to commit, and batches
+started later draw ids above its high-water mark.
+"""
+from __future__ import annotations
+
+import contextlib
+import math
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import ContextManager, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select
+
+from api.models import LogEvent
+from api.schemas import LogRecord
+from api.services.sketch import QuantileSketch
+from api.utils.redis_client import get_redis
+
+ERROR_LEVELS = {"ERROR", "CRITICAL"}
+# Fixed so that bins persisted by any process stay mergeable.
+LATENCY_ACCURACY = 0.01
+KEY_PREFIX = "flowguard:kpi:win"
+# Expiry of a rebuild lock, in case its holder dies mid-rebuild.
+REBUILD_LOCK_SEC = 60
+# First key of the Postgres advisory locks between log inserts and rebuilds.
+ADVISORY_LOCK_NAMESPACE = 0x4B5049
+
+
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _latency_sketch() -> QuantileSketch:
+    return QuantileSketch(LATENCY_ACCURACY)
+
+
+@dataclass
+class WindowStats:
+    """Log count, error count and latency sketch for one or more buckets."""
+
+    log_count: int = 0
+    error_count: int = 0
+    latency: QuantileSketch = field(default_factory=_latency_sketch)
+
+    def add_log(self, level: str, latency_ms: Optional[int]) -> None:
+        self.log_count += 1
+        if level in ERROR_LEVELS:
+            self.error_count += 1
+        if latency_ms is not None:
+            self.latency.add(latency_ms)
+
+    def merge(self, other: "WindowStats") -> None:
+        self.log_count += other.log_count
+        self.error_count += other.error_count
+        self.latency.merge(other.latency)
+
+    def percentile(self, percentile: float) -> int:
+        return int(round(self.latency.quantile(percentile / 100.0)))
+
+
+@dataclass
+class WindowSpec:
+    bucket_seconds: int
+    slots: int
+
+    @classmethod
+    def from_config(cls, config: dict) -> "WindowSpec":
+        bucket_seconds = max(1, int(config.get("KPI_BUCKET_SEC", 10)))
+        lookback_seconds = int(config.get("ALERT_LOOKBACK_MIN", 10)) * 60
+        return cls(bucket_seconds, max(1, math.ceil(lookback_seconds / bucket_seconds)))
+
+    @property
+    def seconds(self) -> int:
+        return self.bucket_seconds * self.slots
+
+    def bucket(self, ts: datetime) -> int:
+        return int(_epoch(ts) // self.bucket_seconds)
+
+    def buckets_ending(self, end: datetime) -> range:
+        last = self.bucket(end)
+        return range(last - self.slots + 1, last + 1)
+
+
+class WindowStore(ABC):
+    """Storage for bucketed aggregates; services are rebuilt from the DB when cold."""
+
+    def __init__(self, spec: WindowSpec) -> None:
+        self.spec = spec
+
+    @abstractmethod
+    def warm(self, service_ids: Iterable[int]) -> Dict[int, int]:
+        """Return ``{service_id: high_water}`` for the services whose window is populated."""
+
+    @abstractmethod
+    def add(self, deltas: Dict[Tuple[int, int], WindowStats], last_id: int) -> Set[int]:
+        """Add per ``(service_id, bucket)`` deltas of the batch ending at log ``last_id``.
+
+        Services whose high-water mark is at or above ``last_id`` already
+        count the batch and are skipped. Returns the services that were cold.
+        """
+
+    @abstractmethod
+    def load_many(self, service_ids: Sequence[int], buckets: range) -> Dict[int, WindowStats]:
+        ...
+
+    @abstractmethod
+    def replace(self, service_id: int, buckets: Dict[int, WindowStats], high_water: int) -> None:
+        """Overwrite a service's window with rebuilt buckets and mark it warm."""
+
+    @abstractmethod
+    def rebuilding(self, service_ids: Sequence[int]) -> ContextManager:
+        """Lock ``service_ids`` for a rebuild; :meth:`add` for cold services waits on it."""
+
+
+class MemoryWindowStore(WindowStore):
+    """Process-local ring of bucket slots per service."""
+
+    def __init__(self, spec: WindowSpec) -> None:
+        super().__init__(spec)
+        self._rings: Dict[int, Tuple[List[int], List[WindowStats]]] = {}
+        self._high_water: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def warm(self, service_ids: Iterable[int]) -> Dict[int, int]:
+        with self._lock:
+            return {
+                service_id: self._high_water[service_id]
+                for service_id in service_ids
+                if service_id in self._rings
+            }
+
+    def add(self, deltas: Dict[Tuple[int, int], WindowStats], last_id: int) -> Set[int]:
+        cold: Set[int] = set()
+        with self._lock:
+            for (service_id, bucket), delta in deltas.items():
+                ring = self._rings.get(service_id)
+                if ring is None:
+                    cold.add(service_id)
+                elif self._high_water[service_id] < last_id:
+                    self._slot(ring, bucket).merge(delta)
+        return cold
+
+    def load_many(self, service_ids: Sequence[int], buckets: range) -> Dict[int, WindowStats]:
+        loaded: Dict[int, WindowStats] = {}
+        with self._lock:
+            for service_id in service_ids:
+                stats = loaded[service_id] = WindowStats()
+                slot_buckets, slot_stats = self._rings.get(service_id, ([], []))
+                for bucket, slot in zip(slot_buckets, slot_stats):
+                    if bucket in buckets:
+                        stats.merge(slot)
+        return loaded
+
+    def replace(self, service_id: int, buckets: Dict[int, WindowStats], high_water: int) -> None:
+        ring = ([-1] * self.spec.slots, [WindowStats() for _ in range(self.spec.slots)])
+        for bucket, stats in buckets.items():
+            self._slot(ring, bucket).merge(stats)
+        with self._lock:
+            self._rings[service_id] = ring
+            self._high_water[service_id] = high_water
+
+    def rebuilding(self, service_ids: Sequence[int]) -> ContextManager:
+        # One process, so a single lock is enough for every service.
+        return self._rebuild_lock
+
+    def _slot(self, ring: Tuple[List[int], List[WindowStats]], bucket: int) -> WindowStats:
+        slot_buckets, slot_stats = ring
+        slot = bucket % self.spec.slots
+        if slot_buckets[slot] != bucket:
+            # The slot still holds an expired bucket; recycle it.
+            slot_buckets[slot] = bucket
+            slot_stats[slot] = WindowStats()
+        return slot_stats[slot]
+
+
+class RedisWindowStore(WindowStore):
+    """Buckets stored as Redis hashes so every worker process sees the same window.
+
+    Each bucket is a hash with ``n`` (logs), ``e`` (errors), ``z`` (zero
+    latencies) and ``l:<bin>`` latency sketch bin fields, expiring once it
+    falls out of the window.
+    """
+
+    def __init__(self, spec: WindowSpec, url: str) -> None:
+        super().__init__(spec)
+        self.url = url
+        self.ttl = spec.seconds + spec.bucket_seconds
+
+    def _key(self, service_id: int, bucket: int) -> str:
+        return f"{KEY_PREFIX}:{service_id}:{bucket}"
+
+    def _warm_key(self, service_id: int) -> str:
+        # Holds the window's high-water log id.
+        return f"{KEY_PREFIX}:{service_id}:warm"
+
+    def _lock_key(self, service_id: int) -> str:
+        return f"{KEY_PREFIX}:{service_id}:lock"
+
+    def warm(self, service_ids: Iterable[int]) -> Dict[int, int]:
+        ids = list(service_ids)
+        if not ids:
+            return {}
+        marks = get_redis(self.url).mget([self._warm_key(service_id) for service_id in ids])
+        return {service_id: int(mark) for service_id, mark in zip(ids, marks) if mark is not None}
+
+    def add(self, deltas: Dict[Tuple[int, int], WindowStats], last_id: int) -> Set[int]:
+        if not deltas:
+            return set()
+        services = {service_id for service_id, _ in deltas}
+        warm = self.warm(services)
+        pipe = get_redis(self.url).pipeline(transaction=False)
+        for (service_id, bucket), delta in deltas.items():
+            if warm.get(service_id, last_id) < last_id:
+                self._write(pipe, service_id, bucket, delta)
+        for service_id in warm:
+            pipe.expire(self._warm_key(service_id), self.ttl)
+        pipe.execute()
+        return services - set(warm)
+
+    def load_many(self, service_ids: Sequence[int], buckets: range) -> Dict[int, WindowStats]:
+        pipe = get_redis(self.url).pipeline(transaction=False)
+        for service_id in service_ids:
+            for bucket in buckets:
+                pipe.hgetall(self._key(service_id, bucket))
+        results = pipe.execute()
+        loaded: Dict[int, WindowStats] = {}
+        for offset, service_id in enumerate(service_ids):
+            chunk = results[offset * len(buckets) : (offset + 1) * len(buckets)]
+            loaded[service_id] = self._decode(chunk)
+        return loaded
+
+    def _decode(self, hashes: List[dict]) -> WindowStats:
+        stats = WindowStats()
+        for raw in hashes:
+            for name, value in raw.items():
+                name = name.decode() if isinstance(name, bytes) else name
+                count = int(value)
+                if name == "n":
+                    stats.log_count += count
+                elif name == "e":
+                    stats.error_count += count
+                elif name == "z":
+                    stats.latency.zero_count += count
+                else:
+                    stats.latency.add_bin(int(name[2:]), count)
+        return stats
+
+    def replace(self, service_id: int, buckets: Dict[int, WindowStats], high_water: int) -> None:
+        client = get_redis(self.url)
+        pipe = client.pipeline(transaction=True)
+        last = max(buckets) if buckets else 0
+        for bucket in range(last - self.spec.slots + 1, last + 1):
+            pipe.delete(self._key(service_id, bucket))
+        for bucket, stats in buckets.items():
+            self._write(pipe, service_id, bucket, stats)
+        pipe.set(self._warm_key(service_id), high_water, ex=self.ttl)
+        pipe.execute()
+
+    @contextlib.contextmanager
+    def rebuilding(self, service_ids: Sequence[int]):
+        client = get_redis(self.url)
+        with contextlib.ExitStack() as stack:
+            # Sorted, so two rebuilds over overlapping services cannot deadlock.
+            for service_id in sorted(set(service_ids)):
+                lock = client.lock(self._lock_key(service_id), timeout=REBUILD_LOCK_SEC)
+                stack.enter_context(lock)
+            yield
+
+    def _write(self, pipe, service_id: int, bucket: int, stats: WindowStats) -> None:
+        key = self._key(service_id, bucket)
+        pipe.hincrby(key, "n", stats.log_count)
+        if stats.error_count:
+            pipe.hincrby(key, "e", stats.error_count)
+        if stats.latency.zero_count:
+            pipe.hincrby(key, "z", stats.latency.zero_count)
+        for index, count in stats.latency.bins.items():
+            pipe.hincrby(key, f"l:{index}", count)
+        pipe.expire(key, self.ttl)
+
+
+_stores: Dict[Tuple[str, int, int], WindowStore] = {}
+
+
+def get_store(config: dict) -> WindowStore:
+    """Return the window store for the configured ``KPI_WINDOW_BACKEND``."""
+    spec = WindowSpec.from_config(config)
+    backend = config.get("KPI_WINDOW_BACKEND", "redis")
+    key = (backend, spec.bucket_seconds, spec.slots)
+    if key not in _stores:
+        if backend == "memory":
+            _stores[key] = MemoryWindowStore(spec)
+        else:
+            _stores[key] = RedisWindowStore(spec, config.get("REDIS_URL"))
+    return _stores[key]
+
+
+def group_logs(
+    records: Sequence[LogRecord], service_ids: Dict[str, int], spec: WindowSpec
+) -> Dict[Tuple[int, int], WindowStats]:
+    """Aggregate a log batch into per ``(service_id, bucket)`` deltas."""
+    deltas: Dict[Tuple[int, int], WindowStats] = {}
+    for record in records:
+        key = (service_ids[record.service], spec.bucket(record.ts))
+        stats = deltas.get(key)
+        if stats is None:
+            stats = deltas[key] = WindowStats()
+        stats.add_log(record.level, record.latency_ms)
+    return deltas
+
+
+def record_logs(
+    config: dict,
+    records: Sequence[LogRecord],
+    service_ids: Dict[str, int],
+    now: datetime,
+    last_id: int,
+) -> None:
+    """Fold a committed log batch, whose highest log id is ``last_id``, into the rolling windows."""
+    store = get_store(config)
+    spec = store.spec
+    live = spec.buckets_ending(now)
+    deltas: Dict[Tuple[int, int], WindowStats] = {}
+    for (service_id, bucket), stats in group_logs(records, service_ids, spec).items():
+        if bucket < live.start:
+            continue
+        # Clock-skewed future logs count towards the current bucket.
+        key = (service_id, min(bucket, live[-1]))
+        deltas.setdefault(key, WindowStats()).merge(stats)
+    try:
+        cold = store.add(deltas, last_id)
+        if cold:
+            # A rebuild may be reading log_events right now, possibly before this
+            # batch committed; once it is done the high-water mark tells.
+            with store.rebuilding(sorted(cold)):
+                store.add({key: delta for key, delta in deltas.items() if key[0] in cold}, last_id)
+    except Exception as exc:  # pragma: no cover - store IO
+        logger.warning("Failed to update KPI windows", error=str(exc))
+
+
+def _is_postgres(session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def hold_rebuilds(session, service_ids: Iterable[int]) -> None:
+    """Keep rebuilds of ``service_ids`` from reading until this transaction ends.
+
+    Call before inserting a log batch, in the same transaction. A no-op
+    outside Postgres.
+    """
+    if not _is_postgres(session):
+        return
+    for service_id in sorted(set(service_ids)):
+        session.execute(
+            select(func.pg_advisory_xact_lock_shared(ADVISORY_LOCK_NAMESPACE, service_id))
+        )
+
+
+def _exclude_inserts(session, service_ids: Sequence[int]) -> None:
+    """Wait for in-flight log batches of ``service_ids`` to commit and hold off new ones.
+
+    The lock is released when the rebuild's transaction ends.
+    """
+    if not _is_postgres(session):
+        return
+    for service_id in sorted(set(service_ids)):
+        session.execute(select(func.pg_advisory_xact_lock(ADVISORY_LOCK_NAMESPACE, service_id)))
+
+
+def rebuild(session, service_ids: Sequence[int], store: WindowStore, end: datetime) -> None:
+    """Reload the windows of ``service_ids`` from ``log_events`` in one query."""
+    spec = store.spec
+    buckets = spec.buckets_ending(end)
+    start = datetime.fromtimestamp(buckets.start * spec.bucket_seconds, tz=timezone.utc)
+    with store.rebuilding(service_ids):
+        _exclude_inserts(session, service_ids)
+        high_water = session.scalar(select(func.max(LogEvent.id))) or 0
+        rows: Iterable = (
+            session.query(LogEvent.service_id, LogEvent.ts, LogEvent.level, LogEvent.latency_ms)
+            .filter(
+                LogEvent.service_id.in_(service_ids),
+                LogEvent.ts >= start,
+                LogEvent.ts <= end,
+                LogEvent.id <= high_water,
+            )
+            .yield_per(5000)
+        )
+        rebuilt: Dict[int, Dict[int, WindowStats]] = {
+            service_id: {buckets[-1]: WindowStats()} for service_id in service_ids
+        }
+        for service_id, ts, level, latency_ms in rows:
+            bucket = spec.bucket(ts)
+            stats = rebuilt[service_id].get(bucket)
+            if stats is None:
+                stats = rebuilt[service_id][bucket] = WindowStats()
+            stats.add_log(level, latency_ms)
+        for service_id, service_buckets in rebuilt.items():
+            store.replace(service_id, service_buckets, high_water)
+
+
+def load_windows(
+    session, service_ids: Sequence[int], config: dict, end: datetime
+) -> Tuple[Dict[int, WindowStats], int]:
+    """Return ``(stats_by_service, window_seconds)``, rebuilding cold services first."""
+    store = get_store(config)
+    warm = store.warm(service_ids)
+    cold = [service_id for service_id in service_ids if service_id not in warm]
+    if cold:
+        rebuild(session, cold, store, end)
+    return store.load_many(service_ids, store.spec.buckets_ending(end)), store.spec.seconds
@@ -0,0 +1,30 @@
+"""Shared pytest setup for the API tests.
+
+Importing ``api`` initialises the database from ``DB_URL``, so tests point
+it at an in-memory SQLite database before any test module is imported.
+"""
+
+import os
+
+os.environ.setdefault("DB_URL", "sqlite://")
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from api.db import SessionLocal, _enable_sqlite_savepoints  # noqa: E402
+from api.models import Base  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Bind ``SessionLocal`` (and so ``session_scope``) to a fresh SQLite file."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'flowguard.db'}")
+    _enable_sqlite_savepoints(engine)
+    Base.metadata.create_all(engine)
+    previous = SessionLocal.session_factory.kw.get("bind")
+    SessionLocal.remove()
+    SessionLocal.configure(bind=engine)
+    yield engine
+    SessionLocal.remove()
+    SessionLocal.configure(bind=previous)
+    engine.dispose()
@@ -0,0 +1,90 @@
+"""Ingest buffers publishing to a fake Celery task at shutdown."""
+
+from __future__ import annotations
+
+import runpy
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from api.services.batching import IngestBuffer
+
+GUNICORN_CONF = Path(__file__).resolve().parents[1] / "gunicorn.conf.py"
+
+
+class FakeTask:
+    """Records published task ids; fails while ``failing`` is set."""
+
+    def __init__(self) -> None:
+        self.published = []
+        self.failing = False
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def apply_async(self, args, task_id):
+        self.entered.set()
+        self.release.wait()
+        if self.failing:
+            raise ConnectionError("broker unavailable")
+        self.published.append(task_id)
+
+
+def _buffer(task: FakeTask, **options) -> IngestBuffer:
+    settings = {
+        "max_records": 100,
+        "max_bytes": 1_000_000,
+        "max_delay_ms": 10,
+        "publish_backoff_ms": 10,
+    }
+    settings.update(options)
+    return IngestBuffer(task, name="logs", **settings)
+
+
+def test_close_drains_a_batch_whose_send_fails_during_shutdown():
+    task = FakeTask()
+    task.failing = True
+    task.release.clear()
+    buffer = _buffer(task)
+    task_id = buffer.submit([{"message": "m"}])["task_id"]
+    # The flusher is now stuck publishing the batch.
+    assert task.entered.wait(1.0)
+
+    closing = threading.Thread(target=buffer.close)
+    closing.start()
+    time.sleep(0.1)
+    # The send fails only after close() started; the batch must still go out.
+    task.failing = False
+    task.release.set()
+    closing.join(2.0)
+
+    assert not closing.is_alive()
+    assert task_id in task.published
+    assert buffer.stats()["dropped"] == 0
+
+
+def test_close_gives_up_after_its_timeout_while_the_broker_is_down():
+    task = FakeTask()
+    task.failing = True
+    buffer = _buffer(task, max_delay_ms=0, publish_backoff_ms=1000, close_timeout_ms=200)
+    buffer.submit([{"message": "m"}])
+
+    started = time.monotonic()
+    buffer.close()
+
+    assert time.monotonic() - started < 1.0
+    assert task.published == []
+    assert buffer.stats() == {"published": 0, "retried": 1, "dropped": 1, "pending_retries": 0}
+
+
+def test_gunicorn_config_does_not_import_the_app():
+    code = (
+        f"import runpy, sys; runpy.run_path({str(GUNICORN_CONF)!r}); "
+        "print(any(name.startswith('api') for name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+    assert result.stdout.strip() == "False", result.stderr
+    assert callable(runpy.run_path(str(GUNICORN_CONF))["worker_exit"])
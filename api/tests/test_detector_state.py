@@ -0,0 +1,163 @@
+"""RedisDetectorStore against an in-process fake Redis."""
+
+from __future__ import annotations
+
+import pickle
+import threading
+
+import fakeredis
+import numpy as np
+import pytest
+
+from api.services import anomaly, detector_state
+from api.services.detector_state import WINDOW_SIZE, DetectorState, RedisDetectorStore
+
+TTL = 600
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(detector_state, "get_redis", lambda url: client)
+    return client
+
+
+def _store() -> RedisDetectorStore:
+    return RedisDetectorStore("redis://fake", TTL)
+
+
+def _fitted(state: DetectorState, seed: int) -> DetectorState:
+    rng = np.random.default_rng(seed)
+    for vector in rng.normal([0.01, 120.0, 5.0], [0.002, 10.0, 1.0], (WINDOW_SIZE, 3)):
+        state.append(vector)
+    anomaly._fit(state, state.values())
+    return state
+
+
+def _probe() -> np.ndarray:
+    return np.array([[0.01, 120.0, 5.0], [0.5, 900.0, 0.1]])
+
+
+def test_model_round_trips_through_pickle(client):
+    state = _fitted(DetectorState(), seed=1)
+    _store().save("checkout", state, model_changed=True)
+
+    loaded = _store().load("checkout")
+
+    assert loaded.model_version == state.model_version == 1
+    assert loaded.count == state.count
+    assert loaded.fit_count == state.fit_count
+    np.testing.assert_array_equal(loaded.window, state.window)
+    np.testing.assert_allclose(loaded.fit_mean, state.fit_mean)
+    np.testing.assert_allclose(loaded.fit_std, state.fit_std)
+    np.testing.assert_array_equal(
+        loaded.model.score_samples(_probe()), state.model.score_samples(_probe())
+    )
+
+
+def test_unknown_service_loads_fresh_state(client):
+    state = _store().load("missing")
+
+    assert state.count == 0
+    assert state.model is None
+    assert state.model_version == 0
+
+
+def test_keys_expire_after_ttl(client):
+    store = _store()
+    store.save("checkout", _fitted(DetectorState(), seed=1), model_changed=True)
+
+    for kind in ("window", "fit", "model"):
+        assert 0 < client.ttl(f"{detector_state.KEY_PREFIX}:checkout:{kind}") <= TTL
+
+    client.expire(f"{detector_state.KEY_PREFIX}:checkout:model", 5)
+    store.save("checkout", store.load("checkout"), model_changed=False)
+    # A window-only save keeps the model alive for another full TTL.
+    assert client.ttl(f"{detector_state.KEY_PREFIX}:checkout:model") > 5
+
+
+def test_cached_model_is_reused_until_a_newer_version_is_stored(client):
+    reader, trainer = _store(), _store()
+    trainer.save("checkout", _fitted(DetectorState(), seed=1), model_changed=True)
+
+    first = reader.load("checkout").model
+    assert reader.load("checkout").model is first
+
+    refit = _fitted(trainer.load("checkout"), seed=2)
+    assert trainer.save_model("checkout", refit)
+
+    reloaded = reader.load("checkout")
+    assert reloaded.model_version == 2
+    assert reloaded.model is not first
+    np.testing.assert_allclose(reloaded.fit_mean, refit.fit_mean)
+
+
+def test_window_saves_do_not_touch_the_model(client):
+    evaluator, trainer = _store(), _store()
+    trainer.save("checkout", _fitted(DetectorState(), seed=1), model_changed=True)
+
+    state = evaluator.load("checkout")
+    refit = _fitted(trainer.load("checkout"), seed=2)
+    assert trainer.save_model("checkout", refit)
+    state.append(np.array([0.02, 130.0, 4.0]))
+    evaluator.save("checkout", state, model_changed=False)
+
+    stored = _store().load("checkout")
+    assert stored.model_version == 2
+    assert stored.count == state.count
+
+
+def test_older_model_never_replaces_a_newer_one(client):
+    store = _store()
+    stale = _fitted(DetectorState(), seed=1)
+    current = _fitted(DetectorState(), seed=2)
+    current.model_version = 5
+    assert store.save_model("checkout", current)
+
+    assert not store.save_model("checkout", stale)
+    store.save("checkout", stale, model_changed=True)
+
+    assert _store().load("checkout").model_version == 5
+
+
+def test_concurrent_refits_keep_exactly_one_model(client):
+    _store().save("checkout", _fitted(DetectorState(), seed=1), model_changed=True)
+    trainers = [_store() for _ in range(4)]
+    # Every trainer refits the same version 1 on different data.
+    refits = [
+        _fitted(trainer.load("checkout"), seed=10 + index) for index, trainer in enumerate(trainers)
+    ]
+    assert {refit.model_version for refit in refits} == {2}
+    barrier = threading.Barrier(len(trainers))
+    results = [None] * len(trainers)
+
+    def run(index: int) -> None:
+        barrier.wait()
+        results[index] = trainers[index].save_model("checkout", refits[index])
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(trainers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    winner = refits[results.index(True)]
+    blob = client.get(f"{detector_state.KEY_PREFIX}:checkout:model")
+    assert blob == pickle.dumps(winner.model, protocol=pickle.HIGHEST_PROTOCOL)
+    # Losers did not cache their rejected model and pick up the winner's.
+    for trainer in trainers:
+        loaded = trainer.load("checkout")
+        np.testing.assert_allclose(loaded.fit_mean, winner.fit_mean)
+        np.testing.assert_array_equal(
+            loaded.model.score_samples(_probe()), winner.model.score_samples(_probe())
+        )
+
+
+def test_training_claims_are_exclusive_until_released(client):
+    store, other = _store(), _store()
+
+    assert store.claim_training("checkout", ttl=30)
+    assert not other.claim_training("checkout", ttl=30)
+    store.release_training("checkout")
+    assert other.claim_training("checkout", ttl=30)
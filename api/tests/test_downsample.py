@@ -0,0 +1,48 @@
+"""Server-side chart downsampling."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from api.services import downsample
+
+
+def _columns(size: int) -> tuple:
+    rng = np.random.default_rng(7)
+    x = np.arange(size, dtype=np.float64) * 10.0
+    columns = [rng.random(size), rng.integers(50, 900, size).astype(np.float64), rng.random(size)]
+    # The newest point is neither a bucket minimum nor a maximum.
+    for column in columns:
+        column[-1] = np.median(column)
+    return x, columns
+
+
+@pytest.mark.parametrize("method", downsample.METHODS)
+def test_first_and_newest_points_are_always_kept(method):
+    x, columns = _columns(1000)
+
+    keep = downsample.downsample_indices(x, columns, 100, method)
+
+    assert keep[0] == 0
+    assert keep[-1] == 999
+    assert len(keep) <= 100
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    y = np.zeros(1000)
+    y[123], y[456] = 5.0, -5.0
+
+    keep = downsample.minmax_indices(y, 20)
+
+    assert {0, 123, 456, 999} <= set(keep.tolist())
+    assert len(keep) <= 20
+
+
+def test_short_series_are_returned_whole():
+    x, columns = _columns(50)
+
+    for method in downsample.METHODS:
+        keep = downsample.downsample_indices(x, columns, 100, method)
+        np.testing.assert_array_equal(keep, np.arange(50))
@@ -0,0 +1,226 @@
+"""Alert outbox: claiming, retries and the final status on the alert."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api.db import session_scope
+from api.models import AlertEvent, AlertOutbox, Service
+from api.services import alerts, outbox
+
+CONFIG = {
+    "ALERT_DIGEST_WINDOW_SEC": 0,
+    "ALERT_MAX_ATTEMPTS": 3,
+    "ALERT_RETRY_BASE_SEC": 5.0,
+    "ALERT_CHANNELS": ["slack"],
+    "SLACK_WEBHOOK_URL": "http://127.0.0.1:9/hook",
+}
+START = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = START
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += timedelta(seconds=seconds)
+
+
+class Channel:
+    """Stands in for Slack: records messages and fails while ``error`` is set."""
+
+    def __init__(self) -> None:
+        self.messages = []
+        self.error = None
+
+    def deliver(self, channel, payload, config) -> None:
+        self._send([payload])
+
+    def deliver_digest(self, channel, payloads, config) -> None:
+        self._send(payloads)
+
+    def _send(self, payloads) -> None:
+        if self.error:
+            raise alerts.AlertDeliveryError(self.error)
+        self.messages.append([payload["message"] for payload in payloads])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(outbox, "utc_now", clock)
+    # Take the top of the jitter range so retry times are exact.
+    monkeypatch.setattr(outbox.random, "uniform", lambda low, high: high)
+    return clock
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    channel = Channel()
+    monkeypatch.setattr(outbox.alerts, "deliver", channel.deliver)
+    monkeypatch.setattr(outbox.alerts, "deliver_digest", channel.deliver_digest)
+    return channel
+
+
+def _queue(*messages: str) -> list:
+    with session_scope() as session:
+        service = Service(name="checkout")
+        session.add(service)
+        session.flush()
+        events = []
+        for index, message in enumerate(messages):
+            alert = AlertEvent(
+                service_id=service.id,
+                ts=START,
+                channel="slack",
+                severity="warn",
+                message=message,
+                dedupe_key=f"checkout:test:{index}",
+                status="pending",
+            )
+            alert.outbox = AlertOutbox(
+                channel="slack", payload={"message": message}, next_attempt_ts=START
+            )
+            session.add(alert)
+            events.append(alert)
+        session.flush()
+        return [alert.id for alert in events]
+
+
+def _alert(alert_id: int) -> AlertEvent:
+    with session_scope() as session:
+        alert = session.get(AlertEvent, alert_id)
+        session.expunge(alert)
+        return alert
+
+
+def _outbox_rows() -> list:
+    with session_scope() as session:
+        return [(row.status, row.attempts) for row in session.query(AlertOutbox)]
+
+
+def test_claim_leases_jobs_until_the_lease_expires(database):
+    _queue("first", "second")
+    config = {**CONFIG}
+
+    with session_scope() as session:
+        claimed = outbox.claim(session, 10, START, config)
+    with session_scope() as session:
+        again = outbox.claim(session, 10, START + timedelta(seconds=1), config)
+    assert [payload["message"] for _, _, payload in claimed] == ["first", "second"]
+    assert again == []
+    assert _outbox_rows() == [("sending", 1), ("sending", 1)]
+
+    # The dispatcher holding the lease died: the jobs become due again.
+    expired = START + timedelta(seconds=outbox.CLAIM_LEASE_SEC)
+    with session_scope() as session:
+        reclaimed = outbox.claim(session, 10, expired, config)
+    assert len(reclaimed) == 2
+    assert _outbox_rows() == [("sending", 2), ("sending", 2)]
+
+
+def test_claim_respects_the_per_channel_limit(database):
+    _queue("a", "b", "c")
+
+    with session_scope() as session:
+        claimed = outbox.claim(session, 2, START, CONFIG)
+
+    assert [payload["message"] for _, _, payload in claimed] == ["a", "b"]
+
+
+def test_sent_jobs_update_the_alert_and_leave_the_outbox(database, clock, channel):
+    (alert_id,) = _queue("error rate high")
+
+    assert outbox.dispatch_pending(CONFIG) == {"sent": 1, "retrying": 0, "failed": 0}
+
+    alert = _alert(alert_id)
+    assert channel.messages == [["error rate high"]]
+    assert alert.status == "sent"
+    assert alert.sent_ts.replace(tzinfo=timezone.utc) == START
+    assert _outbox_rows() == []
+    assert outbox.dispatch_pending(CONFIG) == {"sent": 0, "retrying": 0, "failed": 0}
+
+
+def test_several_jobs_of_a_channel_go_out_as_one_digest(database, clock, channel):
+    _queue("first", "second")
+
+    assert outbox.dispatch_pending(CONFIG)["sent"] == 2
+    assert channel.messages == [["first", "second"]]
+
+
+def test_failures_back_off_then_fail_after_max_attempts(database, clock, channel):
+    (alert_id,) = _queue("error rate high")
+    channel.error = "HTTP 503"
+
+    assert outbox.dispatch_pending(CONFIG) == {"sent": 0, "retrying": 1, "failed": 0}
+    # Not due again before the backoff has passed.
+    clock.advance(4)
+    assert outbox.dispatch_pending(CONFIG) == {"sent": 0, "retrying": 0, "failed": 0}
+    clock.advance(1)
+    assert outbox.dispatch_pending(CONFIG) == {"sent": 0, "retrying": 1, "failed": 0}
+    assert _outbox_rows() == [("pending", 2)]
+    assert _alert(alert_id).status == "pending"
+
+    # The backoff doubles per attempt; the third attempt is the last.
+    clock.advance(9)
+    assert outbox.dispatch_pending(CONFIG)["retrying"] == 0
+    clock.advance(1)
+    assert outbox.dispatch_pending(CONFIG) == {"sent": 0, "retrying": 0, "failed": 1}
+
+    alert = _alert(alert_id)
+    assert alert.status == "failed"
+    assert alert.last_error == "HTTP 503"
+    assert _outbox_rows() == []
+
+
+def test_a_retry_that_succeeds_marks_the_alert_sent(database, clock, channel):
+    (alert_id,) = _queue("error rate high")
+    channel.error = "timed out"
+    outbox.dispatch_pending(CONFIG)
+
+    channel.error = None
+    clock.advance(5)
+
+    assert outbox.dispatch_pending(CONFIG)["sent"] == 1
+    alert = _alert(alert_id)
+    assert alert.status == "sent"
+    assert alert.last_error == "timed out"
+
+
+def test_rolled_back_transaction_leaves_no_outbox_row(database):
+    snapshot = {
+        "ts": "2026-01-01T12:00:00+00:00",
+        "error_rate": 0.5,
+        "p95_latency_ms": 900,
+        "tps": 3.0,
+    }
+    trigger = {"reason": "error_rate_threshold", "severity": "critical", "message": "high"}
+
+    with pytest.raises(RuntimeError):
+        with session_scope() as session:
+            service = Service(name="checkout")
+            session.add(service)
+            session.flush()
+            queued = alerts.handle_alerts(
+                session, service, snapshot, {"is_anomaly": False}, CONFIG, triggers=[trigger]
+            )
+            assert len(queued) == 1
+            raise RuntimeError("ingest failed after queueing the alert")
+
+    with session_scope() as session:
+        assert session.query(AlertEvent).count() == 0
+        assert session.query(AlertOutbox).count() == 0
+    # Nor is the rolled-back alert remembered as sent for deduplication.
+    with session_scope() as session:
+        service = Service(name="checkout")
+        session.add(service)
+        session.flush()
+        queued = alerts.handle_alerts(
+            session, service, snapshot, {"is_anomaly": False}, CONFIG, triggers=[trigger]
+        )
+    assert len(queued) == 1
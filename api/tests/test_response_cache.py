@@ -0,0 +1,95 @@
+"""The response cache decorator failing open while its backend is down."""
+
+from __future__ import annotations
+
+import pytest
+import redis
+from flask import Flask
+from loguru import logger
+
+from api.services import response_cache
+
+
+class DownCache(response_cache.ResponseCache):
+    """A backend whose every call fails like an unreachable Redis."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def _fail(self, *args):
+        self.calls += 1
+        raise redis.ConnectionError("Connection refused")
+
+    generations = bump = get = set = clear = _fail
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", clock)
+    monkeypatch.setattr(response_cache, "_outage", response_cache._Outage())
+    return clock
+
+
+@pytest.fixture
+def logged():
+    messages = []
+    sink = logger.add(lambda message: messages.append(message.record["message"]), level="WARNING")
+    yield messages
+    logger.remove(sink)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    cache = DownCache()
+    monkeypatch.setattr(response_cache, "get_cache", lambda config: cache)
+    return cache
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.config["RESPONSE_CACHE_TTL_SEC"] = 5.0
+    served = []
+
+    @app.get("/api/alerts")
+    @response_cache.cached(scope=response_cache.ALERTS_SCOPE)
+    def alerts():
+        served.append(1)
+        return {"items": []}
+
+    client = app.test_client()
+    client.served = served
+    return client
+
+
+def test_outage_is_tried_and_logged_once_per_interval(client, backend, clock, logged):
+    for _ in range(10):
+        assert client.get("/api/alerts").status_code == 200
+
+    assert len(client.served) == 10
+    assert backend.calls == 1
+    assert logged.count("Response cache unavailable") == 1
+
+    clock.now += response_cache.RETRY_AFTER_SEC
+    client.get("/api/alerts")
+
+    assert backend.calls == 2
+    assert logged.count("Response cache unavailable") == 2
+
+
+def test_bumps_are_skipped_during_an_outage(backend, clock):
+    config = {"RESPONSE_CACHE_TTL_SEC": 5.0}
+
+    for _ in range(5):
+        response_cache.bump(config, [response_cache.ALERTS_SCOPE])
+
+    assert backend.calls == 1
@@ -0,0 +1,188 @@
+"""Alert rule engine: streaks, rise baselines, scope overrides and state persistence."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from api.db import session_scope
+from api.models import Service
+from api.services import alerts, rules
+
+CONFIG = {
+    "ALERT_ERROR_RATE_THRESHOLD": 0.05,
+    "ALERT_P95_LATENCY_MS": 500,
+    "ALERT_RULE_STATE_BACKEND": "memory",
+    "ALERT_CHANNELS": [],
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(rules, "_stores", {})
+    return rules.get_store(CONFIG)
+
+
+class Evaluator:
+    """Runs one rule set tick after tick, carrying state like the store would."""
+
+    def __init__(self, definitions: dict, service_names) -> None:
+        self.ruleset = rules.compile_rules(definitions)
+        self.service_names = list(service_names)
+        self.states = rules.new_states(self.ruleset, len(self.service_names))
+        self.now = 0.0
+
+    def tick(self, seconds: float = 60.0, **metrics) -> dict:
+        """Evaluate ``metrics`` (one value, or a dict by service) and return reasons fired."""
+        self.now += seconds
+        snapshots = [
+            {
+                "service": name,
+                **{
+                    metric: value[name] if isinstance(value, dict) else value
+                    for metric, value in metrics.items()
+                },
+            }
+            for name in self.service_names
+        ]
+        triggers = rules.evaluate(self.ruleset, snapshots, self.states, self.now)
+        return {
+            name: [(fire["reason"], fire["severity"], fire["message"]) for fire in fired]
+            for name, fired in zip(self.service_names, triggers)
+            if fired
+        }
+
+
+def _legacy(snapshot: dict) -> list:
+    """The hard-coded checks the default rules replaced."""
+    triggers = []
+    error_rate, latency = snapshot["error_rate"], snapshot["p95_latency_ms"]
+    if error_rate >= 0.05:
+        triggers.append(
+            {
+                "reason": "error_rate_threshold",
+                "severity": "critical" if error_rate >= 0.1 else "warn",
+                "message": f"Error rate {error_rate:.2%} exceeded threshold",
+            }
+        )
+    if latency >= 500:
+        triggers.append(
+            {
+                "reason": "latency_threshold",
+                "severity": "critical" if latency >= 750 else "warn",
+                "message": f"p95 latency {latency}ms exceeded threshold",
+            }
+        )
+    return triggers
+
+
+def test_rule_fires_on_the_third_consecutive_breach_and_resets():
+    evaluator = Evaluator(
+        {
+            "rules": [
+                {"name": "slow", "metric": "p99_latency_ms", "op": ">", "threshold": 800,
+                 "for": 3},
+            ]
+        },
+        ["checkout"],
+    )
+
+    assert evaluator.tick(p99_latency_ms=900) == {}
+    assert evaluator.tick(p99_latency_ms=950) == {}
+    assert evaluator.tick(p99_latency_ms=900) == {
+        "checkout": [("slow", "warn", "p99 latency 900 > 800 for 3 evaluations")]
+    }
+    assert evaluator.tick(p99_latency_ms=900)
+
+    # Exactly at a strict threshold is not a breach: the streak starts over.
+    assert evaluator.tick(p99_latency_ms=800) == {}
+    assert evaluator.tick(p99_latency_ms=900) == {}
+    assert evaluator.tick(p99_latency_ms=900) == {}
+    assert evaluator.tick(p99_latency_ms=900)
+
+
+def test_rise_rule_compares_against_the_baseline():
+    evaluator = Evaluator(
+        {
+            "rules": [
+                {"name": "errors_rising", "metric": "error_rate", "op": "rise", "factor": 2.0,
+                 "over_sec": 300, "min_baseline": 0.01, "critical": 4.0},
+            ]
+        },
+        ["checkout", "quiet"],
+    )
+
+    # The first value seeds the baseline; nothing to compare against yet.
+    assert evaluator.tick(error_rate={"checkout": 0.02, "quiet": 0.001}) == {}
+    assert evaluator.tick(error_rate={"checkout": 0.03, "quiet": 0.005}) == {}
+    fired = evaluator.tick(error_rate={"checkout": 0.06, "quiet": 0.05})
+    # ``quiet`` rose 10x, but from a baseline below ``min_baseline``.
+    assert list(fired) == ["checkout"]
+    assert fired["checkout"][0][:2] == ("errors_rising", "warn")
+    assert evaluator.tick(error_rate={"checkout": 0.5, "quiet": 0.0})["checkout"][0][1] == (
+        "critical"
+    )
+
+
+def test_service_rule_overrides_the_tier_rule_of_the_same_name():
+    evaluator = Evaluator(
+        {
+            "tiers": {"gold": ["checkout", "payments"]},
+            "rules": [
+                {"name": "latency_threshold", "metric": "p95_latency_ms", "threshold": 500,
+                 "tier": "gold"},
+                {"name": "latency_threshold", "metric": "p95_latency_ms", "threshold": 900,
+                 "services": ["checkout"], "severity": "critical"},
+            ],
+        },
+        ["checkout", "payments", "search"],
+    )
+
+    assert evaluator.tick(p95_latency_ms=700) == {
+        "payments": [("latency_threshold", "warn", "p95 latency 700 >= 500")]
+    }
+    assert evaluator.tick(p95_latency_ms=1000) == {
+        "checkout": [("latency_threshold", "critical", "p95 latency 1000 >= 900")],
+        "payments": [("latency_threshold", "warn", "p95 latency 1000 >= 500")],
+    }
+
+
+def test_default_rules_match_the_legacy_thresholds():
+    rng = np.random.default_rng(7)
+    error_rates = np.concatenate([rng.gamma(2.0, 0.03, 500), [0.0, 0.05, 0.1, 0.0999]])
+    latencies = np.concatenate([rng.integers(0, 1500, 500), [499, 500, 749, 750]])
+    snapshots = [
+        {"service": f"svc-{index}", "error_rate": float(error_rate), "p95_latency_ms": int(latency)}
+        for index, (error_rate, latency) in enumerate(zip(error_rates, latencies))
+    ]
+
+    evaluation = rules.evaluate_snapshots(snapshots, CONFIG, now=0.0)
+
+    assert evaluation.triggers == [_legacy(snapshot) for snapshot in snapshots]
+    assert any(evaluation.triggers)
+
+
+def _streaks(store, service_name: str) -> list:
+    ruleset = rules.load_rules(CONFIG)
+    return store.load_many(ruleset, [service_name])["streak"][0].tolist()
+
+
+@pytest.mark.parametrize("commit", [True, False])
+def test_rule_state_is_saved_only_when_the_alerts_commit(database, fresh_store, commit):
+    with session_scope() as session:
+        session.add(Service(name="checkout"))
+    snapshot = {
+        "service": "checkout",
+        "ts": "2026-01-01T12:00:00+00:00",
+        "error_rate": 0.2,
+        "p95_latency_ms": 100,
+    }
+
+    with session_scope() as session:
+        service = session.query(Service).one()
+        alerts.handle_alerts(session, service, snapshot, {"is_anomaly": False}, CONFIG)
+        assert _streaks(fresh_store, "checkout") == [0, 0]
+        if not commit:
+            session.rollback()
+
+    assert _streaks(fresh_store, "checkout") == ([1, 0] if commit else [0, 0])
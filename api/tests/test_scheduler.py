@@ -0,0 +1,70 @@
+"""Debounced KPI scheduling with both dirty-service trackers."""
+
+from __future__ import annotations
+
+import fakeredis
+import pytest
+
+from api.services import scheduler
+
+INTERVAL = 5.0
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def tracker(request, monkeypatch):
+    if request.param == "memory":
+        return scheduler.MemoryDirtyTracker()
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(scheduler, "get_redis", lambda url: client)
+    return scheduler.RedisDirtyTracker("redis://fake")
+
+
+def test_services_are_claimed_once_until_marked_again(tracker, clock):
+    tracker.mark_dirty([1, 2])
+
+    assert sorted(tracker.claim_due(INTERVAL)) == [1, 2]
+    clock.now += INTERVAL
+    assert tracker.claim_due(INTERVAL) == []
+
+
+def test_services_cooling_down_stay_dirty(tracker, clock):
+    tracker.mark_dirty([1])
+    assert tracker.claim_due(INTERVAL) == [1]
+
+    tracker.mark_dirty([1])
+    clock.now += 1.0
+    assert tracker.claim_due(INTERVAL) == []
+    clock.now += INTERVAL
+    assert tracker.claim_due(INTERVAL) == [1]
+
+
+def test_a_tick_arriving_slightly_early_still_claims(tracker, clock):
+    # Beat ticks every INTERVAL seconds with jitter: a late tick followed by
+    # an on-time one must not skip the service.
+    tracker.mark_dirty([1])
+    clock.now += 0.2
+    assert tracker.claim_due(INTERVAL) == [1]
+
+    tracker.mark_dirty([1])
+    clock.now += INTERVAL - 0.2
+    assert tracker.claim_due(INTERVAL) == [1]
+
+
+def test_cooldown_slack_is_capped():
+    assert scheduler._cooldown(5.0) == pytest.approx(4.5)
+    assert scheduler._cooldown(60.0) == pytest.approx(59.0)
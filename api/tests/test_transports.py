@@ -0,0 +1,264 @@
+"""Pooled alert transports against a local HTTP server and SMTP server."""
+
+from __future__ import annotations
+
+import asyncio
+import smtplib
+import socket
+import threading
+import time
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from api.services import alerts
+from api.services.transports import HTTPTransport, SMTPTransport
+
+
+class _Webhook(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self) -> None:
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.requests.append(self.client_address)
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        self.send_response(server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        # Drop the connection without announcing it, like an idle timeout would.
+        self.close_connection = server.drop_after_response
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def webhook():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Webhook)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests, server.active, server.peak = [], 0, 0
+    server.delay, server.status, server.drop_after_response = 0.0, 200, False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/hooks/alerts?token=t"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _connections(server) -> int:
+    return len(set(server.requests))
+
+
+def test_http_reuses_one_keep_alive_connection(webhook):
+    transport = HTTPTransport(max_connections=2, timeout=2.0)
+
+    statuses = [transport.post_json(webhook.url, b"{}") for _ in range(5)]
+
+    assert statuses == [200] * 5
+    assert len(webhook.requests) == 5
+    assert _connections(webhook) == 1
+    transport.close()
+
+
+def test_http_caps_requests_in_flight(webhook):
+    webhook.delay = 0.2
+    transport = HTTPTransport(max_connections=2, timeout=2.0)
+    threads = [
+        threading.Thread(target=transport.post_json, args=(webhook.url, b"{}")) for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(webhook.requests) == 6
+    assert webhook.peak == 2
+    assert _connections(webhook) <= 2
+    transport.close()
+
+
+def test_http_retries_once_when_a_pooled_connection_went_stale(webhook):
+    webhook.drop_after_response = True
+    transport = HTTPTransport(timeout=2.0)
+
+    assert transport.post_json(webhook.url, b"{}") == 200
+    assert transport.post_json(webhook.url, b"{}") == 200
+
+    # The second request failed on the dropped connection and was resent on a new one.
+    assert len(webhook.requests) == 2
+    assert _connections(webhook) == 2
+    transport.close()
+
+
+def test_http_timeout_is_raised_and_not_retried(webhook):
+    webhook.delay = 0.5
+    transport = HTTPTransport(timeout=0.2)
+
+    with pytest.raises(TimeoutError):
+        transport.post_json(webhook.url, b"{}")
+    time.sleep(0.5)
+    assert len(webhook.requests) == 1
+
+    # The timed-out connection was discarded rather than returned to the pool.
+    webhook.delay = 0.0
+    assert transport.post_json(webhook.url, b"{}") == 200
+    assert _connections(webhook) == 2
+    transport.close()
+
+
+def test_http_refused_connection_is_not_retried():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    with pytest.raises(ConnectionRefusedError):
+        HTTPTransport(timeout=1.0).post_json(f"http://127.0.0.1:{port}/", b"{}")
+
+
+def test_http_error_status_is_a_delivery_error(webhook, monkeypatch):
+    webhook.status = 500
+    transport = HTTPTransport(timeout=2.0)
+    monkeypatch.setattr(alerts.transports, "get_http_transport", lambda config: transport)
+    payload = {"service": "checkout", "message": "m", "error_rate": 0.1}
+
+    with pytest.raises(alerts.AlertDeliveryError, match="HTTP 500"):
+        alerts.deliver("slack", {**payload, "p95_latency_ms": 900, "tps": 1.0}, {
+            "SLACK_WEBHOOK_URL": webhook.url
+        })
+
+    # A server error is an answer, not a broken connection: no resend, connection kept.
+    assert len(webhook.requests) == 1
+    transport.post_json(webhook.url, b"{}")
+    assert _connections(webhook) == 1
+    transport.close()
+
+
+class _Mailbox:
+    def __init__(self) -> None:
+        self.messages = []
+        self.sessions = set()
+        self.delay = 0.0
+        self.attempts = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject@"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts += 1
+        await asyncio.sleep(self.delay)
+        self.sessions.add(session.peer)
+        self.messages.append(envelope.content)
+        return "250 Message accepted"
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _start(**smtp_options) -> Controller:
+    controller = Controller(_Mailbox(), hostname="127.0.0.1", port=_free_port(), **smtp_options)
+    controller.start()
+    return controller
+
+
+@pytest.fixture
+def smtp_server():
+    controller = _start()
+    yield controller
+    controller.stop()
+
+
+def _transport(controller, **options) -> SMTPTransport:
+    options.setdefault("timeout", 2.0)
+    return SMTPTransport(
+        controller.hostname, controller.port, None, None, starttls=False, **options
+    )
+
+
+def _message(to: str = "ops@example.com") -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = "FlowGuard alert"
+    message["From"] = "flowguard@example.com"
+    message["To"] = to
+    message.set_content("error rate 10%")
+    return message
+
+
+def test_smtp_reuses_one_session(smtp_server):
+    transport = _transport(smtp_server)
+
+    for _ in range(3):
+        transport.send(_message())
+
+    assert len(smtp_server.handler.messages) == 3
+    assert len(smtp_server.handler.sessions) == 1
+    transport.close()
+
+
+def test_smtp_reconnects_after_idle_timeout(smtp_server):
+    transport = _transport(smtp_server, idle_timeout=0.0)
+
+    transport.send(_message())
+    transport.send(_message())
+
+    assert len(smtp_server.handler.sessions) == 2
+    transport.close()
+
+
+def test_smtp_resends_once_when_the_server_dropped_the_session():
+    # The server closes sessions idle for more than 0.2s, before the client's idle timeout.
+    controller = _start(timeout=0.2)
+    try:
+        transport = _transport(controller)
+        transport.send(_message())
+        time.sleep(0.5)
+
+        transport.send(_message())
+
+        assert controller.handler.attempts == 2
+        assert len(controller.handler.sessions) == 2
+        transport.close()
+    finally:
+        controller.stop()
+
+
+def test_smtp_rejection_is_raised_without_resending(smtp_server):
+    transport = _transport(smtp_server)
+    transport.send(_message())
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        transport.send(_message(to="reject@example.com"))
+
+    assert len(smtp_server.handler.messages) == 1
+    # The session that saw the error was discarded; the next message opens a new one.
+    transport.send(_message())
+    assert len(smtp_server.handler.sessions) == 2
+    transport.close()
+
+
+def test_smtp_timeout_is_not_resent_on_a_reused_session(smtp_server):
+    transport = _transport(smtp_server, timeout=0.3)
+    transport.send(_message())
+    smtp_server.handler.delay = 1.0
+
+    # The server may still accept the message, so resending could duplicate it.
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        transport.send(_message())
+
+    assert smtp_server.handler.attempts == 2
+    transport.close()
@@ -0,0 +1,145 @@
+"""Rolling KPI windows: rebuilds from ``log_events`` racing log ingestion."""
+
+from __future__ import annotations
+
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api.models import Base, Service
+from api.schemas import LogRecord
+from api.services import storage, windows
+from api.utils.time import utc_now
+
+CONFIG = {"KPI_WINDOW_BACKEND": "memory", "KPI_BUCKET_SEC": 10, "ALERT_LOOKBACK_MIN": 10}
+
+
+def _postgres_url(tmp_path_factory) -> str:
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if url:
+        return url
+    pgserver = pytest.importorskip("pgserver", reason="set TEST_POSTGRES_URL or install pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pg")), cleanup_mode="stop")
+    return server.get_uri().replace("postgresql://", "postgresql+psycopg2://", 1)
+
+
+@pytest.fixture(scope="module")
+def postgres(tmp_path_factory):
+    engine = create_engine(_postgres_url(tmp_path_factory))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'windows.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(windows, "_stores", {})
+    return windows.get_store(CONFIG)
+
+
+def _service(Session, name: str) -> dict:
+    with Session() as session:
+        service = Service(name=name)
+        session.add(service)
+        session.commit()
+        return {name: service.id}
+
+
+def _records(name: str, count: int) -> list:
+    now = utc_now()
+    return [LogRecord(name, now, "INFO", "ok", 5, 200, {}) for _ in range(count)]
+
+
+def _insert(session, records: list, service_ids: dict) -> int:
+    windows.hold_rebuilds(session, service_ids.values())
+    return storage.insert_log_events(session, storage.log_rows(records, service_ids))
+
+
+def _ingest(Session, records: list, service_ids: dict) -> None:
+    """The ``parse_logs`` path: insert and commit, then fold into the windows."""
+    with Session() as session:
+        last_id = _insert(session, records, service_ids)
+        session.commit()
+    windows.record_logs(CONFIG, records, service_ids, utc_now(), last_id)
+
+
+def _rebuild(Session, service_id: int, store) -> None:
+    with Session() as session:
+        windows.rebuild(session, [service_id], store, utc_now())
+        session.commit()
+
+
+def _count(store, service_id: int) -> int:
+    buckets = store.spec.buckets_ending(utc_now())
+    return store.load_many([service_id], buckets)[service_id].log_count
+
+
+def test_batch_committed_before_a_rebuild_is_not_counted_twice(sqlite, fresh_store):
+    Session = sessionmaker(bind=sqlite)
+    service_ids = _service(Session, "checkout")
+    (service_id,) = service_ids.values()
+    records = _records("checkout", 3)
+    with Session() as session:
+        last_id = _insert(session, records, service_ids)
+        session.commit()
+
+    _rebuild(Session, service_id, fresh_store)
+    windows.record_logs(CONFIG, records, service_ids, utc_now(), last_id)
+    _ingest(Session, _records("checkout", 2), service_ids)
+
+    assert _count(fresh_store, service_id) == 5
+
+
+def test_cold_batch_waits_for_a_running_rebuild(sqlite, fresh_store):
+    Session = sessionmaker(bind=sqlite)
+    service_ids = _service(Session, "checkout")
+    (service_id,) = service_ids.values()
+
+    # A rebuild holds the lock and has read nothing yet: the batch must wait
+    # for it, then fold in on top of the rebuilt window.
+    with fresh_store.rebuilding([service_id]):
+        ingest = threading.Thread(
+            target=_ingest, args=(Session, _records("checkout", 4), service_ids)
+        )
+        ingest.start()
+        ingest.join(timeout=0.3)
+        assert ingest.is_alive()
+        fresh_store.replace(service_id, {}, high_water=0)
+    ingest.join()
+
+    assert _count(fresh_store, service_id) == 4
+
+
+def test_lower_id_batch_committing_after_the_rebuild_read_is_counted(postgres, fresh_store):
+    Session = sessionmaker(bind=postgres)
+    service_ids = _service(Session, "checkout")
+    (service_id,) = service_ids.values()
+
+    # This batch draws the lower ids but commits last.
+    slow = Session()
+    slow_records = _records("checkout", 2)
+    slow_last_id = _insert(slow, slow_records, service_ids)
+    _ingest(Session, _records("checkout", 3), service_ids)
+
+    rebuild = threading.Thread(target=_rebuild, args=(Session, service_id, fresh_store))
+    rebuild.start()
+    rebuild.join(timeout=0.3)
+    slow.commit()
+    slow.close()
+    windows.record_logs(CONFIG, slow_records, service_ids, utc_now(), slow_last_id)
+    rebuild.join()
+
+    assert _count(fresh_store, service_id) == 5
@@ -18,6 +18,9 @@ DEFAULTS: Dict[str, Any] = {
     "ALERT_P95_LATENCY_MS": "500",
     "ALERT_LOOKBACK_MIN": "10",
     "ALERT_CHANNELS": "slack,email",
+    "ALERT_RULES_FILE": "",
+    "ALERT_RULE_STATE_BACKEND": "redis",
+    "ALERT_RULE_STATE_TTL_SEC": "86400",
     "SLACK_WEBHOOK_URL": "",
     "SMTP_HOST": "",
     "SMTP_PORT": "587",
@@ -25,10 +28,51 @@ DEFAULTS: Dict[str, Any] = {
     "SMTP_PASS": "",
     "SMTP_FROM": "flowguard@demo.local",
     "SMTP_TO": "",
+    "SMTP_STARTTLS": "true",
+    "SMTP_MAX_SESSIONS": "2",
+    "SMTP_IDLE_TIMEOUT_SEC": "60",
     "SERVICE_ALLOWLIST": "",
     "DEV_GENERATOR": "false",
     "CORS_ORIGINS": "*",
     "FLOWGUARD_ALERT_WINDOW_MIN": "10",
+    "ALERT_DEDUPE_CACHE_SIZE": "10000",
+    "INGEST_BATCH_MAX_RECORDS": "5000",
+    "INGEST_BATCH_MAX_BYTES": "1048576",
+    "INGEST_BATCH_MAX_DELAY_MS": "250",
+    "INGEST_PUBLISH_RETRIES": "5",
+    "INGEST_PUBLISH_BACKOFF_MS": "500",
+    "INGEST_PUBLISH_MAX_PENDING": "100",
+    "INGEST_CLOSE_TIMEOUT_MS": "5000",
+    "KPI_EVAL_INTERVAL_SEC": "5",
+    "KPI_SCHEDULER_BACKEND": "redis",
+    "KPI_BUCKET_SEC": "10",
+    "KPI_WINDOW_BACKEND": "redis",
+    "KPI_AGGREGATION": "rolling",
+    "ROLLUP_INTERVAL_SEC": "60",
+    "ROLLUP_LOOKBACK_MIN": "5",
+    "ROLLUP_BACKFILL_HOURS": "24",
+    "METRIC_SERIES_MIN_POINTS": "120",
+    "ANOMALY_REFIT_POINTS": "32",
+    "ANOMALY_REFIT_SEC": "300",
+    "ANOMALY_DRIFT_Z": "3",
+    "ANOMALY_EWMA_ALPHA": "0.1",
+    "ANOMALY_SUSPECT_Z": "3",
+    "ANOMALY_TRAINER": "celery",
+    "ANOMALY_TRAIN_TIMEOUT_SEC": "300",
+    "ANOMALY_STATE_BACKEND": "redis",
+    "ANOMALY_STATE_TTL_SEC": "604800",
+    "ALERT_DISPATCH_INTERVAL_SEC": "5",
+    "ALERT_DISPATCH_BATCH": "100",
+    "ALERT_DISPATCH_CONCURRENCY": "8",
+    "ALERT_MAX_ATTEMPTS": "5",
+    "ALERT_RETRY_BASE_SEC": "5",
+    "ALERT_HTTP_MAX_CONNECTIONS": "4",
+    "ALERT_HTTP_TIMEOUT_SEC": "5",
+    "ALERT_DIGEST_WINDOW_SEC": "10",
+    "ALERT_CHANNEL_MAX_PER_MIN": "4",
+    "RESPONSE_CACHE_BACKEND": "redis",
+    "RESPONSE_CACHE_TTL_SEC": "5",
+    "RESPONSE_CACHE_SIZE": "1024",
 }
 
 
@@ -86,8 +130,44 @@ def load_config(env_path: Path | None = None) -> Dict[str, Any]:
     )
     cfg["ALERT_P95_LATENCY_MS"] = _as_int(cfg["ALERT_P95_LATENCY_MS"], default=500)
     cfg["ALERT_LOOKBACK_MIN"] = _as_int(cfg["ALERT_LOOKBACK_MIN"], default=10)
+    cfg["ALERT_RULE_STATE_TTL_SEC"] = _as_int(cfg["ALERT_RULE_STATE_TTL_SEC"], default=86400)
     cfg["FLOWGUARD_ALERT_WINDOW_MIN"] = _as_int(cfg["FLOWGUARD_ALERT_WINDOW_MIN"], default=10)
+    cfg["ALERT_DEDUPE_CACHE_SIZE"] = _as_int(cfg["ALERT_DEDUPE_CACHE_SIZE"], default=10000)
     cfg["SMTP_PORT"] = _as_int(cfg["SMTP_PORT"], default=587)
+    cfg["SMTP_STARTTLS"] = _as_bool(cfg["SMTP_STARTTLS"])
+    cfg["SMTP_MAX_SESSIONS"] = _as_int(cfg["SMTP_MAX_SESSIONS"], default=2)
+    cfg["SMTP_IDLE_TIMEOUT_SEC"] = _as_float(cfg["SMTP_IDLE_TIMEOUT_SEC"], default=60.0)
+    cfg["INGEST_BATCH_MAX_RECORDS"] = _as_int(cfg["INGEST_BATCH_MAX_RECORDS"], default=5000)
+    cfg["INGEST_BATCH_MAX_BYTES"] = _as_int(cfg["INGEST_BATCH_MAX_BYTES"], default=1048576)
+    cfg["INGEST_BATCH_MAX_DELAY_MS"] = _as_int(cfg["INGEST_BATCH_MAX_DELAY_MS"], default=250)
+    cfg["INGEST_PUBLISH_RETRIES"] = _as_int(cfg["INGEST_PUBLISH_RETRIES"], default=5)
+    cfg["INGEST_PUBLISH_BACKOFF_MS"] = _as_int(cfg["INGEST_PUBLISH_BACKOFF_MS"], default=500)
+    cfg["INGEST_PUBLISH_MAX_PENDING"] = _as_int(cfg["INGEST_PUBLISH_MAX_PENDING"], default=100)
+    cfg["INGEST_CLOSE_TIMEOUT_MS"] = _as_int(cfg["INGEST_CLOSE_TIMEOUT_MS"], default=5000)
+    cfg["KPI_EVAL_INTERVAL_SEC"] = _as_float(cfg["KPI_EVAL_INTERVAL_SEC"], default=5.0)
+    cfg["KPI_BUCKET_SEC"] = _as_int(cfg["KPI_BUCKET_SEC"], default=10)
+    cfg["ROLLUP_INTERVAL_SEC"] = _as_float(cfg["ROLLUP_INTERVAL_SEC"], default=60.0)
+    cfg["ROLLUP_LOOKBACK_MIN"] = _as_int(cfg["ROLLUP_LOOKBACK_MIN"], default=5)
+    cfg["ROLLUP_BACKFILL_HOURS"] = _as_int(cfg["ROLLUP_BACKFILL_HOURS"], default=24)
+    cfg["METRIC_SERIES_MIN_POINTS"] = _as_int(cfg["METRIC_SERIES_MIN_POINTS"], default=120)
+    cfg["ANOMALY_REFIT_POINTS"] = _as_int(cfg["ANOMALY_REFIT_POINTS"], default=32)
+    cfg["ANOMALY_REFIT_SEC"] = _as_float(cfg["ANOMALY_REFIT_SEC"], default=300.0)
+    cfg["ANOMALY_DRIFT_Z"] = _as_float(cfg["ANOMALY_DRIFT_Z"], default=3.0)
+    cfg["ANOMALY_EWMA_ALPHA"] = _as_float(cfg["ANOMALY_EWMA_ALPHA"], default=0.1)
+    cfg["ANOMALY_SUSPECT_Z"] = _as_float(cfg["ANOMALY_SUSPECT_Z"], default=3.0)
+    cfg["ANOMALY_TRAIN_TIMEOUT_SEC"] = _as_int(cfg["ANOMALY_TRAIN_TIMEOUT_SEC"], default=300)
+    cfg["ANOMALY_STATE_TTL_SEC"] = _as_int(cfg["ANOMALY_STATE_TTL_SEC"], default=604800)
+    cfg["ALERT_DISPATCH_INTERVAL_SEC"] = _as_float(cfg["ALERT_DISPATCH_INTERVAL_SEC"], default=5.0)
+    cfg["ALERT_DISPATCH_BATCH"] = _as_int(cfg["ALERT_DISPATCH_BATCH"], default=100)
+    cfg["ALERT_DISPATCH_CONCURRENCY"] = _as_int(cfg["ALERT_DISPATCH_CONCURRENCY"], default=8)
+    cfg["ALERT_MAX_ATTEMPTS"] = _as_int(cfg["ALERT_MAX_ATTEMPTS"], default=5)
+    cfg["ALERT_RETRY_BASE_SEC"] = _as_float(cfg["ALERT_RETRY_BASE_SEC"], default=5.0)
+    cfg["ALERT_HTTP_MAX_CONNECTIONS"] = _as_int(cfg["ALERT_HTTP_MAX_CONNECTIONS"], default=4)
+    cfg["ALERT_HTTP_TIMEOUT_SEC"] = _as_float(cfg["ALERT_HTTP_TIMEOUT_SEC"], default=5.0)
+    cfg["ALERT_DIGEST_WINDOW_SEC"] = _as_float(cfg["ALERT_DIGEST_WINDOW_SEC"], default=10.0)
+    cfg["ALERT_CHANNEL_MAX_PER_MIN"] = _as_int(cfg["ALERT_CHANNEL_MAX_PER_MIN"], default=4)
+    cfg["RESPONSE_CACHE_TTL_SEC"] = _as_float(cfg["RESPONSE_CACHE_TTL_SEC"], default=5.0)
+    cfg["RESPONSE_CACHE_SIZE"] = _as_int(cfg["RESPONSE_CACHE_SIZE"], default=1024)
     cfg["ALERT_CHANNELS"] = _split_csv(cfg["ALERT_CHANNELS"])
     cfg["SERVICE_ALLOWLIST"] = _split_csv(cfg["SERVICE_ALLOWLIST"])
     cfg["DEV_GENERATOR"] = _as_bool(cfg["DEV_GENERATOR"])
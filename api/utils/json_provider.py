@@ -0,0 +1,67 @@
+"""JSON encoding for API responses.
+
+Responses are encoded with orjson when it is installed: datetimes are
+written as ISO 8601 and numpy scalars and arrays natively, ``Decimal`` as
+a float, and the response body is built from bytes without an
+intermediate ``str``. Without orjson the standard library encoder is used
+with the same datetime and Decimal formatting, so payloads are identical
+either way. Naive datetimes (SQLite returns timestamps without a zone) are
+UTC and written with a ``+00:00`` offset, so clients never read them as
+local time.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc).isoformat()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    option = (
+        (orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        if orjson
+        else 0
+    )
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=self.option).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self.option)
+        return self._app.response_class(body, mimetype="application/json")
+
+
+class IsoJSONProvider(DefaultJSONProvider):
+    """Standard library fallback; writes datetimes as ISO 8601 instead of HTTP dates."""
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+
+def provider_class() -> type[JSONProvider]:
+    """The provider ``create_app`` installs: orjson-backed when available."""
+    return ORJSONProvider if orjson is not None else IsoJSONProvider
@@ -0,0 +1,13 @@
+"""Shared Redis client helpers."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import redis
+
+
+@lru_cache(maxsize=None)
+def get_redis(url: str) -> redis.Redis:
+    """Return a process-wide Redis client for ``url``."""
+    return redis.Redis.from_url(url)
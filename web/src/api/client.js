@@ -22,16 +22,54 @@ export const fetchLogs = async (params) => {
   return data.items;
 };
 
-export const fetchMetrics = async (params) => {
-  const { data } = await client.get("/api/metrics", { params });
-  return data.items;
+export const fetchLogPage = async (params) => {
+  const { data } = await client.get("/api/logs", { params });
+  return { items: data.items, nextCursor: data.next_cursor };
+};
+
+// Pass the previous response's `since` to receive only points at or after it.
+export const fetchMetrics = async ({ since, ...params }) => {
+  const { data } = await client.get("/api/metrics", {
+    params: { ...params, since: since || undefined }
+  });
+  return { items: data.items, since: data.next_since };
 };
 
-export const fetchKpis = async (params) => {
-  const { data } = await client.get("/api/kpis", { params });
+export const fetchKpis = async ({ since, ...params }) => {
+  const { data } = await client.get("/api/kpis", {
+    params: { ...params, since: since || undefined }
+  });
   return data;
 };
 
+// API timestamps are ISO 8601 with an offset, but may carry microseconds,
+// which Date.parse does not accept everywhere. A missing offset means UTC.
+export const toMillis = (ts) => {
+  const iso = ts.replace(/(\.\d{3})\d+/, "$1");
+  return Date.parse(/(Z|[+-]\d\d:?\d\d)$/.test(iso) ? iso : `${iso}Z`);
+};
+
+// Replace the tail of `series` from the first delta point on and drop points
+// older than `range.start`. New points closer together than the range spread
+// over `maxPoints` are thinned out (the newest is always kept), so a series
+// that was downsampled on the first load stays bounded.
+export const mergeSeries = (series, delta, range, maxPoints) => {
+  const start = toMillis(range.start);
+  const gap = maxPoints ? (toMillis(range.end) - start) / maxPoints : 0;
+  const from = delta.length ? toMillis(delta[0].ts) : Infinity;
+  const kept = series.filter((point) => toMillis(point.ts) < from);
+  let last = kept.length ? toMillis(kept[kept.length - 1].ts) : -Infinity;
+  const added = delta.filter((point, index) => {
+    const ts = toMillis(point.ts);
+    if (index < delta.length - 1 && ts - last < gap) {
+      return false;
+    }
+    last = ts;
+    return true;
+  });
+  return [...kept, ...added].filter((point) => toMillis(point.ts) >= start);
+};
+
 export const fetchAlerts = async (params) => {
   const { data } = await client.get("/api/alerts", { params });
   return data.items;
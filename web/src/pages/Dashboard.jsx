@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import KPI from "../components/KPI.jsx";
 import TimeRangePicker from "../components/TimeRangePicker.jsx";
 import ServicePicker from "../components/ServicePicker.jsx";
@@ -8,17 +8,30 @@ import {
   fetchAlerts,
   fetchConfig,
   fetchKpis,
-  fetchMetrics
+  fetchMetrics,
+  mergeSeries
 } from "../api/client.js";
 
+// Roughly the chart's pixel width; the API downsamples longer series.
+const CHART_MAX_POINTS = 500;
+// Refreshes only fetch points newer than the last response.
+const REFRESH_MS = 10000;
+
+const CHART_SERIES = [
+  { label: "Error Rate", color: "#ef4444", field: "error_rate" },
+  { label: "p95 Latency (ms)", color: "#6366f1", field: "p95_latency_ms" },
+  { label: "Throughput (TPS)", color: "#10b981", field: "tps" }
+];
+
 export default function Dashboard() {
   const [services, setServices] = useState([]);
   const [service, setService] = useState("");
   const [range, setRange] = useState("1h");
   const [kpis, setKpis] = useState(null);
-  const [metrics, setMetrics] = useState([]);
+  const [series, setSeries] = useState([]);
   const [alerts, setAlerts] = useState([]);
   const [status, setStatus] = useState({ loading: true, error: null });
+  const cursors = useRef({ kpis: null, metrics: null });
 
   useEffect(() => {
     const loadConfig = async () => {
@@ -36,54 +49,79 @@ export default function Dashboard() {
   }, []);
 
   useEffect(() => {
-    const loadData = async () => {
-      if (!service) {
-        setStatus({ loading: false, error: null });
+    if (!service) {
+      setStatus({ loading: false, error: null });
+      return undefined;
+    }
+    let cancelled = false;
+    cursors.current = { kpis: null, metrics: null };
+
+    const loadData = async (incremental) => {
+      const [kpiData, metricData, alertData] = await Promise.all([
+        fetchKpis({
+          service,
+          range,
+          max_points: CHART_MAX_POINTS,
+          since: cursors.current.kpis
+        }),
+        fetchMetrics({
+          service,
+          range,
+          max_points: CHART_MAX_POINTS,
+          since: cursors.current.metrics
+        }),
+        fetchAlerts({ limit: 10 })
+      ]);
+      if (cancelled) {
         return;
       }
-      setStatus({ loading: true, error: null });
-      try {
-        const [kpiData, metricSeries, alertData] = await Promise.all([
-          fetchKpis({ service, range }),
-          fetchMetrics({ service, range }),
-          fetchAlerts({ limit: 10 })
-        ]);
+      cursors.current = { kpis: kpiData.next_since, metrics: metricData.since };
+      if (kpiData.latest) {
         setKpis(kpiData.latest);
-        setMetrics([
-          {
-            label: "Error Rate",
-            color: "#ef4444",
-            values: metricSeries.map((point) => ({
-              ts: point.ts,
-              value: point.error_rate
-            }))
-          },
-          {
-            label: "p95 Latency (ms)",
-            color: "#6366f1",
-            values: metricSeries.map((point) => ({
-              ts: point.ts,
-              value: point.p95_latency_ms
-            }))
-          },
-          {
-            label: "Throughput (TPS)",
-            color: "#10b981",
-            values: metricSeries.map((point) => ({
-              ts: point.ts,
-              value: point.tps
-            }))
-          }
-        ]);
-        setAlerts(alertData);
-        setStatus({ loading: false, error: null });
-      } catch (error) {
-        setStatus({ loading: false, error: "Failed to load dashboard data" });
       }
+      setSeries((current) =>
+        incremental
+          ? mergeSeries(current, metricData.items, kpiData.range, CHART_MAX_POINTS)
+          : metricData.items
+      );
+      setAlerts(alertData);
+    };
+
+    setStatus({ loading: true, error: null });
+    setKpis(null);
+    loadData(false)
+      .then(() => {
+        if (!cancelled) {
+          setStatus({ loading: false, error: null });
+        }
+      })
+      .catch(() => {
+        if (!cancelled) {
+          setStatus({ loading: false, error: "Failed to load dashboard data" });
+        }
+      });
+
+    const timer = setInterval(() => {
+      loadData(true).catch(() => {
+        // Keep the current series; the next refresh retries from the same cursor.
+      });
+    }, REFRESH_MS);
+    return () => {
+      cancelled = true;
+      clearInterval(timer);
     };
-    loadData();
   }, [service, range]);
 
+  const metrics = useMemo(
+    () =>
+      CHART_SERIES.map(({ label, color, field }) => ({
+        label,
+        color,
+        values: series.map((point) => ({ ts: point.ts, value: point[field] }))
+      })),
+    [series]
+  );
+
   const kpiCards = useMemo(() => {
     if (!kpis) {
       return [];
@@ -2,7 +2,7 @@ import { useEffect, useState } from "react";
 import ServicePicker from "../components/ServicePicker.jsx";
 import TimeRangePicker from "../components/TimeRangePicker.jsx";
 import LogTable from "../components/LogTable.jsx";
-import { fetchConfig, fetchLogs } from "../api/client.js";
+import { fetchConfig, fetchLogPage } from "../api/client.js";
 
 const LEVELS = ["DEBUG", "INFO", "WARN", "ERROR", "CRITICAL"];
 
@@ -13,6 +13,8 @@ export default function Explorer() {
   const [level, setLevel] = useState("");
   const [query, setQuery] = useState("");
   const [logs, setLogs] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [status, setStatus] = useState({ loading: true, error: null });
 
   useEffect(() => {
@@ -30,6 +32,13 @@ export default function Explorer() {
     loadConfig();
   }, []);
 
+  const filters = () => ({
+    service,
+    range,
+    level: level || undefined,
+    q: query || undefined
+  });
+
   useEffect(() => {
     const loadLogs = async () => {
       if (!service) {
@@ -38,13 +47,9 @@ export default function Explorer() {
       }
       setStatus({ loading: true, error: null });
       try {
-        const items = await fetchLogs({
-          service,
-          range,
-          level: level || undefined,
-          q: query || undefined
-        });
-        setLogs(items);
+        const page = await fetchLogPage(filters());
+        setLogs(page.items);
+        setNextCursor(page.nextCursor);
         setStatus({ loading: false, error: null });
       } catch (error) {
         setStatus({ loading: false, error: "Failed to load logs" });
@@ -53,6 +58,19 @@ export default function Explorer() {
     loadLogs();
   }, [service, range, level, query]);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchLogPage({ ...filters(), cursor: nextCursor });
+      setLogs((current) => [...current, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      setStatus({ loading: false, error: "Failed to load logs" });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <section className="view">
       <div className="controls">
@@ -78,6 +96,11 @@ export default function Explorer() {
       {status.loading && <div className="card muted">Loading logs…</div>}
 
       {!status.loading && !status.error && <LogTable logs={logs} />}
+      {!status.loading && !status.error && nextCursor && (
+        <button onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? "Loading…" : "Load more"}
+        </button>
+      )}
     </section>
   );
 }